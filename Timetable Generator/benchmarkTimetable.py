@@ -0,0 +1,241 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+import pandas as pd
+
+import generateTimetable
+
+
+def legacy_determine_schedule(
+    stop_times: pd.DataFrame,
+    route: str,
+    trip_to_route_schedule: Dict[str, Tuple[str, int]],
+    trip_start_times: Dict[str, int],
+) -> None:
+    """
+    The original determine_schedule, kept as a reference: scans the whole
+    stop_times frame for every trip and parses each time string one at a time.
+    """
+    mask: pd.Series = (
+        stop_times["trip_id"].str.contains(route)
+        & stop_times["trip_id"].str.contains("MTuWThF")
+        & stop_times["trip_id"].str.contains("20250817")
+        & (stop_times["stop_sequence"] == 0)
+    )
+
+    filtered: pd.DataFrame = stop_times[mask].sort_values("departure_time")
+    trips: List[str] = filtered["trip_id"].unique().tolist()
+
+    unique_schedules: List[List[Tuple[int, str]]] = []
+    trip_to_schedule: Dict[str, int] = {}
+
+    for trip in trips:
+        trip_stops: pd.DataFrame = stop_times[
+            stop_times["trip_id"] == trip
+        ].sort_values("stop_sequence")
+
+        dt_start = legacy_safe_parse_time(trip_stops.iloc[0]["departure_time"])
+        start_minutes: int = dt_start.hour * 60 + dt_start.minute
+        trip_start_times[trip] = start_minutes * 60 + dt_start.second
+
+        stop_times_list: List[Tuple[int, str]] = []
+        for _, row in trip_stops.iterrows():
+            dt_stop = legacy_safe_parse_time(row["departure_time"])
+            offset = dt_stop.hour * 60 + dt_stop.minute - start_minutes
+            if offset < 0:
+                offset += 1440
+            stop_times_list.append((offset, str(row["stop_id"])))
+
+        schedule_index: int = -1
+        for i, schedule in enumerate(unique_schedules):
+            if schedule == stop_times_list:
+                schedule_index = i
+                break
+
+        if schedule_index == -1:
+            unique_schedules.append(stop_times_list)
+            schedule_index = len(unique_schedules) - 1
+
+        trip_to_schedule[trip] = schedule_index
+
+    for trip_id, schedule_index in trip_to_schedule.items():
+        trip_to_route_schedule[trip_id] = (route, schedule_index)
+
+
+def legacy_safe_parse_time(time_str: str) -> pd.Timestamp:
+    """
+    The original per-cell time parser, rolling '24:MM:SS' over to the next day.
+    """
+    parts = time_str.split(":")
+    if len(parts) == 3 and int(parts[0]) >= 24:
+        total_seconds = int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
+        total_seconds = total_seconds % (24 * 3600)
+        time_str = (
+            f"{total_seconds // 3600:02}:"
+            f"{(total_seconds % 3600) // 60:02}:"
+            f"{total_seconds % 60:02}"
+        )
+    return pd.to_datetime(time_str, format="%H:%M:%S")
+
+
+def compare_determine_schedule() -> None:
+    """
+    Runs the legacy and current schedule determination over every route, checks
+    that both produce the same mappings and prints how long each took.
+    """
+    legacy_route_schedule: Dict[str, Tuple[str, int]] = {}
+    legacy_start_times: Dict[str, int] = {}
+
+    # The legacy path works on the untyped frame straight from the CSV
+    stop_times = pd.read_csv("Timetable Generator/stop_times.csv")
+
+    start = time.perf_counter()
+    for route in generateTimetable.ROUTES:
+        legacy_determine_schedule(
+            stop_times,
+            route,
+            legacy_route_schedule,
+            legacy_start_times,
+        )
+    legacy_seconds = time.perf_counter() - start
+
+    timetable = generateTimetable.TimetableContext()
+    timetable.load_feed()
+
+    start = time.perf_counter()
+    # determine_schedule prints every schedule, which is not what we are timing
+    with contextlib.redirect_stdout(io.StringIO()):
+        for route in generateTimetable.ROUTES:
+            timetable.determine_schedule(route)
+    current_seconds = time.perf_counter() - start
+
+    matches = (
+        legacy_route_schedule == timetable.trip_to_route_schedule
+        and legacy_start_times == timetable.trip_start_times
+    )
+
+    print(f"Legacy determine_schedule:  {legacy_seconds:8.3f} s")
+    print(f"Current determine_schedule: {current_seconds:8.3f} s")
+    print(f"Speedup: {legacy_seconds / current_seconds:.1f}x")
+    print(f"Results match: {matches}")
+
+
+def legacy_process_tracked_trains(
+    trains: List[Dict[str, Any]],
+    trip_to_route_schedule: Dict[str, Tuple[str, int]],
+    trip_start_times: Dict[str, int],
+    seen_trains: Dict[str, Tuple[int, str]],
+    block_schedules: Dict[Tuple[str, int], Dict[int, List[int]]],
+) -> None:
+    """
+    The original per-train loop of monitor_trains, kept as a reference: two
+    lookups per train, a local datetime per train and tuples in seen_trains.
+    """
+    for train in trains:
+        if train.get("tripId") and train.get("currentBlock"):
+            train_id = train["trainId"]
+            trip_id = train["tripId"]
+            block = train["currentBlock"]
+            timestamp = train["position"]["timestamp"]
+
+            result = trip_to_route_schedule.get(trip_id)
+            if result:
+                route, schedule = result
+
+                trip_start_time = trip_start_times.get(trip_id)
+                if trip_start_time is not None:
+                    dt = datetime.fromtimestamp(timestamp)
+                    current_seconds = dt.hour * 3600 + dt.minute * 60 + dt.second
+                    seconds_since_start = current_seconds - trip_start_time
+
+                    prev_block_info = seen_trains.get(train_id)
+                    if (
+                        prev_block_info is None
+                        or prev_block_info[0] != block
+                        or prev_block_info[1] != trip_id
+                    ):
+                        blocks = block_schedules.setdefault((route, schedule), {})
+                        blocks.setdefault(block, []).append(seconds_since_start)
+                        seen_trains[train_id] = (block, trip_id)
+                        print(
+                            f"Train {train_id} entered Block {block} at {seconds_since_start} secs "
+                            f"for Route: {route} Schedule: {schedule}"
+                        )
+
+
+def compare_process_tracked_trains(capture_path: str, snapshot_path: str) -> None:
+    """
+    Runs the legacy and current per-train loops over every poll of a capture
+    from trackedTrainsCapture.py, checks that both record the same block
+    entries and prints how many train positions per second each got through.
+    JSON parsing is done up front and not timed.
+    """
+    from trackedTrainsCapture import read_capture
+
+    # The legacy loop converts timestamps in the host's zone
+    os.environ["TZ"] = "Pacific/Auckland"
+    time.tzset()
+
+    polls = [json.loads(body) for _, body in read_capture(capture_path)]
+    positions = sum(len(poll) for poll in polls)
+
+    timetable = generateTimetable.TimetableContext(
+        schedule_snapshot_path=snapshot_path, journal_path=None
+    )
+    if not timetable.load_schedules_from_snapshot():
+        raise SystemExit(f"No usable schedule snapshot at {snapshot_path}")
+
+    legacy_seen: Dict[str, Tuple[int, str]] = {}
+    legacy_blocks: Dict[Tuple[str, int], Dict[int, List[int]]] = {}
+    # Both loops print every entry, which is not what we are timing
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for poll in polls:
+            legacy_process_tracked_trains(
+                poll,
+                timetable.trip_to_route_schedule,
+                timetable.trip_start_times,
+                legacy_seen,
+                legacy_blocks,
+            )
+        legacy_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for poll in polls:
+            timetable.process_tracked_trains(poll)
+        current_seconds = time.perf_counter() - start
+
+    print(f"{len(polls)} polls, {positions} train positions")
+    print(f"Legacy per-train loop:  {positions / legacy_seconds:12,.0f} trains/s")
+    print(f"Current per-train loop: {positions / current_seconds:12,.0f} trains/s")
+    print(f"Speedup: {legacy_seconds / current_seconds:.1f}x")
+    print(f"Results match: {legacy_blocks == timetable.block_schedules}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compares the current timetable code against the original"
+    )
+    parser.add_argument(
+        "--capture",
+        default=None,
+        help="Benchmark the per-train loop on this capture instead of "
+        "determining schedules",
+    )
+    parser.add_argument(
+        "--snapshot",
+        default="Timetable Generator/schedule_snapshot.json",
+        help="Schedule snapshot to look the capture's trips up in",
+    )
+    args = parser.parse_args()
+
+    if args.capture:
+        compare_process_tracked_trains(args.capture, args.snapshot)
+    else:
+        compare_determine_schedule()
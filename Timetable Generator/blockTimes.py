@@ -0,0 +1,133 @@
+import math
+from typing import Any, Dict, Iterable, Iterator, List, Union
+
+
+class BlockTimeHistogram:
+    """
+    Block entry times (seconds since trip start) kept as counts per second
+    instead of one list entry per observation.
+
+    Entry times are whole seconds within a trip's length, so the number of
+    distinct values stays bounded however long collection runs, and every
+    median or percentile is exactly what the full list would give. Merging
+    two histograms adds their counts, so sessions combine without any loss.
+
+    It can stand in for the list it replaces: append adds one observation,
+    len counts observations and iterating yields every observation in order.
+    """
+
+    __slots__ = ("counts", "total")
+
+    def __init__(self, values: Iterable[int] = ()) -> None:
+        # seconds since trip start -> number of observations
+        self.counts: Dict[int, int] = {}
+        self.total = 0
+        for value in values:
+            self.append(value)
+
+    def append(self, seconds: int, count: int = 1) -> None:
+        """Adds count observations of seconds"""
+        self.counts[seconds] = self.counts.get(seconds, 0) + count
+        self.total += count
+
+    def merge(self, other: "BlockTimeHistogram") -> None:
+        """Adds all of other's observations to this histogram"""
+        for seconds, count in other.counts.items():
+            self.append(seconds, count)
+
+    def copy(self) -> "BlockTimeHistogram":
+        """Returns an independent copy"""
+        histogram = BlockTimeHistogram()
+        histogram.counts = dict(self.counts)
+        histogram.total = self.total
+        return histogram
+
+    def __len__(self) -> int:
+        return self.total
+
+    def __iter__(self) -> Iterator[int]:
+        for seconds in sorted(self.counts):
+            for _ in range(self.counts[seconds]):
+                yield seconds
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, BlockTimeHistogram):
+            return NotImplemented
+        return self.counts == other.counts
+
+    def __repr__(self) -> str:
+        return (
+            f"BlockTimeHistogram({self.total} observations, {len(self.counts)} values)"
+        )
+
+    def percentile(self, percent: float) -> float:
+        """
+        Returns the given percentile, interpolating linearly between the two
+        nearest observations (as numpy.percentile does by default).
+
+        Args:
+            percent: Percentile to return, from 0 to 100
+
+        Returns:
+            The percentile in seconds since trip start.
+        """
+        if not self.total:
+            raise ValueError("no observations in histogram")
+        position = (self.total - 1) * percent / 100
+        lower_rank = math.floor(position)
+        upper_rank = math.ceil(position)
+
+        lower = upper = None
+        seen = 0
+        for seconds in sorted(self.counts):
+            seen += self.counts[seconds]
+            if lower is None and seen > lower_rank:
+                lower = seconds
+            if seen > upper_rank:
+                upper = seconds
+                break
+
+        fraction = position - lower_rank
+        if not fraction or lower == upper:
+            return lower
+        return lower + (upper - lower) * fraction
+
+    def median(self) -> float:
+        """Returns the median, as statistics.median of every observation would"""
+        return self.percentile(50)
+
+    def to_json(self) -> Dict[str, str]:
+        """
+        Returns a compact JSON form: one "seconds:count" pair per distinct value,
+        in order, joined into a single string.
+        """
+        pairs = ",".join(
+            f"{seconds}:{self.counts[seconds]}" for seconds in sorted(self.counts)
+        )
+        return {"histogram": pairs}
+
+    @classmethod
+    def from_json(cls, data: Union[Dict[str, str], List[int]]) -> "BlockTimeHistogram":
+        """
+        Reads a histogram from its JSON form, or from a plain list of block times
+        as saved before histograms existed.
+        """
+        if isinstance(data, list):
+            return cls(data)
+        histogram = cls()
+        pairs = data.get("histogram", "")
+        if pairs:
+            for pair in pairs.split(","):
+                seconds, count = pair.split(":")
+                histogram.append(int(seconds), int(count))
+        return histogram
+
+
+def block_times_to_json(times: Any) -> Any:
+    """
+    Returns the JSON form of one block's times, copied so it stays valid while
+    the original keeps being updated.
+    """
+    if isinstance(times, BlockTimeHistogram):
+        return times.to_json()
+    return list(times)
@@ -0,0 +1,247 @@
+"""
+Collects block times of several networks in one process.
+
+Every city's routes are named "LINE__DIRECTION". A GTFS .zip or directory has
+its trips selected from trips.txt and calendar.txt (see
+gtfsFeed.feed_trip_routes), so any network's feed can be used. A bare
+stop_times.csv has only its trip_ids to go on, so it must use Metlink's layout
+("JVL__1__9265__RAIL__Rail_MTuWThF-XHol_20250817"); load_cities rejects one
+that does not.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from typing import List, NamedTuple, Optional, Tuple
+
+from generateTimetable import (
+    FEED_DATE,
+    SERVICE_PATTERN,
+    TimetableContext,
+    add_monitor_arguments,
+    export_metrics,
+    monitor_trains_async,
+)
+from pollScheduler import PollScheduler
+from trackedTrains import TrackedTrainsClient, pooled_session
+
+
+class CityConfig(NamedTuple):
+    """
+    One network to collect block times for, as listed in a cities file:
+
+        [
+            {
+                "name": "WLG",
+                "url": "http://localhost:3000/wlg-ltm/api/trackedtrains",
+                "feed": "Timetable Generator/stop_times.csv",
+                "routes": ["JVL__0", "JVL__1", ...],
+                "data_dir": "Timetable Generator"
+            },
+            ...
+        ]
+
+    service_pattern, feed_date and timezone are optional. A route's LINE is a
+    route_id or route_short_name of the feed and its DIRECTION a direction_id;
+    a bare stop_times.csv names them in its trip_ids instead.
+    """
+
+    name: str
+    # Tracked-trains endpoint of this network's backend
+    url: str
+    # GTFS .zip as published, a directory of its extracted files, or a bare
+    # stop_times.csv of Metlink trip_ids
+    feed: str
+    # Route/direction pairs whose schedules are determined before monitoring
+    routes: List[str]
+    # Holds this network's block schedules, journal, schedule snapshot and store
+    data_dir: str
+    # Days the selected trips run on, e.g. "MTuWThF" (matched against the
+    # service_ids of a feed without calendar.txt)
+    service_pattern: str = SERVICE_PATTERN
+    # YYYYMMDD: the services in effect the week starting on it, or the date in
+    # Metlink trip_ids
+    feed_date: str = FEED_DATE
+    # Zone the network's timetables are in (default: localTime.NETWORK_TIMEZONE)
+    timezone: Optional[str] = None
+
+
+def load_cities(path: str, only: Optional[List[str]] = None) -> List[CityConfig]:
+    """
+    Reads a cities file. Every city needs a name and data_dir of its own, so no
+    two share a schedule index or observation files.
+
+    Args:
+        path: Cities file
+        only: Names of the cities to keep (default: every city in the file)
+
+    Raises:
+        ValueError: If cities share a name or data_dir, a name in only is not
+            in the file, a kept city's routes are not LINE__DIRECTION, its
+            service_pattern is not made of days while its feed has a
+            calendar.txt, or its feed is a bare stop_times.csv whose trip_ids
+            are not laid out as Metlink's are.
+    """
+    from gtfsFeed import has_feed_file, service_days, unparsable_trip_ids
+
+    with open(path, "r") as f:
+        cities = [CityConfig(**city) for city in json.load(f)]
+    for attribute in ("name", "data_dir"):
+        values = [os.path.normpath(getattr(city, attribute)) for city in cities]
+        if len(set(values)) != len(values):
+            raise ValueError(f"Cities in {path} share a {attribute}")
+
+    if only:
+        unknown = set(only) - {city.name for city in cities}
+        if unknown:
+            raise ValueError(f"No such cities in {path}: {sorted(unknown)}")
+        cities = [city for city in cities if city.name in only]
+
+    for city in cities:
+        routes = [route for route in city.routes if len(route.split("__")) != 2]
+        if routes:
+            raise ValueError(f"{city.name}: routes are not LINE__DIRECTION: {routes}")
+        if has_feed_file(city.feed, "calendar.txt"):
+            try:
+                service_days(city.service_pattern)
+            except ValueError as e:
+                raise ValueError(f"{city.name}: {e}") from None
+        trip_ids = unparsable_trip_ids(city.feed)
+        if trip_ids:
+            raise ValueError(
+                f"{city.name}: {city.feed} has no trips.txt and trip_ids not laid "
+                f"out as Metlink's, e.g. {trip_ids[0]!r}"
+            )
+    return cities
+
+
+def city_timetable(
+    city: CityConfig,
+    block_histograms: bool = False,
+    store: bool = False,
+    seen_train_ttl: float = 30 * 60,
+) -> TimetableContext:
+    """
+    Creates the context of one city, with every file it reads or writes in the
+    city's data_dir.
+
+    Args:
+        city: City to collect block times for
+        block_histograms: Keep block entry times as histograms
+        store: Record block entries in data_dir/observations.db instead of
+            block_schedules.json
+        seen_train_ttl: Seconds after which a train that has not been seen is
+            forgotten
+    """
+    return TimetableContext(
+        feed_path=city.feed,
+        block_schedules_path=os.path.join(city.data_dir, "block_schedules.json"),
+        routes=city.routes,
+        schedule_snapshot_path=os.path.join(city.data_dir, "schedule_snapshot.json"),
+        block_histograms=block_histograms,
+        journal_path=os.path.join(city.data_dir, "block_schedules.journal"),
+        store_path=os.path.join(city.data_dir, "observations.db") if store else None,
+        seen_train_ttl=seen_train_ttl,
+        timezone=city.timezone,
+        service_pattern=city.service_pattern,
+        feed_date=city.feed_date,
+        name=city.name,
+    )
+
+
+def monitor_cities(
+    cities: List[Tuple[TimetableContext, TrackedTrainsClient]],
+    save_interval: Optional[float] = None,
+) -> None:
+    """
+    Monitors several cities in one event loop until interrupted, each through
+    its own fetch, process and persist stages, so a slow or failing backend
+    holds up only its own city.
+
+    Each city gets its own PollScheduler, as every backend updates on its own
+    cadence; the polls themselves share the clients' connection pools and the
+    event loop's worker threads.
+
+    Args:
+        cities: Context and client of each city
+        save_interval: How often to save each city's JSON file in seconds
+            (default: each context's save_interval())
+    """
+    schedulers = [PollScheduler() for _ in cities]
+
+    async def monitor_all() -> None:
+        await asyncio.gather(
+            *(
+                monitor_trains_async(
+                    timetable, client, save_interval, scheduler=scheduler
+                )
+                for (timetable, client), scheduler in zip(cities, schedulers)
+            )
+        )
+
+    print(f"\n=== Starting continuous monitoring of {len(cities)} cities ===")
+    try:
+        asyncio.run(monitor_all())
+    except KeyboardInterrupt:
+        print("\nMonitoring stopped by user")
+        for timetable, client in cities:
+            print(
+                f"[{timetable.name}] Tracked trains requests: "
+                f"{client.latency.summary()}"
+            )
+    finally:
+        for timetable, client in cities:
+            client.close()
+            # Saves one final time before exiting
+            timetable.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Records block times of several cities in one process"
+    )
+    parser.add_argument(
+        "--cities",
+        default="Timetable Generator/cities.json",
+        help="JSON list of the cities to collect (see CityConfig)",
+    )
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        default=None,
+        help="Names of the cities to collect (default: every city in the file)",
+    )
+    parser.add_argument(
+        "--store",
+        action="store_true",
+        help="Record block entries in each city's observations.db instead of "
+        "block_schedules.json",
+    )
+    add_monitor_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        configs = load_cities(args.cities, args.only)
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    # One session for every city, keeping a connection pool per backend host
+    session = pooled_session(hosts=max(4, len(configs)))
+    cities = []
+    for city in configs:
+        os.makedirs(city.data_dir, exist_ok=True)
+        timetable = city_timetable(
+            city, args.histograms, args.store, args.seen_ttl * 60
+        )
+        timetable.log_entries = not args.quiet
+        print(f"\n=== Preparing {timetable.name} ===")
+        timetable.prepare(args.incremental, args.jobs)
+        cities.append((timetable, TrackedTrainsClient(city.url, session=session)))
+
+    exporter = export_metrics(cities, args)
+    try:
+        monitor_cities(cities)
+    finally:
+        if exporter is not None:
+            exporter.close(args.metrics_file)
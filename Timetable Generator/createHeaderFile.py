@@ -1,7 +1,9 @@
+import argparse
 import json
 import re
-import statistics
-from typing import Dict, List, Tuple, Any
+from typing import Dict, List, Tuple, Any, Union
+
+from blockTimes import BlockTimeHistogram
 
 # STATION_BLOCKS = {100, 101, 102, 103, 104}
 STATION_BLOCKS = {}
@@ -78,7 +80,7 @@ def process_route_set(
 
     # Process each schedule that matches this filter
     for schedule_key, entry in data.items():
-        if filter_str not in schedule_key:
+        if filter_str not in schedule_key or "_Schedule_" not in schedule_key:
             continue
 
         # Generate class name
@@ -92,9 +94,11 @@ def process_route_set(
         # Calculate averages
         averages: List[Tuple[float, int]] = []
         for block, times in blocks_times.items():
+            # Saved either as a list of every observation or as a histogram
+            times = BlockTimeHistogram.from_json(times)
             if times:
                 # avg = sum(times) / len(times)
-                avg = statistics.median(times)
+                avg = times.median()
 
                 averages.append((avg, int(block)))
 
@@ -221,12 +225,27 @@ def process_route_set(
 
 
 def generate_cpp_header(
-    filename: str = "block_schedules.json", output_file: str = f"{VERSION}_Timetable.h"
+    filename: Union[str, List[str]] = "block_schedules.json",
+    output_file: str = f"{VERSION}_Timetable.h",
 ):
-    """Generate C++ header file from block schedules JSON with multiple route sets"""
+    """
+    Generate C++ header file from block schedules JSON with multiple route sets.
+    filename may instead be a SQLite observation store (.db), which is read as
+    per-block grouped counts and can be written by a collector at the same time,
+    or a list of the shards written by shardedCollector.py, read as one dataset.
+    """
+
+    if not isinstance(filename, str):
+        from shardedCollector import ShardedBlockSchedules
 
-    with open(filename, "r") as f:
-        data = json.load(f)
+        data = ShardedBlockSchedules(filename)
+    elif filename.endswith(".db"):
+        from observationStore import block_schedules_from_store
+
+        data = block_schedules_from_store(filename)
+    else:
+        with open(filename, "r") as f:
+            data = json.load(f)
 
     # Start writing the header file
     with open(output_file, "w") as f:
@@ -256,7 +275,18 @@ def generate_cpp_header(
 
 
 if __name__ == "__main__":
-    # Generate the header file
-    generate_cpp_header(
-        "Timetable Generator/block_schedules.json", f"include/{VERSION}_Timetable.h"
+    parser = argparse.ArgumentParser(
+        description="Generates the timetable header from recorded block times"
     )
+    parser.add_argument(
+        "--input",
+        nargs="+",
+        default=["Timetable Generator/block_schedules.json"],
+        help="block_schedules.json, or a SQLite observation store (.db); "
+        "several (e.g. the shards of shardedCollector.py) are read as one",
+    )
+    args = parser.parse_args()
+
+    # Generate the header file
+    inputs = args.input[0] if len(args.input) == 1 else args.input
+    generate_cpp_header(inputs, f"include/{VERSION}_Timetable.h")
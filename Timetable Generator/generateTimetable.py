@@ -1,381 +1,1741 @@
-import pandas as pd
-import requests
+import argparse
+import asyncio
+import sys
 import time
 import json
-from typing import List, Tuple, Dict, Any, Optional
+from typing import (
+    TYPE_CHECKING,
+    Collection,
+    List,
+    NamedTuple,
+    Tuple,
+    Dict,
+    Any,
+    Optional,
+)
 import os
 
-
-def fetch_tracked_trains() -> Optional[List[Dict[str, Any]]]:
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+    from localTime import MidnightClock
+    from monitorMetrics import MetricsExporter, MonitorMetrics
+    from observationLog import ObservationJournal
+    from observationStore import ObservationStore
+    from pollScheduler import PollScheduler
+    from trackedTrains import TrackedTrainsClient
+
+# Only weekday trips of this feed are used to build schedules
+SERVICE_PATTERN: str = "MTuWThF"
+FEED_DATE: str = "20250817"
+
+# Seconds between full rewrites of block_schedules.json, which a crash can
+# lose everything since
+SAVE_INTERVAL: int = 120
+# Seconds between compactions of the journal into block_schedules.json; a crash
+# loses nothing journaled, so compacting can be rare
+COMPACT_INTERVAL: int = 30 * 60
+
+# Route/direction pairs whose schedules are determined before monitoring
+ROUTES: List[str] = [
+    "JVL__0",
+    "JVL__1",
+    "MEL__0",
+    "MEL__1",
+    "WRL__0",
+    "WRL__1",
+    "HVL__0",
+    "HVL__1",
+    "KPL__0",
+    "KPL__1",
+]
+
+
+class TimetableContext:
     """
-    Fetches tracked train data from the API endpoint.
+    Holds the GTFS feed and everything derived from it or collected while
+    monitoring: the trip -> (route, schedule) mapping, trip start times, block
+    schedules and the trains seen so far.
 
-    Returns:
-        List of tracked train dictionaries, or None if request fails.
+    Nothing is read at construction. The feed (and pandas with it) is loaded on
+    the first call that needs it, so importing this module stays cheap.
     """
-    try:
-        response = requests.get("http://localhost:3000/wlg-ltm/api/trackedtrains")
-        response.raise_for_status()  # Raises an HTTPError for bad responses
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching tracked trains: {e}")
-        return None
-    except ValueError as e:  # JSON decode error
-        print(f"Error parsing JSON response: {e}")
-        return None
-
 
-def safe_parse_time(time_str: str) -> pd.Timestamp:
-    """
-    Safely parse a time string, handling '24:MM:SS' by rolling over to the next day.
-    """
-    parts = time_str.split(":")
-    if len(parts) == 3 and int(parts[0]) >= 24:
-        # Roll over to next day, keep minutes and seconds
-        hours = int(parts[0])
-        minutes = int(parts[1])
-        seconds = int(parts[2])
-        # Calculate total seconds since midnight
-        total_seconds = hours * 3600 + minutes * 60 + seconds
-        # Get time modulo 24 hours
-        total_seconds = total_seconds % (24 * 3600)
-        new_hours = total_seconds // 3600
-        new_minutes = (total_seconds % 3600) // 60
-        new_seconds = total_seconds % 60
-        time_str = f"{new_hours:02}:{new_minutes:02}:{new_seconds:02}"
-    return pd.to_datetime(time_str, format="%H:%M:%S")
-
-
-def save_block_schedules_to_json(
-    filename: str = "Timetable Generator/block_schedules.json",
-) -> None:
-    """
-    Saves the current block schedules to a JSON file.
-
-    Args:
-        filename: Name of the file to save to (default: "Timetable Generator/block_schedules.json")
-    """
-    try:
+    def __init__(
+        self,
+        feed_path: str = "Timetable Generator/stop_times.csv",
+        block_schedules_path: str = "Timetable Generator/block_schedules.json",
+        routes: Optional[List[str]] = None,
+        schedule_snapshot_path: str = "Timetable Generator/schedule_snapshot.json",
+        block_histograms: bool = False,
+        journal_path: Optional[str] = "Timetable Generator/block_schedules.journal",
+        store_path: Optional[str] = None,
+        seen_train_ttl: float = 30 * 60,
+        timezone: Optional[str] = None,
+        service_pattern: str = SERVICE_PATTERN,
+        feed_date: str = FEED_DATE,
+        name: Optional[str] = None,
+    ) -> None:
+        # GTFS .zip as published, or an extracted stop_times.csv
+        self.feed_path = feed_path
+        # Only trips running on these days of this feed are used
+        self.service_pattern = service_pattern
+        self.feed_date = feed_date
+        # Network name prefixed to log lines, when several are monitored at once
+        self.name = name
+        # Counters and histograms for Prometheus, if exported
+        self.metrics: Optional["MonitorMetrics"] = None
+        # Print a line for every block entry
+        self.log_entries = True
+        self.block_schedules_path = block_schedules_path
+
+        # Append-only log of block entries since block_schedules was last saved.
+        # Opened by load_block_schedules_from_json; None saves by full rewrites
+        self.journal_path = journal_path
+        self.journal: Optional["ObservationJournal"] = None
+
+        # SQLite database recording every block entry instead of the JSON file.
+        # Opened by load_block_schedules_from_store
+        self.store_path = store_path
+        self.store: Optional["ObservationStore"] = None
+
+        # Schedules and trip digests of the last processed feed, for diffing
+        self.schedule_snapshot_path = schedule_snapshot_path
+
+        # Only these routes' trips are read from the feed
+        self.routes: List[str] = list(ROUTES if routes is None else routes)
+
+        # trip_id -> (route, schedule) mapping
+        self.trip_to_route_schedule: Dict[str, Tuple[str, int]] = {}
+
+        # Trip start times (trip_id -> start_timestamp)
+        self.trip_start_times: Dict[str, int] = {}
+
+        # Both of the above in one record per trip, for the per-train loop.
+        # Rebuilt on first use after the schedules change
+        self.trip_info: Optional[Dict[str, TripInfo]] = None
+
+        # Distinct schedules of each route, indexed by schedule number
+        self.route_schedules: Dict[str, List[Tuple[Tuple[int, str], ...]]] = {}
+
+        # Block schedules for each (route, schedule): the entry times of each block,
+        # as a list of every observation or, with block_histograms, as a
+        # BlockTimeHistogram whose size stays bounded
+        self.block_histograms = block_histograms
+        self.block_schedules: Dict[Tuple[str, int], Dict[int, Any]] = {}
+        # Block entry times held in block_schedules
+        self.observations = 0
+
+        # Bumped whenever a (route, schedule) gets a block entry, so snapshots
+        # only copy the schedules that changed since the last one
+        self.block_versions: Dict[Tuple[str, int], int] = {}
+        # (route, schedule) -> (blocks, version, JSON form) of the last snapshot.
+        # A JSON form is never modified once made, so snapshots share them
+        self.snapshot_entries: Dict[Tuple[str, int], Tuple[Any, int, Any]] = {}
+        # Snapshot key -> (JSON form, its text) last written, used by the writer
+        self.snapshot_texts: Dict[str, Tuple[Any, str]] = {}
+        self.save_stats = SaveStats()
+
+        # Trains we've seen, to calculate entry times: train_id -> SeenTrain. Saved
+        # with the block schedules, so a restart does not record every train's
+        # current block as a new entry; trains not seen for seen_train_ttl
+        # seconds are evicted
+        self.seen_trains: Dict[str, SeenTrain] = {}
+        self.seen_train_ttl = seen_train_ttl
+        # Position timestamp after which seen_trains is next swept
+        self.next_eviction = 0.0
+
+        # Converts position timestamps to the network's local time of day
+        # (default zone: localTime.NETWORK_TIMEZONE), created on first use
+        self.timezone = timezone
+        self.clock: Optional["MidnightClock"] = None
+
+        # Loaded by load_feed()
+        self.stop_times: Optional["pd.DataFrame"] = None
+
+        # stop_times sorted by (trip_id, stop_sequence); each trip's stops are the
+        # contiguous rows trip_row_ranges[trip_id] = (start, end) of these arrays
+        self.trip_stop_offsets: Optional["np.ndarray"] = None  # mins after 1st stop
+        self.trip_stop_seconds: Optional["np.ndarray"] = None  # secs since midnight
+        self.trip_stop_id_codes: Optional["np.ndarray"] = None  # into stop_id_names
+        self.stop_id_names: Optional["np.ndarray"] = None
+        self.trip_row_ranges: Dict[str, Tuple[int, int]] = {}
+
+        # One row per trip indexed by (line, direction, feed_date)
+        self.trip_index: Optional["pd.DataFrame"] = None
+
+    def load_feed(self) -> None:
+        """
+        Loads the stop_times of this context's routes (through the on-disk cache)
+        and builds the per-trip and per-route indexes every determine_schedule
+        call shares.
+        """
+        from gtfsFeed import (
+            TripFilter,
+            build_trip_index,
+            feed_trip_routes,
+            load_stop_times,
+            read_calendar,
+            read_trips,
+            service_window,
+        )
+
+        trip_filter = TripFilter(
+            tuple(self.routes), self.service_pattern, self.feed_date
+        )
+        self.stop_times = load_stop_times(self.feed_path, trip_filter=trip_filter)
+        self.index_stop_times_by_trip()
+        # Routes of the trips come from trips.txt if the feed has one
+        self.trip_index = build_trip_index(
+            self.stop_times, feed_trip_routes(self.feed_path, trip_filter)
+        )
+
+        # A full GTFS feed says when its services run, worth knowing when a new
+        # feed is published
+        trips = read_trips(self.feed_path)
+        calendar = read_calendar(self.feed_path)
+        if trips is not None and calendar is not None:
+            used = trips["trip_id"].isin(self.trip_index["trip_id"])
+            window = service_window(calendar, set(trips.loc[used, "service_id"]))
+            if window:
+                print(f"Feed services run from {window[0]} to {window[1]}")
+
+    def release_feed(self) -> None:
+        """
+        Drops the loaded feed and the indexes built from it, keeping the
+        schedules worked out from them. Monitoring only needs the schedules, so
+        a collector can let go of the feed once they are determined; it is
+        loaded again if anything needs it.
+        """
+        self.stop_times = None
+        self.trip_stop_offsets = None
+        self.trip_stop_seconds = None
+        self.trip_stop_id_codes = None
+        self.stop_id_names = None
+        self.trip_row_ranges = {}
+        self.trip_index = None
+
+    def index_stop_times_by_trip(self) -> None:
+        """
+        Sorts stop_times once by trip_id and stop_sequence, records the row range
+        of every trip and computes every stop's offset from its trip's first stop,
+        so a trip's schedule can be sliced out instead of scanning the whole frame.
+        """
+        import numpy as np
+
+        from gtfsFeed import SECONDS_PER_DAY
+
+        stop_times = self.stop_times
+        trip_ids: "pd.Categorical" = stop_times["trip_id"].array
+        stop_ids: "pd.Categorical" = stop_times["stop_id"].array
+        order = np.lexsort((stop_times["stop_sequence"].to_numpy(), trip_ids.codes))
+        trip_codes = trip_ids.codes[order]
+
+        # A new trip starts wherever the trip_id differs from the previous row
+        is_first_stop = np.ones(len(trip_codes), dtype=bool)
+        is_first_stop[1:] = trip_codes[1:] != trip_codes[:-1]
+        starts = np.flatnonzero(is_first_stop)
+        ends = np.append(starts[1:], len(trip_codes))[: len(starts)]
+        trip_names = trip_ids.categories
+        self.trip_row_ranges = {
+            trip_names[code]: (start, end)
+            for code, start, end in zip(
+                trip_codes[starts].tolist(), starts.tolist(), ends.tolist()
+            )
+        }
+
+        # Times of 24:00:00 and later roll over to the next day
+        seconds = stop_times["departure_seconds"].to_numpy()[order] % SECONDS_PER_DAY
+        minutes = seconds // 60
+
+        # Offsets in whole minutes, adding a day if the trip crossed midnight
+        offsets = minutes - np.repeat(minutes[starts], ends - starts)
+        offsets[offsets < 0] += 1440
+
+        self.trip_stop_offsets = offsets
+        self.trip_stop_seconds = seconds
+        self.trip_stop_id_codes = stop_ids.codes[order]
+        self.stop_id_names = stop_ids.categories.to_numpy(dtype=object)
+
+    def block_schedules_snapshot(self) -> Dict[str, Any]:
+        """
+        Builds the JSON form of block_schedules (with start times per schedule).
+        Block times are copied, so the result can be written out while
+        monitoring carries on appending to them.
+
+        Only schedules that changed since the last snapshot are copied; the
+        others reuse the last snapshot's (never modified) JSON form, so taking a
+        snapshot costs little on the monitor's thread.
+        """
+        from blockTimes import block_times_to_json
+
+        started = time.perf_counter()
         # Build the requested format
         serializable_schedules = {}
+        schedule_start_times = self.schedule_start_times()
+        snapshot_entries = {}
+
+        for (route, schedule), blocks in self.block_schedules.items():
+            key = f"{route}_Schedule_{schedule}"
+            # Get start times for all trips in this route/schedule
+            start_times = schedule_start_times.get((route, schedule), [])
+            version = self.block_versions.get((route, schedule), 0)
+
+            cached = self.snapshot_entries.get((route, schedule))
+            if (
+                cached is not None
+                and cached[0] is blocks
+                and cached[1] == version
+                and cached[2]["start_times"] == start_times
+            ):
+                entry = cached[2]
+            else:
+                # Convert blocks dict to serializable format
+                serializable_blocks = {}
+                for block, seconds_list in blocks.items():
+                    serializable_blocks[str(block)] = block_times_to_json(seconds_list)
+                entry = {
+                    "start_times": start_times,
+                    "blocks_times": serializable_blocks,
+                }
+            snapshot_entries[(route, schedule)] = (blocks, version, entry)
+            serializable_schedules[key] = entry
+        self.snapshot_entries = snapshot_entries
+
+        serializable_schedules["seen_trains"] = {
+            train_id: seen.to_json() for train_id, seen in self.seen_trains.items()
+        }
+        if self.journal is not None:
+            # The journal that carries on from this snapshot
+            serializable_schedules["journal_generation"] = self.journal.generation
+        self.save_stats.record_snapshot(time.perf_counter() - started)
+        return serializable_schedules
+
+    def block_schedules_json(self, snapshot: Dict[str, Any]) -> str:
+        """
+        Returns the text json.dump(snapshot, indent=2) would write. Entries
+        the last written snapshot shared are not encoded again.
+        """
+        texts = {}
+        parts = []
+        for key, value in snapshot.items():
+            cached = self.snapshot_texts.get(key)
+            if cached is not None and cached[0] is value:
+                text = cached[1]
+            else:
+                # Indented one level deeper, as it is nested in the snapshot
+                text = json.dumps(value, indent=2).replace("\n", "\n  ")
+            texts[key] = (value, text)
+            parts.append(f"  {json.dumps(key)}: {text}")
+        self.snapshot_texts = texts
+        if not parts:
+            return "{}"
+        return "{\n" + ",\n".join(parts) + "\n}"
+
+    def schedule_start_times(self) -> Dict[Tuple[str, int], List[int]]:
+        """
+        Returns the start times (seconds since midnight) of the trips of each
+        (route, schedule).
+        """
         # Build a reverse lookup: (route, schedule) -> list of trip_ids
-        route_schedule_to_trips = {}
-        for trip_id, (route, schedule) in trip_to_route_schedule.items():
+        route_schedule_to_trips: Dict[Tuple[str, int], List[str]] = {}
+        for trip_id, (route, schedule) in self.trip_to_route_schedule.items():
             key = (route, schedule)
             route_schedule_to_trips.setdefault(key, []).append(trip_id)
 
-        for (route, schedule), blocks in block_schedules.items():
-            key = f"{route}_Schedule_{schedule}"
-            # Get start times for all trips in this route/schedule
-            trip_ids = route_schedule_to_trips.get((route, schedule), [])
-            start_times = [
-                trip_start_times[tid] for tid in trip_ids if tid in trip_start_times
+        return {
+            key: [
+                self.trip_start_times[tid]
+                for tid in trip_ids
+                if tid in self.trip_start_times
             ]
-            # Convert blocks dict to serializable format
-            serializable_blocks = {}
+            for key, trip_ids in route_schedule_to_trips.items()
+        }
+
+    def write_block_schedules(
+        self, snapshot: Dict[str, Any], filename: Optional[str] = None
+    ) -> bool:
+        """
+        Writes a snapshot from block_schedules_snapshot to a JSON file. The file
+        is replaced atomically, so a crash leaves the previous snapshot intact.
+
+        Args:
+            snapshot: Block schedules in their JSON form
+            filename: Name of the file to save to (default: block_schedules_path)
+
+        Returns:
+            Whether the snapshot was written.
+        """
+        if filename is None:
+            filename = self.block_schedules_path
+        try:
+            with open(filename + ".tmp", "w") as f:
+                f.write(self.block_schedules_json(snapshot))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(filename + ".tmp", filename)
+            print(f"Block schedules saved to {filename}")
+            return True
+        except Exception as e:
+            print(f"Error saving block schedules to {filename}: {e}")
+            return False
+
+    def save_block_schedules_to_json(self, filename: Optional[str] = None) -> None:
+        """
+        Saves the current block schedules to a JSON file, folding the journal
+        into it if there is one.
+
+        Args:
+            filename: Name of the file to save to (default: block_schedules_path)
+        """
+        taken_at = time.time()
+        if self.journal is not None and filename is None:
+            save = self.begin_compaction()
+            started = time.perf_counter()
+            ok = self.compact_block_schedules(*save)
+        else:
+            snapshot = self.block_schedules_snapshot()
+            started = time.perf_counter()
+            ok = self.write_block_schedules(snapshot, filename)
+        self.record_save(time.perf_counter() - started, taken_at, ok)
+
+    def record_save(self, seconds: float, taken_at: float, ok: bool) -> None:
+        """Adds one save of a snapshot taken at taken_at to the statistics"""
+        self.save_stats.record_save(seconds, taken_at, ok)
+        if self.metrics is not None:
+            self.metrics.observe_save(seconds, ok)
+
+    def begin_compaction(self) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Cuts the journal and takes the snapshot it will be folded into. Call on
+        the thread that records block entries, so none fall between the two.
+
+        Returns:
+            The snapshot and the journal entries cut with it, for
+            compact_block_schedules.
+        """
+        lines = self.journal.cut()
+        return self.block_schedules_snapshot(), lines
+
+    def compact_block_schedules(
+        self, snapshot: Dict[str, Any], lines: List[str]
+    ) -> bool:
+        """
+        Writes a snapshot from begin_compaction and starts a new journal after
+        it. Safe to run in a worker thread while block entries are recorded.
+
+        Returns:
+            Whether the journal was folded into the snapshot.
+        """
+        return self.journal.compact(lines, lambda: self.write_block_schedules(snapshot))
+
+    def save_interval(self) -> int:
+        """
+        Seconds between periodic saves of the JSON file: COMPACT_INTERVAL when
+        block entries are journaled, SAVE_INTERVAL when it is rewritten whole.
+        """
+        return COMPACT_INTERVAL if self.journal is not None else SAVE_INTERVAL
+
+    def load_block_schedules_from_json(self, filename: Optional[str] = None) -> int:
+        """
+        Loads block schedules from a JSON file into block_schedules. Block times
+        saved as lists or as histograms are read either way.
+
+        Returns:
+            journal_generation of the file (0 if there is none), which the
+            entries of its journal carry.
+        """
+        from blockTimes import BlockTimeHistogram
+
+        if filename is None:
+            filename = self.block_schedules_path
+        if os.path.exists(filename):
+            try:
+                with open(filename, "r") as f:
+                    data = json.load(f)
+                loaded_block_schedules = {}
+                loaded_trip_start_times = {}
+                journal_generation = data.get("journal_generation", 0)
+                # New format: each key is "route_Schedule_schedule" with 'start_times' and 'blocks_times'
+                for key, entry in data.items():
+                    if "_Schedule_" in key and isinstance(entry, dict):
+                        route, sched = key.split("_Schedule_")
+                        schedule = int(sched)
+                        # Load block times
+                        blocks_times = entry.get("blocks_times", {})
+                        block_dict = {}
+                        for block, times in blocks_times.items():
+                            if self.block_histograms:
+                                times = BlockTimeHistogram.from_json(times)
+                            elif isinstance(times, dict):
+                                times = list(BlockTimeHistogram.from_json(times))
+                            block_dict[int(block)] = times
+                        loaded_block_schedules[(route, schedule)] = block_dict
+                        # Load start times
+                        start_times = entry.get("start_times", [])
+                        # We don't know trip_ids, but can store start times for reference
+                        loaded_trip_start_times[key] = start_times
+                self.block_schedules = loaded_block_schedules
+                self.observations = self.count_observations()
+                self.seen_trains = {
+                    sys.intern(train_id): SeenTrain(block, trip_id, last_seen)
+                    for train_id, (block, trip_id, last_seen) in data.get(
+                        "seen_trains", {}
+                    ).items()
+                }
+                # Optionally, you can flatten loaded_trip_start_times into trip_start_times if you have trip_ids
+                print(f"Loaded block schedules and start times from {filename}")
+            except Exception as e:
+                print(f"Error loading block schedules from {filename}: {e}")
+                return 0
+        else:
+            print(f"No existing block schedules file found: {filename}")
+            journal_generation = 0
+
+        if self.journal_path is not None and filename == self.block_schedules_path:
+            self.open_journal(journal_generation)
+        return journal_generation
+
+    def open_journal(self, generation: int) -> None:
+        """
+        Replays the block entries journaled after the loaded snapshot and opens
+        the journal to record new ones.
+
+        Args:
+            generation: journal_generation of the loaded snapshot
+        """
+        journal = self.replay_journal(self.journal_path, generation)
+        journal.open()
+        self.journal = journal
+
+    def replay_journal(self, path: str, generation: int) -> "ObservationJournal":
+        """
+        Applies the block entries journaled at path after the loaded snapshot,
+        leaving the file as it is.
+
+        Args:
+            path: Journal to read
+            generation: journal_generation of the loaded snapshot
+
+        Returns:
+            The journal, not yet opened for appending.
+        """
+        from observationLog import ObservationJournal
+
+        journal = ObservationJournal(path, generation)
+        for entry in journal.replay():
+            self.update_block_schedule(
+                entry.route, entry.schedule, entry.block, entry.seconds_since_start
+            )
+            if entry.train_id is not None:
+                self.seen_trains[sys.intern(entry.train_id)] = SeenTrain(
+                    entry.block, entry.trip_id, entry.timestamp
+                )
+        if journal.entries:
+            print(f"Replayed {journal.entries} block entries from {path}")
+        return journal
+
+    def load_block_schedules_from_store(self) -> None:
+        """
+        Opens the SQLite store at store_path and loads its block entries into
+        block_schedules, read as grouped counts rather than row by row.
+        """
+        from blockTimes import BlockTimeHistogram
+        from observationStore import ObservationStore
+
+        self.store = ObservationStore(self.store_path)
+        loaded_block_schedules: Dict[Tuple[str, int], Dict[int, Any]] = {}
+        for route, schedule, block, seconds, count in self.store.block_time_counts():
+            blocks = loaded_block_schedules.setdefault((route, schedule), {})
+            if block not in blocks:
+                blocks[block] = BlockTimeHistogram() if self.block_histograms else []
+            if self.block_histograms:
+                blocks[block].append(seconds, count)
+            else:
+                blocks[block].extend([seconds] * count)
+        self.block_schedules = loaded_block_schedules
+        self.observations = self.count_observations()
+        self.seen_trains = {
+            sys.intern(train_id): SeenTrain(block, trip_id, last_seen)
+            for train_id, (block, trip_id, last_seen) in (
+                self.store.last_entries().items()
+            )
+        }
+        print(f"Loaded block schedules from {self.store_path}")
+
+    def save_start_times_to_store(self) -> None:
+        """Saves the start times of every schedule for the header generator"""
+        self.store.replace_start_times(self.schedule_start_times())
+
+    def flush_observations(self) -> None:
+        """Writes out the block entries buffered for the journal or store"""
+        if self.journal is not None:
+            self.journal.flush()
+        if self.store is not None:
+            self.store.flush()
+
+    def prepare(
+        self, incremental: bool = False, jobs: int = 1, from_snapshot: bool = False
+    ) -> bool:
+        """
+        Gets ready to monitor: determines the schedules of routes, loads the
+        block schedules recorded so far (from the store if store_path is set,
+        else from the JSON file and its journal) and releases the feed, which
+        monitoring does not need.
+
+        Args:
+            incremental: Only recompute trips that changed since the feed the
+                schedule snapshot was saved from
+            jobs: Worker processes used to determine route schedules
+            from_snapshot: Take the schedules of routes from the schedule
+                snapshot instead of the feed
+
+        Returns:
+            False, with nothing loaded, if from_snapshot and there is no usable
+            snapshot; True otherwise.
+        """
+        if from_snapshot and not self.load_schedules_from_snapshot(self.routes):
+            return False
+
+        if self.store_path is not None:
+            self.load_block_schedules_from_store()
+        else:
+            self.load_block_schedules_from_json()
+
+        if incremental and not from_snapshot:
+            self.update_schedules_incrementally(self.routes, jobs=jobs)
+        elif not from_snapshot:
+            self.determine_schedules(self.routes, jobs=jobs)
+            self.save_schedule_snapshot()
+        if self.store is not None:
+            self.save_start_times_to_store()
+        self.release_feed()
+        return True
+
+    def close(self) -> None:
+        """
+        Saves the block schedules one final time (unless they are in the store,
+        which already holds every entry) and closes the journal and store.
+        """
+        try:
+            if self.store is None:
+                self.save_block_schedules_to_json()
+        finally:
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
+            if self.store is not None:
+                self.store.close()
+                self.store = None
+
+    def trip_lookup(self) -> Dict[str, "TripInfo"]:
+        """
+        Returns trip_id -> TripInfo for every trip with a schedule and start
+        time, building it if the schedules changed since it was last built.
+        """
+        if self.trip_info is None:
+            keys: Dict[Tuple[str, int], Tuple[str, int]] = {}
+            trip_info = {}
+            for trip_id, key in self.trip_to_route_schedule.items():
+                start_seconds = self.trip_start_times.get(trip_id)
+                if start_seconds is not None:
+                    # Trips of a schedule share one key tuple and route string
+                    key = keys.setdefault(key, (sys.intern(key[0]), key[1]))
+                    trip_info[trip_id] = TripInfo(trip_id, key, start_seconds)
+            self.trip_info = trip_info
+        return self.trip_info
+
+    def get_route_schedule_from_trip_id(
+        self, trip_id: str
+    ) -> Optional[Tuple[str, int]]:
+        """
+        Returns the (route, schedule) tuple for a given trip_id.
+        Returns None if the trip_id is not found.
+        """
+        return self.trip_to_route_schedule.get(trip_id)
+
+    def get_trip_start_time(self, trip_id: str) -> Optional[int]:
+        """
+        Returns the start timestamp for a given trip_id.
+        Returns None if the trip_id is not found.
+        """
+        return self.trip_start_times.get(trip_id)
+
+    def update_block_schedule(
+        self, route: str, schedule: int, block: int, seconds_since_start: int
+    ) -> None:
+        """
+        Updates the block schedule with seconds since start time for a block.
+        """
+        self.add_block_time((route, schedule), block, seconds_since_start)
+
+    def add_block_time(
+        self, key: Tuple[str, int], block: int, seconds_since_start: int
+    ) -> None:
+        """update_block_schedule, given the (route, schedule) key ready-made"""
+        if key not in self.block_schedules:
+            self.block_schedules[key] = {}
+
+        if block not in self.block_schedules[key]:
+            if self.block_histograms:
+                from blockTimes import BlockTimeHistogram
+
+                self.block_schedules[key][block] = BlockTimeHistogram()
+            else:
+                self.block_schedules[key][block] = []
+
+        self.block_schedules[key][block].append(seconds_since_start)
+        self.block_versions[key] = self.block_versions.get(key, 0) + 1
+        self.observations += 1
+
+    def count_observations(self) -> int:
+        """Counts the block entry times in block_schedules"""
+        return sum(
+            len(times)
+            for blocks in self.block_schedules.values()
+            for times in blocks.values()
+        )
+
+    def process_tracked_trains(self, trains: List[Dict[str, Any]]) -> int:
+        """
+        Records a block entry for every train that has moved into a new block (or
+        onto a new trip) since it was last seen, then evicts trains that have not
+        been seen for seen_train_ttl seconds.
+
+        Args:
+            trains: Tracked train dictionaries from one poll
+
+        Returns:
+            Number of block entries recorded.
+        """
+        if self.clock is None:
+            from localTime import NETWORK_TIMEZONE, MidnightClock
+
+            self.clock = MidnightClock(self.timezone or NETWORK_TIMEZONE)
+
+        # Trains on a trip with a schedule, each looked up once
+        trip_info = self.trip_lookup()
+        tracked = []
+        unknown_trips = 0
+        for train in trains:
+            trip_id = train.get("tripId")
+            info = trip_info.get(trip_id)
+            if info is None:
+                # Trains not on a trip at all are not a sign of a stale feed
+                if trip_id:
+                    unknown_trips += 1
+            elif train.get("currentBlock"):
+                tracked.append((train, info))
+
+        # Convert every tracked train's timestamp to local time of day in one go
+        timestamps = [train["position"]["timestamp"] for train, _ in tracked]
+        local_seconds = self.clock.seconds_since_midnight(timestamps)
+
+        seen_trains = self.seen_trains
+        prefix = f"[{self.name}] " if self.name else ""
+        routes_entered = []
+        entries = 0
+        for (train, info), timestamp, current_seconds in zip(
+            tracked, timestamps, local_seconds
+        ):
+            trip_id = train["tripId"]
+            train_id = train["trainId"]
+            block = train["currentBlock"]
+            last_seen = int(timestamp)
+
+            # Check if this is a new block for this train or first time seeing it
+            seen = seen_trains.get(train_id)
+            if seen is None:
+                seen_trains[sys.intern(train_id)] = seen = SeenTrain(
+                    block, info.trip_id, last_seen
+                )
+            elif seen.block == block and seen.trip_id == trip_id:
+                # Still in the same block, only when it was seen changes
+                seen.last_seen = last_seen
+                continue
+            else:
+                seen.block = block
+                seen.trip_id = info.trip_id
+                seen.last_seen = last_seen
+
+            # Allow negative seconds_since_start if before trip start
+            seconds_since_start = current_seconds - info.start_seconds
+            route, schedule = info.key
+
+            # Update the block schedule with seconds since start
+            self.add_block_time(info.key, block, seconds_since_start)
+            for log in (self.journal, self.store):
+                if log is not None:
+                    log.append(
+                        train_id,
+                        trip_id,
+                        route,
+                        schedule,
+                        block,
+                        seconds_since_start,
+                        last_seen,
+                    )
+            entries += 1
+            routes_entered.append(route)
+
+            if self.log_entries:
+                print(
+                    f"{prefix}Train {train_id} entered Block {block} at "
+                    f"{seconds_since_start} secs for Route: {route} "
+                    f"Schedule: {schedule}"
+                )
+
+        # Sweep out trains no longer seen about once a minute of position time
+        if timestamps:
+            newest_timestamp = max(timestamps)
+            if newest_timestamp >= self.next_eviction:
+                self.evict_seen_trains(newest_timestamp)
+                self.next_eviction = newest_timestamp + min(60, self.seen_train_ttl)
+
+        if self.metrics is not None:
+            self.metrics.observe_trains(len(trains), unknown_trips, routes_entered)
+            self.metrics.set_observations(self.observations)
+        return entries
+
+    def evict_seen_trains(self, now: float) -> int:
+        """
+        Forgets trains last seen more than seen_train_ttl seconds before now, so
+        seen_trains only holds trains still running.
+
+        Args:
+            now: Time to measure from, as a position timestamp in seconds since epoch
+
+        Returns:
+            Number of trains evicted.
+        """
+        cutoff = now - self.seen_train_ttl
+        stale = [
+            train_id
+            for train_id, seen in self.seen_trains.items()
+            if seen.last_seen < cutoff
+        ]
+        for train_id in stale:
+            del self.seen_trains[train_id]
+        return len(stale)
+
+    def print_block_schedules(self) -> None:
+        """
+        Prints the block schedules for all routes and schedules.
+        """
+        for (route, schedule), blocks in self.block_schedules.items():
+            print(f"\nRoute: {route} Schedule {schedule}")
+            print("Block Schedule:")
+
+            # Collect all timestamps and sort by the earliest occurrence of each block
+            block_times = []
             for block, seconds_list in blocks.items():
-                serializable_blocks[str(block)] = seconds_list
-            serializable_schedules[key] = {
-                "start_times": start_times,
-                "blocks_times": serializable_blocks,
-            }
+                if seconds_list:  # Only include blocks with timestamps
+                    earliest_time = min(seconds_list)
+                    block_times.append((earliest_time, block))
 
-        with open(filename, "w") as f:
-            json.dump(serializable_schedules, f, indent=2)
-        print(f"Block schedules saved to {filename}")
-    except Exception as e:
-        print(f"Error saving block schedules to {filename}: {e}")
+            # Sort by earliest time
+            block_times.sort()
 
+            if block_times:
+                for seconds_since_start, block in block_times:
+                    print(f" - {seconds_since_start} secs @ Block {block}")
+            else:
+                print(" - No block data collected yet")
+
+    def compute_route_schedules(
+        self,
+        route: str,
+        known_schedules: Optional[List[Tuple[Tuple[int, str], ...]]] = None,
+    ) -> "RouteSchedules":
+        """
+        Works out the distinct schedules of a route's trips without touching any
+        of the context's mappings, so it can run in a worker process.
+
+        Args:
+            route: Route/direction pair, e.g. "JVL__0"
+            known_schedules: Schedules numbered before, which keep their
+                numbers whether or not any trip still follows them; others
+                are numbered after them in first-seen order
+        """
+        from gtfsFeed import select_trips
+
+        if self.trip_index is None:
+            self.load_feed()
+
+        # Weekday trips on the specified route, looked up in the shared trip index.
+        # Ties on departure time are broken by trip_id so schedule numbering does
+        # not depend on the row order of the feed
+        filtered: "pd.DataFrame" = select_trips(self.trip_index, route).sort_values(
+            ["departure_seconds", "trip_id"]
+        )
+        trips: List[str] = filtered["trip_id"].unique().tolist()
+
+        # Store unique schedules and their numbering. A schedule is keyed by its
+        # hashable (offset, stop_id) tuple; numbers are handed out in first-seen order
+        unique_schedules: List[Tuple[Tuple[int, str], ...]] = list(
+            known_schedules or []
+        )
+        schedule_numbers: Dict[Tuple[Tuple[int, str], ...], int] = {
+            signature: index for index, signature in enumerate(unique_schedules)
+        }
+        trip_to_schedule: Dict[str, int] = {}
+        trip_start_times: Dict[str, int] = {}
+
+        # Process each trip to extract schedule and store start times
+        for trip in trips:
+            start, end = self.trip_row_ranges[trip]
+
+            # Store the start time for this trip in seconds since midnight
+            trip_start_times[trip] = int(self.trip_stop_seconds[start])
+
+            # Stop times relative to the start time, in minutes
+            signature: Tuple[Tuple[int, str], ...] = tuple(
+                zip(
+                    self.trip_stop_offsets[start:end].tolist(),
+                    self.stop_id_names[self.trip_stop_id_codes[start:end]].tolist(),
+                )
+            )
+
+            # Look the schedule up, numbering it if it is new
+            schedule_index = schedule_numbers.get(signature)
+            if schedule_index is None:
+                schedule_index = len(unique_schedules)
+                schedule_numbers[signature] = schedule_index
+                unique_schedules.append(signature)
+
+            trip_to_schedule[trip] = schedule_index
+
+        return RouteSchedules(
+            route,
+            unique_schedules,
+            trip_to_schedule,
+            trip_start_times,
+            list(
+                zip(
+                    filtered["trip_id"].tolist(),
+                    filtered["departure_seconds"].tolist(),
+                )
+            ),
+        )
+
+    def apply_route_schedules(self, result: "RouteSchedules") -> None:
+        """
+        Merges a route's schedules into trip_to_route_schedule and
+        trip_start_times and prints them.
+        """
+        from gtfsFeed import seconds_to_gtfs_time
+
+        route = result.route
+        self.route_schedules[route] = list(result.schedules)
+        self.trip_start_times.update(result.trip_start_times)
+        self.trip_info = None
+
+        # Store the mapping from trip_id to (route, schedule)
+        for trip_id, schedule_index in result.trip_to_schedule.items():
+            self.trip_to_route_schedule[trip_id] = (route, schedule_index)
+
+        # Print each schedule separately with its start times
+        for idx, schedule in enumerate(result.schedules):
+            print(f"\nRoute: {route} Schedule {idx}")
+            print("Schedule:")
+            for offset, stop_id in schedule:
+                print(f" - {offset} mins @ {stop_id}")
+
+            # Print start times for this schedule
+            print("\nStart times:")
+            for trip_id, departure_seconds in result.departures:
+                if result.trip_to_schedule[trip_id] == idx:
+                    departure_time: str = seconds_to_gtfs_time(departure_seconds)
+                    print(f" - {departure_time} : {trip_id}")
+
+    def determine_schedule(
+        self,
+        route: str,
+        known_schedules: Optional[List[Tuple[Tuple[int, str], ...]]] = None,
+    ) -> None:
+        self.apply_route_schedules(self.compute_route_schedules(route, known_schedules))
+
+    def determine_schedules(self, routes: List[str], jobs: int = 1) -> None:
+        """
+        Determines the schedules of several routes, in a pool of jobs worker
+        processes if jobs > 1.
+
+        Schedules in the schedule snapshot keep the numbers it gives them, as
+        block_schedules is keyed by those: update_schedules_incrementally
+        numbers new schedules after the existing ones, not in first-seen order.
+        Only schedules new to the snapshot are numbered afresh.
+
+        Workers map the indexed feed arrays from shared memory rather than each
+        getting a pickled copy. Results are merged in the order of routes, so
+        the mappings and output are identical to running them one by one.
+        """
+        snapshot = self.read_schedule_snapshot()
+        known: Dict[str, List[Tuple[Tuple[int, str], ...]]] = {}
+        if snapshot is not None:
+            known = {
+                route: schedules_from_json(schedules)
+                for route, schedules in snapshot["schedules"].items()
+            }
+            print(f"Keeping the schedule numbers of {self.schedule_snapshot_path}")
 
-stop_times: pd.DataFrame = pd.read_csv("Timetable Generator/stop_times.csv")
+        if jobs <= 1 or len(routes) <= 1:
+            for route in routes:
+                self.determine_schedule(route, known.get(route))
+            return
 
-# Global dictionary to store trip_id -> (route, schedule) mapping
-trip_to_route_schedule: Dict[str, Tuple[str, int]] = {}
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import shared_memory
 
-# Global dictionary to store trip start times (trip_id -> start_timestamp)
-trip_start_times: Dict[str, int] = {}
+        import numpy as np
 
-# Global dictionary to store block schedules for each (route, schedule)
-block_schedules: Dict[Tuple[str, int], Dict[int, List[int]]] = {}
+        if self.trip_index is None:
+            self.load_feed()
 
+        shared_blocks = []
+        shared_arrays: Dict[str, Tuple[str, Tuple[int, ...], str]] = {}
+        try:
+            for name in SHARED_FEED_ARRAYS:
+                array: "np.ndarray" = getattr(self, name)
+                block = shared_memory.SharedMemory(
+                    create=True, size=max(array.nbytes, 1)
+                )
+                shared_blocks.append(block)
+                np.ndarray(array.shape, array.dtype, buffer=block.buf)[:] = array
+                shared_arrays[name] = (block.name, array.shape, array.dtype.str)
+
+            with ProcessPoolExecutor(
+                max_workers=min(jobs, len(routes)),
+                initializer=init_schedule_worker,
+                initargs=(
+                    shared_arrays,
+                    self.trip_row_ranges,
+                    self.stop_id_names,
+                    self.trip_index,
+                    self.service_pattern,
+                    self.feed_date,
+                ),
+            ) as pool:
+                results = list(
+                    pool.map(
+                        compute_route_schedules_in_worker,
+                        routes,
+                        [known.get(route) for route in routes],
+                    )
+                )
+        finally:
+            for block in shared_blocks:
+                block.close()
+                block.unlink()
+
+        for result in results:
+            self.apply_route_schedules(result)
+
+    def compute_trip_digests(self) -> Dict[str, int]:
+        """
+        Returns a 64-bit digest of every loaded trip's schedule (its offsets and
+        stop_ids), computed for all trips in one vectorised pass.
+        """
+        import numpy as np
+
+        from gtfsFeed import stable_string_hashes, trip_digests
+
+        ranges = np.array(list(self.trip_row_ranges.values()), dtype=np.int64)
+        ranges = ranges.reshape(-1, 2)
+        stop_hashes = stable_string_hashes(self.stop_id_names)
+        digests = trip_digests(
+            self.trip_stop_offsets,
+            stop_hashes[self.trip_stop_id_codes],
+            ranges[:, 0],
+            ranges[:, 1],
+        )
+        return dict(zip(self.trip_row_ranges, digests.tolist()))
+
+    def save_schedule_snapshot(self, filename: Optional[str] = None) -> None:
+        """
+        Saves every route's schedules and each trip's (route, schedule, start time,
+        digest), which update_schedules_incrementally diffs the next feed against.
+
+        Args:
+            filename: Name of the file to save to (default: schedule_snapshot_path)
+        """
+        if filename is None:
+            filename = self.schedule_snapshot_path
+        digests = self.compute_trip_digests()
+        snapshot = {
+            "version": SCHEDULE_SNAPSHOT_VERSION,
+            "schedules": {
+                route: [[list(stop) for stop in schedule] for schedule in schedules]
+                for route, schedules in self.route_schedules.items()
+            },
+            "trips": {
+                trip_id: [
+                    route,
+                    schedule,
+                    self.trip_start_times[trip_id],
+                    f"{digests[trip_id]:016x}",
+                ]
+                for trip_id, (route, schedule) in self.trip_to_route_schedule.items()
+                if trip_id in digests
+            },
+        }
+        try:
+            with open(filename + ".tmp", "w") as f:
+                json.dump(snapshot, f)
+            os.replace(filename + ".tmp", filename)
+        except OSError as e:
+            print(f"Error saving schedule snapshot to {filename}: {e}")
+
+    def read_schedule_snapshot(self) -> Optional[Dict[str, Any]]:
+        """
+        Reads the schedule snapshot, or returns None if there is none or it was
+        written in an older layout.
+        """
+        try:
+            with open(self.schedule_snapshot_path, "r") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if snapshot.get("version") != SCHEDULE_SNAPSHOT_VERSION:
+            return None
+        return snapshot
+
+    def load_schedules_from_snapshot(
+        self, routes: Optional[Collection[str]] = None
+    ) -> bool:
+        """
+        Takes every trip's (route, schedule) and start time from the schedule
+        snapshot instead of the feed, which is all that recording block entries
+        needs.
+
+        Args:
+            routes: Only these routes' schedules and trips are taken (default:
+                every route in the snapshot)
+
+        Returns:
+            Whether there was a usable snapshot.
+        """
+        snapshot = self.read_schedule_snapshot()
+        if snapshot is None:
+            return False
+        for route, schedules in snapshot["schedules"].items():
+            if routes is not None and route not in routes:
+                continue
+            self.route_schedules[route] = schedules_from_json(schedules)
+        for trip_id, (route, schedule, start_seconds, _) in snapshot["trips"].items():
+            if routes is not None and route not in routes:
+                continue
+            self.trip_to_route_schedule[trip_id] = (route, schedule)
+            self.trip_start_times[trip_id] = start_seconds
+        self.trip_info = None
+        return True
+
+    def update_schedules_incrementally(
+        self, routes: List[str], jobs: int = 1
+    ) -> Optional["FeedDiff"]:
+        """
+        Brings the schedules of routes up to date with the loaded feed by diffing
+        it against the snapshot of the last processed feed.
+
+        Trips whose digest and start time are unchanged keep their schedule
+        without being rebuilt. Only added or changed trips have their schedule
+        built and looked up, and a schedule not seen before gets the next free
+        number, so existing numbers (and block_schedules keys) never shift.
+        Without a usable snapshot every schedule is determined from scratch.
+
+        Returns:
+            What changed, or None if there was no snapshot to diff against.
+        """
+        from gtfsFeed import select_trips
+
+        snapshot = self.read_schedule_snapshot()
+        if snapshot is None:
+            print("No schedule snapshot to diff against, determining all schedules")
+            self.determine_schedules(routes, jobs=jobs)
+            self.save_schedule_snapshot()
+            return None
+
+        if self.trip_index is None:
+            self.load_feed()
+        digests = self.compute_trip_digests()
+        previous_trips: Dict[str, List[Any]] = snapshot["trips"]
+        self.trip_info = None
+
+        added: List[str] = []
+        changed: List[str] = []
+        removed: List[str] = []
+        # (route, schedule) whose trips or start times differ from the snapshot
+        affected: set = set()
+
+        for route in routes:
+            schedules = schedules_from_json(snapshot["schedules"].get(route, []))
+            schedule_numbers = {
+                signature: index for index, signature in enumerate(schedules)
+            }
 
-def load_block_schedules_from_json(
-    filename: str = "Timetable Generator/block_schedules.json",
-) -> None:
+            filtered = select_trips(self.trip_index, route).sort_values(
+                ["departure_seconds", "trip_id"]
+            )
+
+            for trip in filtered["trip_id"].unique().tolist():
+                start, end = self.trip_row_ranges[trip]
+                start_seconds = int(self.trip_stop_seconds[start])
+                previous = previous_trips.get(trip)
+
+                if (
+                    previous is not None
+                    and previous[0] == route
+                    and int(previous[3], 16) == digests[trip]
+                ):
+                    # Same stops at the same offsets: keep the schedule number
+                    schedule_index = previous[1]
+                    if previous[2] != start_seconds:
+                        changed.append(trip)
+                        affected.add((route, schedule_index))
+                else:
+                    signature: Tuple[Tuple[int, str], ...] = tuple(
+                        zip(
+                            self.trip_stop_offsets[start:end].tolist(),
+                            self.stop_id_names[
+                                self.trip_stop_id_codes[start:end]
+                            ].tolist(),
+                        )
+                    )
+                    schedule_index = schedule_numbers.get(signature)
+                    if schedule_index is None:
+                        schedule_index = len(schedules)
+                        schedule_numbers[signature] = schedule_index
+                        schedules.append(signature)
+
+                    if previous is None:
+                        added.append(trip)
+                    else:
+                        changed.append(trip)
+                        affected.add((previous[0], previous[1]))
+                    affected.add((route, schedule_index))
+
+                self.trip_start_times[trip] = start_seconds
+                self.trip_to_route_schedule[trip] = (route, schedule_index)
+
+            self.route_schedules[route] = schedules
+
+        for trip, previous in previous_trips.items():
+            if previous[0] in routes and trip not in self.trip_to_route_schedule:
+                removed.append(trip)
+                affected.add((previous[0], previous[1]))
+
+        # Schedules left without trips no longer describe anything that runs, so
+        # their block data is stale; the rest only need their start times redone
+        in_use = set(self.trip_to_route_schedule.values())
+        diff = FeedDiff(
+            added,
+            removed,
+            changed,
+            sorted(f"{r}_Schedule_{n}" for r, n in affected if (r, n) not in in_use),
+            sorted(f"{r}_Schedule_{n}" for r, n in affected if (r, n) in in_use),
+        )
+
+        print(
+            f"Feed diff: {len(added)} trips added, {len(removed)} removed, "
+            f"{len(changed)} changed"
+        )
+        for key in diff.invalidated_keys:
+            print(f" - {key}: no trips left, block data is stale")
+        for key in diff.changed_keys:
+            print(f" - {key}: trips or start times changed")
+
+        self.save_schedule_snapshot()
+        return diff
+
+
+class FeedDiff(NamedTuple):
+    """What update_schedules_incrementally found changed since the last feed"""
+
+    added: List[str]
+    removed: List[str]
+    # Trips whose stops, offsets or start time changed
+    changed: List[str]
+    # block_schedules keys whose schedule no longer has any trips
+    invalidated_keys: List[str]
+    # block_schedules keys whose trips or start times changed
+    changed_keys: List[str]
+
+
+# Bumped whenever the layout of the schedule snapshot changes
+SCHEDULE_SNAPSHOT_VERSION: int = 1
+
+
+class SaveStats:
     """
-    Loads block schedules from a JSON file into the global block_schedules dict.
+    Running statistics of block schedule saves: how long taking a snapshot held
+    up the monitor, how long writing it took in the background and how far
+    behind the monitor the saved data was by the time it was on disk.
     """
-    global block_schedules, trip_start_times
-    if os.path.exists(filename):
-        try:
-            with open(filename, "r") as f:
-                data = json.load(f)
-            loaded_block_schedules = {}
-            loaded_trip_start_times = {}
-            # New format: each key is "route_Schedule_schedule" with 'start_times' and 'blocks_times'
-            for key, entry in data.items():
-                if "_Schedule_" in key and isinstance(entry, dict):
-                    route, sched = key.split("_Schedule_")
-                    schedule = int(sched)
-                    # Load block times
-                    blocks_times = entry.get("blocks_times", {})
-                    block_dict = {
-                        int(block): times for block, times in blocks_times.items()
-                    }
-                    loaded_block_schedules[(route, schedule)] = block_dict
-                    # Load start times
-                    start_times = entry.get("start_times", [])
-                    # We don't know trip_ids, but can store start times for reference
-                    loaded_trip_start_times[key] = start_times
-            block_schedules = loaded_block_schedules
-            # Optionally, you can flatten loaded_trip_start_times into trip_start_times if you have trip_ids
-            print(f"Loaded block schedules and start times from {filename}")
-        except Exception as e:
-            print(f"Error loading block schedules from {filename}: {e}")
-    else:
-        print(f"No existing block schedules file found: {filename}")
-
-
-# Set to track which trains we've seen to calculate entry times
-seen_trains: Dict[str, Tuple[int, str]] = {}  # train_id -> (block, trip_id)
 
-
-def get_route_schedule_from_trip_id(trip_id: str) -> Optional[Tuple[str, int]]:
+    def __init__(self) -> None:
+        self.snapshots = 0
+        self.snapshot_seconds = 0.0
+        self.max_snapshot_seconds = 0.0
+        self.saves = 0
+        self.failures = 0
+        self.save_seconds = 0.0
+        self.max_save_seconds = 0.0
+        # Seconds from taking a snapshot until it was written
+        self.last_lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+        # When the snapshot last written was taken (seconds since epoch)
+        self.saved_snapshot_time: Optional[float] = None
+
+    def record_snapshot(self, seconds: float) -> None:
+        """Adds one snapshot taken on the monitor's thread"""
+        self.snapshots += 1
+        self.snapshot_seconds += seconds
+        self.max_snapshot_seconds = max(self.max_snapshot_seconds, seconds)
+
+    def record_save(self, seconds: float, taken_at: float, ok: bool) -> None:
+        """Adds one save of a snapshot taken at taken_at that took seconds"""
+        self.saves += 1
+        if not ok:
+            self.failures += 1
+            return
+        self.save_seconds += seconds
+        self.max_save_seconds = max(self.max_save_seconds, seconds)
+        self.last_lag_seconds = time.time() - taken_at
+        self.max_lag_seconds = max(self.max_lag_seconds, self.last_lag_seconds)
+        self.saved_snapshot_time = taken_at
+
+    def summary(self) -> str:
+        """One-line summary for the monitor's log"""
+        written = self.saves - self.failures
+        if not written:
+            return "No saves yet"
+        snapshot_ms = 1000 * self.snapshot_seconds / max(self.snapshots, 1)
+        save_ms = 1000 * self.save_seconds / written
+        return (
+            f"{self.saves} saves ({self.failures} failed), "
+            f"snapshot mean {snapshot_ms:.1f} ms "
+            f"(max {1000 * self.max_snapshot_seconds:.1f} ms) on the monitor, "
+            f"write mean {save_ms:.1f} ms (max {1000 * self.max_save_seconds:.1f} ms), "
+            f"lag {self.last_lag_seconds:.2f} s (max {self.max_lag_seconds:.2f} s), "
+            f"saved data {time.time() - self.saved_snapshot_time:.0f} s old"
+        )
+
+
+class TripInfo:
+    """What the per-train loop needs to know about a trip, in one lookup"""
+
+    __slots__ = ("trip_id", "key", "start_seconds")
+
+    def __init__(self, trip_id: str, key: Tuple[str, int], start_seconds: int) -> None:
+        self.trip_id = trip_id
+        # (route, schedule), as block_schedules is keyed
+        self.key = key
+        # Start time in seconds since midnight
+        self.start_seconds = start_seconds
+
+
+class SeenTrain:
     """
-    Returns the (route, schedule) tuple for a given trip_id.
-    Returns None if the trip_id is not found.
+    Where a train was when it was last seen. Updated in place as the train is
+    seen again, so polls in which it has not moved allocate nothing.
     """
-    return trip_to_route_schedule.get(trip_id)
-
 
-def get_trip_start_time(trip_id: str) -> Optional[int]:
+    __slots__ = ("block", "trip_id", "last_seen")
+
+    def __init__(self, block: int, trip_id: str, last_seen: int) -> None:
+        self.block = block
+        self.trip_id = trip_id
+        # Position timestamp, in seconds since epoch
+        self.last_seen = last_seen
+
+    def to_json(self) -> List[Any]:
+        """[block, trip_id, last_seen], as saved with the block schedules"""
+        return [self.block, self.trip_id, self.last_seen]
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, SeenTrain):
+            return NotImplemented
+        return self.to_json() == other.to_json()
+
+    def __repr__(self) -> str:
+        return f"SeenTrain({self.block}, {self.trip_id!r}, {self.last_seen})"
+
+
+class RouteSchedules(NamedTuple):
+    """Schedules worked out for one route by compute_route_schedules"""
+
+    route: str
+    # Distinct (offset mins, stop_id) schedules, indexed by schedule number
+    schedules: List[Tuple[Tuple[int, str], ...]]
+    # trip_id -> schedule number, in departure order
+    trip_to_schedule: Dict[str, int]
+    # trip_id -> start time in seconds since midnight
+    trip_start_times: Dict[str, int]
+    # (trip_id, departure seconds) of each trip's first stop, in departure order
+    departures: List[Tuple[str, int]]
+
+
+def schedules_from_json(
+    schedules: List[List[List[Any]]],
+) -> List[Tuple[Tuple[int, str], ...]]:
+    """Turns a route's schedules as saved in the schedule snapshot back into tuples"""
+    return [
+        tuple((offset, stop_id) for offset, stop_id in schedule)
+        for schedule in schedules
+    ]
+
+
+# TimetableContext arrays handed to schedule workers through shared memory
+SHARED_FEED_ARRAYS: List[str] = [
+    "trip_stop_offsets",
+    "trip_stop_seconds",
+    "trip_stop_id_codes",
+]
+
+# The context a schedule worker process computes routes with
+worker_timetable: Optional[TimetableContext] = None
+worker_shared_blocks: List[Any] = []
+
+
+def init_schedule_worker(
+    shared_arrays: Dict[str, Tuple[str, Tuple[int, ...], str]],
+    trip_row_ranges: Dict[str, Tuple[int, int]],
+    stop_id_names: "np.ndarray",
+    trip_index: "pd.DataFrame",
+    service_pattern: str = SERVICE_PATTERN,
+    feed_date: str = FEED_DATE,
+) -> None:
     """
-    Returns the start timestamp for a given trip_id.
-    Returns None if the trip_id is not found.
+    Sets up a schedule worker process: attaches the shared feed arrays
+    read-only and takes the (small) trip indexes as they were passed in.
     """
-    return trip_start_times.get(trip_id)
+    global worker_timetable
+    from multiprocessing import shared_memory
 
+    import numpy as np
 
-def update_block_schedule(
-    route: str, schedule: int, block: int, seconds_since_start: int
+    worker_timetable = TimetableContext(
+        service_pattern=service_pattern, feed_date=feed_date
+    )
+    for name, (block_name, shape, dtype) in shared_arrays.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        worker_shared_blocks.append(block)
+        array = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+        array.flags.writeable = False
+        setattr(worker_timetable, name, array)
+    worker_timetable.trip_row_ranges = trip_row_ranges
+    worker_timetable.stop_id_names = stop_id_names
+    worker_timetable.trip_index = trip_index
+
+
+def compute_route_schedules_in_worker(
+    route: str, known_schedules: Optional[List[Tuple[Tuple[int, str], ...]]]
+) -> RouteSchedules:
+    """Computes one route's schedules in a worker set up by init_schedule_worker"""
+    return worker_timetable.compute_route_schedules(route, known_schedules)
+
+
+async def monitor_trains_async(
+    timetable: TimetableContext,
+    client: "TrackedTrainsClient",
+    save_interval: Optional[float] = None,
+    poll_interval: float = 5.0,
+    queue_size: int = 4,
+    scheduler: Optional["PollScheduler"] = None,
 ) -> None:
     """
-    Updates the block schedule with seconds since start time for a block.
-    """
-    key = (route, schedule)
-    if key not in block_schedules:
-        block_schedules[key] = {}
+    Monitors trains as three concurrent stages joined by bounded queues:
+    fetching, processing each poll's observations, and persisting block
+    schedules. A slow save or a slow response holds up only its own stage,
+    never the next poll.
 
-    if block not in block_schedules[key]:
-        block_schedules[key][block] = []
+    With a store open, each poll's block entries are inserted into it in one
+    transaction and nothing else is saved. With a journal open, they are
+    appended to it in one fsync'd batch and the journal is compacted into the
+    JSON file every save_interval; otherwise the whole JSON file is rewritten
+    every save_interval.
 
-    block_schedules[key][block].append(seconds_since_start)
+    Args:
+        timetable: Context holding the schedules to look trips up in and update
+        client: Client to poll tracked trains with
+        save_interval: How often to save (or compact into) the JSON file in
+            seconds (default: timetable.save_interval())
+        poll_interval: Seconds between the starts of consecutive polls, when
+            there is no scheduler
+        queue_size: Polls that may wait for processing before the oldest is dropped
+        scheduler: Times polls to the backend's updates (default: fixed cadence)
+    """
+    from trackedTrains import UNCHANGED
+
+    if save_interval is None:
+        save_interval = timetable.save_interval()
+    loop = asyncio.get_running_loop()
+    polls: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    # At most one snapshot waits to be written; a newer one replaces it
+    saves: asyncio.Queue = asyncio.Queue(maxsize=1)
+    # Set when there is a snapshot to write or there are journal entries to flush
+    persist_needed = asyncio.Event()
+    # Tells the networks apart in the log when several are monitored at once
+    prefix = f"[{timetable.name}] " if timetable.name else ""
+
+    async def fetch_stage() -> None:
+        next_poll = loop.time()
+        while True:
+            trains = await asyncio.to_thread(client.fetch)
+            if scheduler is not None:
+                scheduler.observe(trains, time.time())
+            if trains is None:
+                print(f"{prefix}Failed to fetch train data")
+            elif trains is not UNCHANGED:
+                if polls.full():
+                    polls.get_nowait()
+                    print(f"{prefix}Processing is behind, dropped the oldest poll")
+                polls.put_nowait(trains)
+
+            if scheduler is not None:
+                now = time.time()
+                await asyncio.sleep(max(scheduler.next_poll_time(now) - now, 0.0))
+                continue
+
+            # Polls start on a fixed grid; if one overran, skip to the next slot
+            next_poll += poll_interval
+            if next_poll < loop.time():
+                next_poll = loop.time()
+            await asyncio.sleep(next_poll - loop.time())
+
+    async def process_stage() -> None:
+        last_save_time = time.time()
+        while True:
+            trains = await polls.get()
+            if timetable.process_tracked_trains(trains) and (
+                timetable.journal is not None or timetable.store is not None
+            ):
+                persist_needed.set()
+
+            # Periodically hand a snapshot to the persist stage
+            current_time = time.time()
+            if (
+                timetable.store is None
+                and current_time - last_save_time >= save_interval
+            ):
+                last_save_time = current_time
+                if timetable.journal is None:
+                    if saves.full():
+                        saves.get_nowait()
+                    saves.put_nowait(
+                        (time.time(), timetable.block_schedules_snapshot())
+                    )
+                    persist_needed.set()
+                elif not timetable.journal.compacting and (
+                    timetable.journal.entries or timetable.journal.pending
+                ):
+                    # A compaction's cut entries have to be written, so one
+                    # is never replaced; the next waits until it is done
+                    saves.put_nowait((time.time(), timetable.begin_compaction()))
+                    persist_needed.set()
+
+    async def persist_stage() -> None:
+        while True:
+            await persist_needed.wait()
+            persist_needed.clear()
+            if saves.empty():
+                # Only new block entries: write them in one batch
+                await asyncio.to_thread(timetable.flush_observations)
+                continue
+
+            taken_at, save = saves.get_nowait()
+            started = time.perf_counter()
+            if timetable.journal is None:
+                ok = await asyncio.to_thread(timetable.write_block_schedules, save)
+            else:
+                ok = await asyncio.to_thread(timetable.compact_block_schedules, *save)
+            timetable.record_save(time.perf_counter() - started, taken_at, ok)
+            print(f"{prefix}Block schedule saves: {timetable.save_stats.summary()}")
+            print(f"{prefix}Tracked trains requests: {client.latency.summary()}")
+            if scheduler is not None:
+                print(f"{prefix}Poll schedule: {scheduler.summary()}")
 
+    await asyncio.gather(fetch_stage(), process_stage(), persist_stage())
 
-def print_block_schedules() -> None:
-    """
-    Prints the block schedules for all routes and schedules.
-    """
-    for (route, schedule), blocks in block_schedules.items():
-        print(f"\nRoute: {route} Schedule {schedule}")
-        print("Block Schedule:")
-
-        # Collect all timestamps and sort by the earliest occurrence of each block
-        block_times = []
-        for block, seconds_list in blocks.items():
-            if seconds_list:  # Only include blocks with timestamps
-                earliest_time = min(seconds_list)
-                block_times.append((earliest_time, block))
-
-        # Sort by earliest time
-        block_times.sort()
-
-        if block_times:
-            for seconds_since_start, block in block_times:
-                print(f" - {seconds_since_start} secs @ Block {block}")
-        else:
-            print(" - No block data collected yet")
 
+def monitor_trains(
+    timetable: TimetableContext,
+    save_interval: Optional[float] = None,
+    client: Optional["TrackedTrainsClient"] = None,
+    scheduler: Optional["PollScheduler"] = None,
+) -> None:
+    """
+    Continuously monitors trains and updates block schedules until interrupted.
 
-def determine_schedule(route: str) -> None:
-    # print(f"\nRoute: {route}")
+    Args:
+        timetable: Context holding the schedules to look trips up in and update
+        save_interval: How often to save to JSON file in seconds
+            (default: timetable.save_interval())
+        client: Client to poll tracked trains with (default: a new pooled client)
+        scheduler: Times the polls (default: a new adaptive scheduler)
+    """
+    from pollScheduler import PollScheduler
+    from trackedTrains import TrackedTrainsClient
 
-    # Filtering conditions for trips on the specified route
-    mask: pd.Series = (
-        stop_times["trip_id"].str.contains(route)
-        & stop_times["trip_id"].str.contains("MTuWThF")
-        & stop_times["trip_id"].str.contains("20250817")
-        & (stop_times["stop_sequence"] == 0)
-    )
+    if client is None:
+        client = TrackedTrainsClient()
+    if scheduler is None:
+        scheduler = PollScheduler()
 
-    filtered: pd.DataFrame = stop_times[mask].sort_values("departure_time")
-    trips: List[str] = filtered["trip_id"].unique().tolist()
-
-    # Store unique schedules and their numbering
-    unique_schedules: List[List[Tuple[int, str]]] = []
-    trip_to_schedule: Dict[str, int] = {}
-
-    # Process each trip to extract schedule and store start times
-    for trip in trips:
-        trip_stops: pd.DataFrame = stop_times[
-            stop_times["trip_id"] == trip
-        ].sort_values("stop_sequence")
-
-        # Get start time in minutes since midnight
-        start_time_str: str = trip_stops.iloc[0]["departure_time"]
-        dt_start: pd.Timestamp = safe_parse_time(start_time_str)
-        start_minutes: int = dt_start.hour * 60 + dt_start.minute
-
-        # Convert to seconds since midnight
-        start_seconds: int = start_minutes * 60 + dt_start.second
-
-        # Store the start time for this trip
-        trip_start_times[trip] = start_seconds
-
-        # Normalize stop times relative to start time, handling midnight crossing
-        stop_times_list: List[Tuple[int, str]] = []
-        for _, row in trip_stops.iterrows():
-            dt_stop = safe_parse_time(row["departure_time"])
-            stop_minutes = dt_stop.hour * 60 + dt_stop.minute
-            offset = stop_minutes - start_minutes
-            # If offset is negative, assume trip crossed midnight, add 1440 mins
-            if offset < 0:
-                offset += 1440
-            stop_times_list.append((offset, str(row["stop_id"])))
-
-        # Check if this schedule already exists
-        schedule_index: int = -1
-        for i, schedule in enumerate(unique_schedules):
-            if schedule == stop_times_list:
-                schedule_index = i
-                break
-
-        # If not found, add it
-        if schedule_index == -1:
-            unique_schedules.append(stop_times_list)
-            schedule_index = len(unique_schedules) - 1
-
-        trip_to_schedule[trip] = schedule_index
-
-    # Store the mapping from trip_id to (route, schedule)
-    for trip_id, schedule_index in trip_to_schedule.items():
-        trip_to_route_schedule[trip_id] = (route, schedule_index)
-
-    # Print each schedule separately with its start times
-    for idx, schedule in enumerate(unique_schedules):
-        print(f"\nRoute: {route} Schedule {idx}")
-        print("Schedule:")
-        for offset, stop_id in schedule:
-            print(f" - {offset} mins @ {stop_id}")
-
-        # Print start times for this schedule
-        print("\nStart times:")
-        schedule_trips = [
-            trip for trip, sched_idx in trip_to_schedule.items() if sched_idx == idx
-        ]
-        for _, row in filtered[filtered["trip_id"].isin(schedule_trips)].iterrows():
-            departure_time: str = row["departure_time"]
-            print(f" - {departure_time} : {row['trip_id']}")
+    print("\n=== Starting continuous monitoring ===")
+    try:
+        asyncio.run(
+            monitor_trains_async(timetable, client, save_interval, scheduler=scheduler)
+        )
+    except KeyboardInterrupt:
+        print("\nMonitoring stopped by user")
+        timetable.print_block_schedules()
+        print(f"Tracked trains requests: {client.latency.summary()}")
+    finally:
+        client.close()
+        # Saves one final time before exiting
+        timetable.close()
 
 
-def monitor_trains(save_interval: int = 60) -> None:
+def add_monitor_arguments(
+    parser: argparse.ArgumentParser, metrics: bool = True
+) -> None:
+    """
+    Adds the options every collector shares: how schedules are determined,
+    how block entries are kept and logged and, with metrics, how Prometheus
+    metrics are exported (see export_metrics).
+    """
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Worker processes used to determine route schedules (default: 1)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only recompute trips that changed since the last processed feed",
+    )
+    parser.add_argument(
+        "--histograms",
+        action="store_true",
+        help="Keep block entry times as bounded-size histograms instead of "
+        "lists of every observation",
+    )
+    parser.add_argument(
+        "--seen-ttl",
+        type=float,
+        default=30,
+        help="Minutes after which a train that has not been seen is forgotten "
+        "(default: 30)",
+    )
+    parser.add_argument(
+        "--quiet",
+        action="store_true",
+        help="Do not print a line for every block entry",
+    )
+    if metrics:
+        parser.add_argument(
+            "--metrics-port",
+            type=int,
+            default=None,
+            help="Serve Prometheus metrics on http://localhost:PORT/metrics",
+        )
+        parser.add_argument(
+            "--metrics-file",
+            default=None,
+            help="Write Prometheus metrics to this file every 15 seconds",
+        )
+
+
+def export_metrics(
+    monitors: List[Tuple[TimetableContext, "TrackedTrainsClient"]],
+    args: argparse.Namespace,
+) -> Optional["MetricsExporter"]:
     """
-    Continuously monitors trains and updates block schedules.
+    Gives every context and its client a MonitorMetrics, labelled with the
+    context's name if it has one, and exports them all as the options added by
+    add_monitor_arguments ask.
 
-    Args:
-        save_interval: How often to save to JSON file in seconds (default: 60 seconds)
+    Returns:
+        The exporter, to close with args.metrics_file once monitoring stops, or
+        None if no metrics were asked for.
     """
-    print("\n=== Starting continuous monitoring ===")
-    last_save_time = time.time()
+    if args.metrics_port is None and not args.metrics_file:
+        return None
 
-    try:
-        while True:
-            trains = fetch_tracked_trains()
-            if trains:
-                for train in trains:
-                    if train.get("tripId") and train.get("currentBlock"):
-                        train_id = train["trainId"]
-                        trip_id = train["tripId"]
-                        block = train["currentBlock"]
-                        timestamp = train["position"]["timestamp"]
-
-                        result = get_route_schedule_from_trip_id(trip_id)
-                        if result:
-                            route, schedule = result
-
-                            # Get the trip start time
-                            trip_start_time = get_trip_start_time(trip_id)
-                            if trip_start_time is not None:
-                                # Calculate seconds since start of trip
-                                # Assuming timestamp is in seconds since epoch
-                                # and we need to convert to seconds since midnight
-                                from datetime import datetime
-
-                                dt = datetime.fromtimestamp(timestamp)
-                                current_seconds = (
-                                    dt.hour * 3600 + dt.minute * 60 + dt.second
-                                )
-
-                                # Allow negative seconds_since_start if before trip start
-                                seconds_since_start = current_seconds - trip_start_time
-
-                                # Check if this is a new block for this train or first time seeing it
-                                prev_block_info = seen_trains.get(train_id)
-
-                                if (
-                                    prev_block_info is None
-                                    or prev_block_info[0] != block
-                                    or prev_block_info[1] != trip_id
-                                ):
-                                    # Update the block schedule with seconds since start
-                                    update_block_schedule(
-                                        route, schedule, block, seconds_since_start
-                                    )
-                                    # Update seen trains
-                                    seen_trains[train_id] = (block, trip_id)
-
-                                    print(
-                                        f"Train {train_id} entered Block {block} at {seconds_since_start} secs "
-                                        f"for Route: {route} Schedule: {schedule}"
-                                    )
-
-                # Print updated block schedules
-                # print_block_schedules()
-
-                # Periodically save to JSON file
-                current_time = time.time()
-                if current_time - last_save_time >= save_interval:
-                    save_block_schedules_to_json()
-                    last_save_time = current_time
+    # Imported as a module: its classes are only imported for type checking
+    import monitorMetrics
 
-            else:
-                print("Failed to fetch train data")
+    for timetable, client in monitors:
+        timetable.metrics = client.metrics = monitorMetrics.MonitorMetrics(
+            timetable.name
+        )
+        timetable.metrics.set_observations(timetable.observations)
+    exporter = monitorMetrics.MetricsExporter(
+        [timetable.metrics for timetable, _ in monitors]
+    )
+    if args.metrics_port is not None:
+        exporter.serve(args.metrics_port)
+    if args.metrics_file:
+        exporter.write_periodically(args.metrics_file)
+    return exporter
 
-            # Wait before next fetch (adjust as needed)
-            time.sleep(5)
 
-    except KeyboardInterrupt:
-        print("\nMonitoring stopped by user")
-        # Save one final time before exiting
-        save_block_schedules_to_json()
-        print_block_schedules()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Builds route schedules from GTFS, then records block times"
+    )
+    parser.add_argument(
+        "--feed",
+        default="Timetable Generator/stop_times.csv",
+        help="GTFS .zip as published, or an extracted stop_times.csv",
+    )
+    parser.add_argument(
+        "--store",
+        default=None,
+        help="Record block entries in this SQLite database instead of "
+        "block_schedules.json",
+    )
+    parser.add_argument(
+        "--record",
+        default=None,
+        help="Also record every tracked-trains response to this capture file, "
+        "for trackedTrainsCapture.py replay",
+    )
+    parser.add_argument(
+        "--url",
+        default=None,
+        help="Tracked-trains endpoint (default: the local LED Rails backend)",
+    )
+    add_monitor_arguments(parser)
+    args = parser.parse_args()
+
+    timetable = TimetableContext(
+        feed_path=args.feed,
+        block_histograms=args.histograms,
+        store_path=args.store,
+        seen_train_ttl=args.seen_ttl * 60,
+    )
+    timetable.log_entries = not args.quiet
+    # Load the block schedules recorded so far and determine every schedule
+    timetable.prepare(args.incremental, args.jobs)
 
+    # Start continuous monitoring (block entries are journaled every poll and
+    # compacted into the JSON file every COMPACT_INTERVAL)
+    import trackedTrains
 
-if __name__ == "__main__":
-    # Load block schedules from file if present
-    load_block_schedules_from_json()
-
-    # First, determine all schedules
-    determine_schedule("JVL__0")
-    determine_schedule("JVL__1")
-    determine_schedule("MEL__0")
-    determine_schedule("MEL__1")
-    determine_schedule("WRL__0")
-    determine_schedule("WRL__1")
-    determine_schedule("HVL__0")
-    determine_schedule("HVL__1")
-    determine_schedule("KPL__0")
-    determine_schedule("KPL__1")
-
-    # Start continuous monitoring (saves every 120 seconds)
-    monitor_trains(save_interval=120)
+    client = trackedTrains.TrackedTrainsClient(
+        args.url or trackedTrains.TRACKED_TRAINS_URL
+    )
+    if args.record:
+        from trackedTrainsCapture import CaptureWriter
+
+        client.capture = CaptureWriter(args.record)
+
+    exporter = export_metrics([(timetable, client)], args)
+    try:
+        monitor_trains(timetable, client=client)
+    finally:
+        if exporter is not None:
+            exporter.close(args.metrics_file)
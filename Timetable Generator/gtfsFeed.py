@@ -0,0 +1,787 @@
+import hashlib
+import json
+import os
+import re
+import zipfile
+from datetime import date, timedelta
+from typing import IO, Any, Collection, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# GTFS service days may run past midnight ("25:10:00"); times are rolled over by this
+SECONDS_PER_DAY: int = 24 * 3600
+
+# Seconds given to a blank or malformed GTFS time (allowed on stops that are
+# not timepoints); such rows are dropped when stop_times is read
+MISSING_TIME: int = -1
+
+# Bumped whenever the layout of the stop_times cache, or how its trips are
+# selected, changes
+STOP_TIMES_CACHE_VERSION: int = 4
+
+# The stop_times.txt columns schedules are built from, and how to read them
+STOP_TIMES_DTYPES: Dict[str, Any] = {
+    "trip_id": str,
+    "departure_time": str,
+    "stop_id": str,
+    "stop_sequence": np.int32,
+}
+
+# Rows of stop_times.txt parsed at a time when streaming it
+STOP_TIMES_CHUNK_ROWS: int = 100_000
+
+# The trip_ids parse_trip_ids can split: line__direction__number__agency__
+# then the service pattern and "_YYYYMMDD". Only a bare stop_times.csv, which
+# has no trips.txt to select trips from, relies on them
+METLINK_TRIP_ID = re.compile(r"[^_]+__[^_]+__[^_]+__[^_]+__.+_\d{8}")
+
+# Columns read from the small trips.txt, routes.txt and calendar.txt tables
+TRIPS_DTYPES: Dict[str, Any] = {
+    "trip_id": str,
+    "route_id": str,
+    "service_id": str,
+    "direction_id": "Int8",
+}
+ROUTES_DTYPES: Dict[str, Any] = {
+    "route_id": str,
+    "route_short_name": str,
+}
+CALENDAR_DAYS = [
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+]
+# Days of a service pattern such as "MTuWThF", as named in calendar.txt
+SERVICE_DAY_NAMES: Dict[str, str] = {
+    "M": "monday",
+    "Tu": "tuesday",
+    "W": "wednesday",
+    "Th": "thursday",
+    "F": "friday",
+    "Sa": "saturday",
+    "Su": "sunday",
+}
+CALENDAR_DTYPES: Dict[str, Any] = {
+    "service_id": str,
+    **{day: np.int8 for day in CALENDAR_DAYS},
+    # YYYYMMDD
+    "start_date": np.int32,
+    "end_date": np.int32,
+}
+
+# Columns of the cached stop_times frame, stored one .npy file each
+CACHED_INT_COLUMNS = ["stop_sequence", "departure_seconds"]
+CACHED_CATEGORY_COLUMNS = ["trip_id", "stop_id"]
+
+# Files of an extracted feed directory that the stop_times cache is built from
+FINGERPRINTED_FEED_FILES = ["stop_times.txt", "trips.txt"]
+
+
+# Positions of the digits in a zero-padded "HH:MM:SS"
+DIGIT_COLUMNS = [0, 1, 3, 4, 6, 7]
+
+
+def gtfs_time_to_seconds(times: pd.Series) -> np.ndarray:
+    """
+    Converts a whole column of GTFS "HH:MM:SS" strings to seconds in one pass.
+
+    Hours of 24 or more are kept as they are ("25:10:00" -> 90600), callers roll
+    them over to the next day with % SECONDS_PER_DAY.
+
+    Args:
+        times: Series of GTFS time strings
+
+    Returns:
+        int64 array of seconds since the start of the service day, MISSING_TIME
+        where a time is blank or cannot be parsed.
+    """
+    if len(times) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    # Fast path: every value is zero-padded "HH:MM:SS", so the digits can be
+    # read straight out of a fixed-width byte matrix
+    raw = None
+    if (times.str.len() == 8).all():
+        try:
+            raw = np.asarray(times, dtype="S8").view(np.uint8).reshape(-1, 8)
+        except UnicodeEncodeError:
+            # Not ASCII, so not zero-padded times throughout
+            pass
+    if (
+        raw is not None
+        and (raw[:, 2] == ord(":")).all()
+        and (raw[:, 5] == ord(":")).all()
+    ):
+        digits = raw.astype(np.int64) - ord("0")
+        hours = digits[:, 0] * 10 + digits[:, 1]
+        minutes = digits[:, 3] * 10 + digits[:, 4]
+        seconds = digits[:, 6] * 10 + digits[:, 7]
+        total = hours * 3600 + minutes * 60 + seconds
+        # Any other character where a digit belongs ("07:0x:00")
+        malformed = (
+            (digits[:, DIGIT_COLUMNS] < 0) | (digits[:, DIGIT_COLUMNS] > 9)
+        ).any(axis=1)
+        total[malformed] = MISSING_TIME
+        return total
+
+    # GTFS also allows single-digit hours ("7:05:00") and blank times
+    parts = times.str.split(":", expand=True).reindex(columns=range(3))
+    hours, minutes, seconds = (
+        pd.to_numeric(parts[column], errors="coerce") for column in range(3)
+    )
+    total = hours * 3600 + minutes * 60 + seconds
+    return total.fillna(MISSING_TIME).to_numpy(dtype=np.int64)
+
+
+def seconds_to_gtfs_time(seconds: int) -> str:
+    """Convert seconds since the start of the service day back to HH:MM:SS"""
+    return f"{seconds // 3600:02d}:{(seconds % 3600) // 60:02d}:{seconds % 60:02d}"
+
+
+def parse_trip_ids(trip_ids: pd.Series) -> pd.DataFrame:
+    """
+    Splits Metlink trip_ids into their fields. A trip_id looks like
+    "JVL__1__9265__RAIL__Rail_MTuWThF-XHol_20250817": line, direction, trip
+    number, agency, then the service pattern and the feed date.
+
+    Each distinct trip_id is parsed once, however many rows share it.
+
+    Args:
+        trip_ids: Series of trip_id strings
+
+    Returns:
+        DataFrame aligned with trip_ids with categorical line, direction,
+        service and feed_date columns (missing fields are NaN).
+    """
+    trip_categories = pd.Categorical(trip_ids)
+    distinct = pd.Series(trip_categories.categories)
+
+    parts = distinct.str.split("__")
+    # The feed date is the suffix after the last single underscore
+    dated = distinct.str.rsplit("_", n=1)
+    fields = {
+        "line": parts.str[0],
+        "direction": parts.str[1],
+        "service": dated.str[0].str.split("__", n=4).str[4],
+        "feed_date": dated.str[1],
+    }
+
+    codes = trip_categories.codes
+    return pd.DataFrame(
+        {
+            name: pd.Categorical(values.to_numpy(dtype=object)[codes])
+            for name, values in fields.items()
+        },
+        index=trip_ids.index,
+    )
+
+
+def unparsable_trip_ids(feed_path: str, rows: int = 1000) -> List[str]:
+    """
+    Returns the trip_ids among the first rows of a bare stop_times.csv that are
+    not in the Metlink layout parse_trip_ids expects. Without a trips.txt,
+    trips are only selected by the fields of that layout, so such a feed would
+    yield no schedules at all. A feed with a trips.txt never has any.
+    """
+    if has_feed_file(feed_path, "trips.txt"):
+        return []
+    with open_feed_file(feed_path, "stop_times.txt") as f:
+        trip_ids = pd.read_csv(f, usecols=["trip_id"], dtype=str, nrows=rows)
+    return [
+        trip_id
+        for trip_id in trip_ids["trip_id"].dropna().unique()
+        if not METLINK_TRIP_ID.fullmatch(trip_id)
+    ]
+
+
+def build_trip_index(
+    stop_times: pd.DataFrame, trip_routes: Optional[pd.DataFrame] = None
+) -> pd.DataFrame:
+    """
+    Builds a one-row-per-trip index from each trip's first stop (the one with
+    the lowest stop_sequence), so a route's trips can be looked up without
+    scanning trip_id strings.
+
+    Args:
+        stop_times: stop_times frame, already limited to the trips wanted
+        trip_routes: Route of each trip, from feed_trip_routes (default: the
+            line and direction parsed out of Metlink trip_ids)
+
+    Returns:
+        DataFrame with trip_id and departure_seconds columns, indexed and
+        sorted by route ("LINE__DIRECTION").
+    """
+    first_rows = stop_times.groupby("trip_id", observed=True)["stop_sequence"].idxmin()
+    first_stops = stop_times.loc[first_rows, ["trip_id", "departure_seconds"]]
+    trip_ids = first_stops["trip_id"].astype(str)
+    if trip_routes is not None:
+        routes = trip_ids.map(trip_routes.set_index("trip_id")["route"])
+    else:
+        fields = parse_trip_ids(trip_ids).astype(object)
+        routes = fields["line"] + "__" + fields["direction"]
+    trips = first_stops.assign(route=routes.to_numpy(dtype=object))
+    return trips.dropna(subset=["route"]).set_index("route").sort_index()
+
+
+def select_trips(trip_index: pd.DataFrame, route: str) -> pd.DataFrame:
+    """
+    Looks up the trips of one route and direction (e.g. "JVL__0"). Which
+    services and feed the index holds was settled by the TripFilter its
+    stop_times were read with.
+
+    Args:
+        trip_index: Index built by build_trip_index
+        route: Line and direction joined by "__"
+
+    Returns:
+        The matching rows of trip_index, with trip_id and departure_seconds
+        columns.
+    """
+    try:
+        # A list key keeps a frame even when a single trip matches
+        return trip_index.loc[[route]]
+    except KeyError:
+        return trip_index.iloc[:0]
+
+
+def open_feed_file(feed_path: str, name: str) -> IO[bytes]:
+    """
+    Opens one file of a GTFS feed for reading.
+
+    feed_path may be the published GTFS .zip, in which case the file is streamed
+    straight out of the archive without extracting it, a directory of extracted
+    .txt files, or a bare stop_times.csv (which only provides stop_times.txt).
+
+    Args:
+        feed_path: GTFS .zip, directory or stop_times.csv
+        name: File within the feed, e.g. "trips.txt"
+
+    Returns:
+        Binary file object, which the caller closes.
+
+    Raises:
+        FileNotFoundError: If the feed has no such file.
+    """
+    if os.path.isdir(feed_path):
+        return open(os.path.join(feed_path, name), "rb")
+
+    if zipfile.is_zipfile(feed_path):
+        with zipfile.ZipFile(feed_path) as archive:
+            # Some feeds keep their files in a folder inside the archive
+            for member in archive.namelist():
+                if os.path.basename(member) == name:
+                    # The member stays readable after the archive is closed
+                    return archive.open(member)
+        raise FileNotFoundError(f"{name} not found in {feed_path}")
+
+    if name == "stop_times.txt":
+        return open(feed_path, "rb")
+    raise FileNotFoundError(f"{feed_path} is not a GTFS feed containing {name}")
+
+
+def has_feed_file(feed_path: str, name: str) -> bool:
+    """Whether a feed (as open_feed_file takes it) has the named file"""
+    try:
+        with open_feed_file(feed_path, name):
+            return True
+    except FileNotFoundError:
+        return False
+
+
+def read_feed_table(
+    feed_path: str, name: str, dtypes: Dict[str, Any]
+) -> Optional[pd.DataFrame]:
+    """
+    Reads a small GTFS table (trips.txt, calendar.txt) with the given columns
+    and dtypes, string columns becoming categoricals.
+
+    Returns:
+        The table, or None if the feed does not have it.
+    """
+    try:
+        with open_feed_file(feed_path, name) as f:
+            table = pd.read_csv(
+                f, usecols=lambda column: column in dtypes, dtype=dtypes
+            )
+    except FileNotFoundError:
+        return None
+    for column, dtype in dtypes.items():
+        if dtype is str and column in table:
+            table[column] = table[column].astype("category")
+    return table
+
+
+def read_trips(feed_path: str) -> Optional[pd.DataFrame]:
+    """Reads trip_id, route_id, service_id and direction_id from trips.txt"""
+    return read_feed_table(feed_path, "trips.txt", TRIPS_DTYPES)
+
+
+def read_routes(feed_path: str) -> Optional[pd.DataFrame]:
+    """Reads route_id and route_short_name from routes.txt"""
+    return read_feed_table(feed_path, "routes.txt", ROUTES_DTYPES)
+
+
+def read_calendar(feed_path: str) -> Optional[pd.DataFrame]:
+    """Reads the weekly service patterns and date ranges from calendar.txt"""
+    return read_feed_table(feed_path, "calendar.txt", CALENDAR_DTYPES)
+
+
+def service_window(
+    calendar: pd.DataFrame, service_ids: Collection[str]
+) -> Optional[Tuple[str, str]]:
+    """
+    Returns the first start_date and last end_date (YYYYMMDD) over the given
+    services in calendar.txt, or None if none of them are listed.
+    """
+    services = calendar[calendar["service_id"].isin(service_ids)]
+    if services.empty:
+        return None
+    return str(services["start_date"].min()), str(services["end_date"].max())
+
+
+def service_days(service: str) -> List[str]:
+    """
+    Returns the calendar.txt day columns of a service pattern, e.g. "MTuWThF"
+    -> monday to friday.
+
+    Raises:
+        ValueError: If the pattern is not made of M, Tu, W, Th, F, Sa and Su.
+    """
+    days = re.findall("|".join(SERVICE_DAY_NAMES), service)
+    if not days or "".join(days) != service:
+        raise ValueError(f"Not a service pattern of days: {service!r}")
+    return [SERVICE_DAY_NAMES[day] for day in days]
+
+
+def calendar_services(
+    calendar: pd.DataFrame, service: str, feed_date: str
+) -> pd.Series:
+    """
+    Returns the service_ids of calendar.txt that run on every day of a service
+    pattern and are in effect during the week starting on feed_date, so the
+    services of the next timetable period in the same feed are left out.
+
+    Args:
+        calendar: calendar.txt as read by read_calendar
+        service: Service pattern, e.g. "MTuWThF"
+        feed_date: First day of the week to select (YYYYMMDD)
+    """
+    week_start = date(int(feed_date[:4]), int(feed_date[4:6]), int(feed_date[6:]))
+    week_end = int((week_start + timedelta(days=6)).strftime("%Y%m%d"))
+    runs = (calendar[service_days(service)] == 1).all(axis=1)
+    in_effect = (calendar["start_date"] <= week_end) & (
+        calendar["end_date"] >= int(feed_date)
+    )
+    return calendar.loc[runs & in_effect, "service_id"]
+
+
+class TripFilter(NamedTuple):
+    """
+    Selects the trips kept while reading stop_times: those on one of routes
+    (line and direction joined by "__", e.g. "JVL__0") that run on a service
+    pattern (e.g. "MTuWThF") in the feed dated feed_date.
+
+    A feed with a trips.txt is selected from it by feed_trip_routes. A bare
+    stop_times.csv has only its trip_ids to go on, which matches evaluates as
+    Metlink lays them out.
+    """
+
+    routes: Tuple[str, ...]
+    service: str
+    feed_date: str
+
+    def matches(self, trip_ids: pd.Series) -> np.ndarray:
+        """
+        Returns a boolean mask of the Metlink trip_ids this filter keeps,
+        evaluating each distinct trip_id once.
+        """
+        trip_categories = pd.Categorical(trip_ids)
+        fields = parse_trip_ids(pd.Series(trip_categories.categories)).astype(object)
+        keep = (
+            (fields["line"] + "__" + fields["direction"]).isin(self.routes)
+            & fields["service"].str.contains(self.service, regex=False, na=False)
+            & (fields["feed_date"] == self.feed_date)
+        ).to_numpy(dtype=bool)
+        codes = trip_categories.codes
+        return (codes >= 0) & keep[codes]
+
+
+def feed_trip_routes(feed_path: str, trip_filter: TripFilter) -> Optional[pd.DataFrame]:
+    """
+    Selects the trips trip_filter keeps from trips.txt rather than from their
+    trip_ids, so any feed can be used. A route "LINE__DIRECTION" has the trips
+    whose direction_id is DIRECTION and whose route_id, or route_short_name in
+    routes.txt, is LINE. Their service_id has to run on every day of the
+    service pattern in calendar.txt, during the week starting on the feed date
+    (calendar_dates.txt exceptions are not applied); a feed without
+    calendar.txt has the pattern matched against its service_ids instead.
+
+    Returns:
+        DataFrame with the trip_id and route of every trip kept, or None if
+        the feed has no trips.txt (a bare stop_times.csv).
+    """
+    trips = read_trips(feed_path)
+    if trips is None:
+        return None
+
+    route_ids = trips["route_id"].astype(object)
+    lines = [route_ids]
+    routes = read_routes(feed_path)
+    if routes is not None and "route_short_name" in routes:
+        short_names = routes.set_index("route_id")["route_short_name"].astype(object)
+        lines.append(route_ids.map(short_names))
+    directions = trips["direction_id"].astype(object).astype(str)
+
+    trip_route = pd.Series(None, index=trips.index, dtype=object)
+    for route in trip_filter.routes:
+        line, direction = route.split("__")
+        on_line = np.logical_or.reduce([(names == line).to_numpy() for names in lines])
+        trip_route[on_line & (directions == direction).to_numpy()] = route
+
+    calendar = read_calendar(feed_path)
+    service_ids = trips["service_id"].astype(object)
+    if calendar is not None:
+        services = calendar_services(
+            calendar, trip_filter.service, trip_filter.feed_date
+        )
+        running = service_ids.isin(set(services))
+    else:
+        running = service_ids.str.contains(trip_filter.service, regex=False)
+
+    kept = trip_route.notna() & running.fillna(False).astype(bool)
+    return pd.DataFrame(
+        {
+            "trip_id": trips.loc[kept, "trip_id"].astype(object).to_numpy(),
+            "route": trip_route[kept].to_numpy(),
+        }
+    )
+
+
+def stable_string_hashes(values: Collection[str]) -> np.ndarray:
+    """
+    64-bit hashes of strings that, unlike hash(), are the same in every run, so
+    they can be compared against a snapshot saved by an earlier run.
+    """
+    return np.array(
+        [
+            int.from_bytes(
+                hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "little"
+            )
+            for value in values
+        ],
+        dtype=np.uint64,
+    )
+
+
+def mix64(values: np.ndarray) -> np.ndarray:
+    """The splitmix64 finaliser, spreading every input bit over the output"""
+    values = values.astype(np.uint64)
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def trip_digests(
+    offsets: np.ndarray,
+    stop_hashes: np.ndarray,
+    starts: np.ndarray,
+    ends: np.ndarray,
+) -> np.ndarray:
+    """
+    Digests every trip's schedule, its (offset, stop) sequence, into one 64-bit
+    value in a single vectorised pass, so trips that changed between two feeds
+    can be found without building each trip's schedule.
+
+    Args:
+        offsets: Every stop's offset from its trip's first stop, trip by trip
+        stop_hashes: stable_string_hashes of every stop's stop_id
+        starts: First row of each trip
+        ends: Row after the last row of each trip
+
+    Returns:
+        uint64 digest per trip.
+    """
+    if len(starts) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    lengths = ends - starts
+    position = np.arange(len(offsets)) - np.repeat(starts, lengths)
+    rows = mix64(
+        stop_hashes
+        ^ mix64(offsets.astype(np.uint64) | (position.astype(np.uint64) << 32))
+    )
+    # Positions are mixed into each row, so the (wrapping) sum is order-sensitive
+    return mix64(np.add.reduceat(rows, starts) ^ lengths.astype(np.uint64))
+
+
+def read_stop_times_csv(
+    source: Any,
+    trip_filter: Optional[TripFilter] = None,
+    chunksize: int = STOP_TIMES_CHUNK_ROWS,
+    trip_ids: Optional[Collection[str]] = None,
+) -> pd.DataFrame:
+    """
+    Streams the columns of stop_times that schedules are built from, a chunk at a
+    time. Rows failing trip_filter are dropped as each chunk is read and time
+    strings are converted straight away, so neither unused rows nor the string
+    columns are ever held for the whole file.
+
+    Args:
+        source: Path or file object of stop_times.csv / stop_times.txt
+        trip_filter: Trips to keep (default: all)
+        chunksize: Rows parsed per chunk
+        trip_ids: The trips trip_filter keeps, if already known (e.g. from
+            trips.txt); rows are then kept by a plain membership test
+
+    Returns:
+        DataFrame with categorical trip_id and stop_id, and int32 stop_sequence
+        and departure_seconds columns.
+    """
+    pieces = []
+    for chunk in pd.read_csv(
+        source,
+        usecols=list(STOP_TIMES_DTYPES),
+        dtype=STOP_TIMES_DTYPES,
+        chunksize=chunksize,
+    ):
+        if trip_ids is not None:
+            chunk = chunk[chunk["trip_id"].isin(trip_ids)]
+        elif trip_filter is not None:
+            chunk = chunk[trip_filter.matches(chunk["trip_id"])]
+        departure_seconds = gtfs_time_to_seconds(chunk["departure_time"])
+        if (departure_seconds == MISSING_TIME).any():
+            # Stops without a time cannot be placed in a schedule
+            timed = departure_seconds != MISSING_TIME
+            chunk = chunk[timed]
+            departure_seconds = departure_seconds[timed]
+        pieces.append(
+            pd.DataFrame(
+                {
+                    "trip_id": pd.Categorical(chunk["trip_id"]),
+                    "stop_id": pd.Categorical(chunk["stop_id"]),
+                    "stop_sequence": chunk["stop_sequence"].to_numpy(dtype=np.int32),
+                    "departure_seconds": departure_seconds.astype(np.int32),
+                }
+            )
+        )
+
+    if not pieces:
+        return pd.DataFrame(
+            {
+                "trip_id": pd.Categorical([]),
+                "stop_id": pd.Categorical([]),
+                **{
+                    column: np.zeros(0, dtype=np.int32) for column in CACHED_INT_COLUMNS
+                },
+            }
+        )
+
+    return pd.DataFrame(
+        {
+            column: pd.api.types.union_categoricals(
+                [piece[column] for piece in pieces], sort_categories=True
+            )
+            for column in CACHED_CATEGORY_COLUMNS
+        }
+        | {
+            column: np.concatenate([piece[column].to_numpy() for piece in pieces])
+            for column in CACHED_INT_COLUMNS
+        }
+    )
+
+
+def file_fingerprint(path: str, with_hash: bool = True) -> Dict[str, Any]:
+    """
+    Returns the size, mtime and (optionally) SHA-256 of a file, used to tell
+    whether a cache built from it is still current.
+    """
+    stat = os.stat(path)
+    fingerprint: Dict[str, Any] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if with_hash:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        fingerprint["sha256"] = digest.hexdigest()
+    return fingerprint
+
+
+def feed_fingerprint(feed_path: str, with_hash: bool = True) -> Dict[str, Any]:
+    """
+    Returns the file_fingerprint of a feed. For a directory of extracted .txt
+    files, the sizes and mtimes are lists over the files the cache is built
+    from, and the hash covers all of them.
+    """
+    if not os.path.isdir(feed_path):
+        return file_fingerprint(feed_path, with_hash)
+
+    members = [
+        (name, file_fingerprint(os.path.join(feed_path, name), with_hash))
+        for name in FINGERPRINTED_FEED_FILES
+        if os.path.exists(os.path.join(feed_path, name))
+    ]
+    fingerprint: Dict[str, Any] = {
+        "size": [member["size"] for _, member in members],
+        "mtime_ns": [member["mtime_ns"] for _, member in members],
+    }
+    if with_hash:
+        digest = hashlib.sha256()
+        for name, member in members:
+            digest.update(f"{name}:{member['sha256']}\n".encode())
+        fingerprint["sha256"] = digest.hexdigest()
+    return fingerprint
+
+
+def write_stop_times_cache(
+    stop_times: pd.DataFrame,
+    cache_dir: str,
+    fingerprint: Dict[str, Any],
+    trip_filter: Optional[TripFilter] = None,
+) -> None:
+    """
+    Writes stop_times as one .npy file per column plus a meta.json recording the
+    source fingerprint and the trip filter it was read with. meta.json is written
+    last, so a cache left half-written by a crash is never mistaken for a valid
+    one.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    meta_path = os.path.join(cache_dir, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    for column in CACHED_INT_COLUMNS:
+        np.save(
+            os.path.join(cache_dir, f"{column}.npy"),
+            stop_times[column].to_numpy(dtype=np.int32),
+        )
+    for column in CACHED_CATEGORY_COLUMNS:
+        categorical = stop_times[column].cat
+        np.save(
+            os.path.join(cache_dir, f"{column}.codes.npy"),
+            categorical.codes.to_numpy(dtype=np.int32),
+        )
+        np.save(
+            os.path.join(cache_dir, f"{column}.categories.npy"),
+            categorical.categories.to_numpy(dtype=str),
+        )
+
+    meta = {
+        "version": STOP_TIMES_CACHE_VERSION,
+        "rows": len(stop_times),
+        "source": fingerprint,
+        "trip_filter": trip_filter_to_json(trip_filter),
+    }
+    with open(meta_path + ".tmp", "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(meta_path + ".tmp", meta_path)
+
+
+def trip_filter_to_json(trip_filter: Optional[TripFilter]) -> Optional[Dict[str, Any]]:
+    """Convert a trip filter to the form recorded in a cache's meta.json"""
+    if trip_filter is None:
+        return None
+    return {
+        "routes": list(trip_filter.routes),
+        "service": trip_filter.service,
+        "feed_date": trip_filter.feed_date,
+    }
+
+
+def read_stop_times_cache(cache_dir: str) -> pd.DataFrame:
+    """
+    Loads a cache written by write_stop_times_cache. Integer columns are
+    memory-mapped rather than read into memory.
+    """
+    columns: Dict[str, Any] = {}
+    for column in CACHED_CATEGORY_COLUMNS:
+        codes = np.load(os.path.join(cache_dir, f"{column}.codes.npy"))
+        categories = np.load(os.path.join(cache_dir, f"{column}.categories.npy"))
+        columns[column] = pd.Categorical.from_codes(
+            codes, categories=categories.tolist()
+        )
+    for column in CACHED_INT_COLUMNS:
+        columns[column] = np.load(
+            os.path.join(cache_dir, f"{column}.npy"), mmap_mode="r"
+        )
+    return pd.DataFrame(columns, copy=False)
+
+
+def load_stop_times(
+    feed_path: str,
+    cache_dir: Optional[str] = None,
+    trip_filter: Optional[TripFilter] = None,
+) -> pd.DataFrame:
+    """
+    Loads stop_times from a GTFS feed through a columnar cache next to it.
+
+    The cache is reused while the feed's size and mtime are unchanged and it was
+    built with the same trip filter. If the size or mtime changed, the feed is
+    hashed: an identical hash just refreshes the recorded fingerprint, a
+    different one rebuilds the cache. For a GTFS .zip the archive itself is
+    fingerprinted, so a new feed can simply replace the old archive; for an
+    extracted directory, its stop_times.txt and trips.txt are.
+
+    Args:
+        feed_path: GTFS .zip, directory of extracted files or a bare
+            stop_times.csv
+        cache_dir: Cache directory (default: feed_path with ".cache" appended)
+        trip_filter: Trips to keep (default: all)
+
+    Returns:
+        stop_times frame as produced by read_stop_times_csv.
+    """
+    if cache_dir is None:
+        # Next to the feed, also when it is a directory given as "feed/"
+        cache_dir = f"{os.path.normpath(feed_path)}.cache"
+    meta_path = os.path.join(cache_dir, "meta.json")
+
+    meta: Optional[Dict[str, Any]] = None
+    try:
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    if (
+        meta is not None
+        and meta.get("version") == STOP_TIMES_CACHE_VERSION
+        and meta.get("trip_filter") == trip_filter_to_json(trip_filter)
+    ):
+        cached = meta["source"]
+        fingerprint = feed_fingerprint(feed_path, with_hash=False)
+        if (
+            fingerprint["size"] == cached["size"]
+            and fingerprint["mtime_ns"] == cached["mtime_ns"]
+        ):
+            return read_stop_times_cache(cache_dir)
+
+        fingerprint = feed_fingerprint(feed_path)
+        if fingerprint["sha256"] == cached["sha256"]:
+            meta["source"] = fingerprint
+            with open(meta_path + ".tmp", "w") as f:
+                json.dump(meta, f, indent=2)
+            os.replace(meta_path + ".tmp", meta_path)
+            return read_stop_times_cache(cache_dir)
+
+    print(f"Building stop_times cache in {cache_dir}")
+    fingerprint = feed_fingerprint(feed_path)
+
+    # trips.txt lists every trip once, so the filter is evaluated there rather
+    # than on each chunk of stop_times
+    trip_ids = None
+    if trip_filter is not None:
+        trip_routes = feed_trip_routes(feed_path, trip_filter)
+        if trip_routes is not None:
+            trip_ids = set(trip_routes["trip_id"])
+
+    with open_feed_file(feed_path, "stop_times.txt") as f:
+        stop_times = read_stop_times_csv(f, trip_filter, trip_ids=trip_ids)
+    try:
+        write_stop_times_cache(stop_times, cache_dir, fingerprint, trip_filter)
+    except OSError as e:
+        print(f"Error writing stop_times cache to {cache_dir}: {e}")
+    return stop_times
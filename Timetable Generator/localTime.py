@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence
+from zoneinfo import ZoneInfo
+
+# Zone the network's timetables (and so trip start times) are in
+NETWORK_TIMEZONE: str = "Pacific/Auckland"
+
+SECONDS_PER_DAY: int = 24 * 3600
+
+
+class MidnightClock:
+    """
+    Converts epoch timestamps to local clock time in seconds since midnight, in
+    an explicit zone rather than whatever zone the host is set to.
+
+    The UTC offset is looked up once per local day and cached with the epoch
+    range of that day, so converting a poll's timestamps is one addition and
+    modulo each. On the two days a year that a DST transition falls in, each
+    timestamp is looked up on its own instead.
+    """
+
+    def __init__(self, timezone: str = NETWORK_TIMEZONE) -> None:
+        self.zone = ZoneInfo(timezone)
+        # Epoch range of the cached local day
+        self.day_start = 0.0
+        self.day_end = 0.0
+        # UTC offset in seconds throughout the cached day, or None if it changes
+        self.offset: Optional[int] = None
+
+    def cache_day(self, timestamp: float) -> None:
+        """Looks up the UTC offset over the local day timestamp falls in"""
+        midnight = datetime.fromtimestamp(timestamp, self.zone).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        # Adding a day to an aware datetime keeps the wall clock time, so this is
+        # the next local midnight whatever the offset is then
+        next_midnight = midnight + timedelta(days=1)
+        self.day_start = midnight.timestamp()
+        self.day_end = next_midnight.timestamp()
+        start_offset = midnight.utcoffset()
+        if start_offset == next_midnight.utcoffset():
+            self.offset = int(start_offset.total_seconds())
+        else:
+            self.offset = None
+
+    def seconds_since_midnight(self, timestamps: Sequence[float]) -> List[int]:
+        """
+        Converts a batch of timestamps to local clock time.
+
+        Args:
+            timestamps: Seconds since epoch
+
+        Returns:
+            Whole seconds since local midnight (hour * 3600 + minute * 60 +
+            second of the local time), one per timestamp.
+        """
+        if not timestamps:
+            return []
+        earliest = min(timestamps)
+        latest = max(timestamps)
+        if not self.day_start <= earliest < self.day_end:
+            self.cache_day(earliest)
+
+        offset = self.offset
+        if offset is not None and latest < self.day_end:
+            return [(int(ts) + offset) % SECONDS_PER_DAY for ts in timestamps]
+
+        # The batch spans midnight or a DST transition
+        seconds = []
+        for ts in timestamps:
+            local = datetime.fromtimestamp(ts, self.zone)
+            seconds.append(local.hour * 3600 + local.minute * 60 + local.second)
+        return seconds
@@ -0,0 +1,317 @@
+import bisect
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Upper bounds (seconds) of the buckets of every duration histogram
+DURATION_BUCKETS: Tuple[float, ...] = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# Upper bounds of the buckets of the trains per poll histogram
+TRAINS_BUCKETS: Tuple[float, ...] = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# Prefixed to every metric name
+METRIC_PREFIX: str = "ledrails_"
+
+
+class Histogram:
+    """Counts of observed values in fixed buckets, with their sum"""
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = tuple(buckets)
+        # One count per bucket plus one for values above the last bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Adds one value to the bucket whose upper bound it is at or below"""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """(name suffix, labels, value) samples in the Prometheus layout"""
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            samples.append(("_bucket", {"le": format_value(bound)}, cumulative))
+        samples.append(("_bucket", {"le": "+Inf"}, self.count))
+        samples.append(("_sum", {}, self.sum))
+        samples.append(("_count", {}, self.count))
+        return samples
+
+
+class MonitorMetrics:
+    """
+    Counters and histograms of one monitor: how long polls and JSON decoding
+    take, how many trains each poll has, block entries per route, trains on
+    trips without a schedule, how long saves take and how many observations
+    are held in memory.
+
+    Polls are recorded from worker threads and read by the exporter's thread,
+    so every update takes the lock. Each poll's counts are recorded in one go
+    rather than per train.
+    """
+
+    def __init__(self, city: Optional[str] = None) -> None:
+        """
+        Args:
+            city: Labels every sample, when several cities are monitored at once
+        """
+        self.labels: Dict[str, str] = {} if city is None else {"city": city}
+        self.lock = threading.Lock()
+        self.poll_seconds = Histogram(DURATION_BUCKETS)
+        self.poll_failures = 0
+        self.decode_seconds = Histogram(DURATION_BUCKETS)
+        self.trains_per_poll = Histogram(TRAINS_BUCKETS)
+        # route -> block entries recorded
+        self.block_entries: Dict[str, int] = {}
+        self.unknown_trips = 0
+        self.save_seconds = Histogram(DURATION_BUCKETS)
+        self.save_failures = 0
+        self.observations = 0
+
+    def observe_poll(self, seconds: float, ok: bool) -> None:
+        """Adds one tracked-trains request, successful or not"""
+        with self.lock:
+            self.poll_seconds.observe(seconds)
+            if not ok:
+                self.poll_failures += 1
+
+    def observe_decode(self, seconds: float) -> None:
+        """Adds the time taken to parse one response body"""
+        with self.lock:
+            self.decode_seconds.observe(seconds)
+
+    def observe_trains(
+        self, trains: int, unknown_trips: int, routes_entered: List[str]
+    ) -> None:
+        """
+        Adds one processed poll.
+
+        Args:
+            trains: Trains in the poll
+            unknown_trips: Trains on a trip_id without a schedule
+            routes_entered: Route of every block entry the poll recorded
+        """
+        with self.lock:
+            self.trains_per_poll.observe(trains)
+            self.unknown_trips += unknown_trips
+            for route in routes_entered:
+                self.block_entries[route] = self.block_entries.get(route, 0) + 1
+
+    def observe_save(self, seconds: float, ok: bool) -> None:
+        """Adds one block schedules save or compaction"""
+        with self.lock:
+            if ok:
+                self.save_seconds.observe(seconds)
+            else:
+                self.save_failures += 1
+
+    def set_observations(self, observations: int) -> None:
+        """Sets the number of block entry times held in memory"""
+        with self.lock:
+            self.observations = observations
+
+    def families(self) -> List[Tuple[str, str, str, List[Tuple[str, Dict, float]]]]:
+        """
+        Returns (name, type, help, samples) of every metric, each sample a
+        (name suffix, labels, value).
+        """
+        with self.lock:
+            return [
+                (
+                    "poll_seconds",
+                    "histogram",
+                    "Duration of tracked-trains requests",
+                    self.poll_seconds.samples(),
+                ),
+                (
+                    "poll_failures_total",
+                    "counter",
+                    "Tracked-trains requests that failed",
+                    [("", {}, self.poll_failures)],
+                ),
+                (
+                    "json_decode_seconds",
+                    "histogram",
+                    "Time taken to parse a tracked-trains response",
+                    self.decode_seconds.samples(),
+                ),
+                (
+                    "trains_per_poll",
+                    "histogram",
+                    "Trains in each processed poll",
+                    self.trains_per_poll.samples(),
+                ),
+                (
+                    "block_entries_total",
+                    "counter",
+                    "Block entries recorded",
+                    [
+                        ("", {"route": route}, count)
+                        for route, count in sorted(self.block_entries.items())
+                    ],
+                ),
+                (
+                    "unknown_trips_total",
+                    "counter",
+                    "Trains seen on a trip_id without a schedule",
+                    [("", {}, self.unknown_trips)],
+                ),
+                (
+                    "save_seconds",
+                    "histogram",
+                    "Duration of block schedules saves",
+                    self.save_seconds.samples(),
+                ),
+                (
+                    "save_failures_total",
+                    "counter",
+                    "Block schedules saves that failed",
+                    [("", {}, self.save_failures)],
+                ),
+                (
+                    "observations",
+                    "gauge",
+                    "Block entry times held in memory",
+                    [("", {}, self.observations)],
+                ),
+            ]
+
+
+def format_value(value: float) -> str:
+    """Formats a sample value or bucket bound as Prometheus expects"""
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    """Formats labels as {key="value",...}, escaped as Prometheus expects"""
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def render_metrics(metrics: List[MonitorMetrics]) -> str:
+    """
+    Renders the metrics of one or more monitors in the Prometheus text format,
+    each metric's samples from every monitor under one HELP and TYPE.
+    """
+    merged: Dict[str, Tuple[str, str, List[str]]] = {}
+    for monitor in metrics:
+        for name, kind, help_text, samples in monitor.families():
+            name = METRIC_PREFIX + name
+            lines = merged.setdefault(name, (kind, help_text, []))[2]
+            for suffix, labels, value in samples:
+                labels = {**monitor.labels, **labels}
+                lines.append(
+                    f"{name}{suffix}{format_labels(labels)} {format_value(value)}"
+                )
+
+    text = []
+    for name, (kind, help_text, lines) in merged.items():
+        text.append(f"# HELP {name} {help_text}")
+        text.append(f"# TYPE {name} {kind}")
+        text.extend(lines)
+    return "\n".join(text) + "\n"
+
+
+class MetricsExporter:
+    """
+    Makes monitors' metrics available to Prometheus: served over HTTP at
+    /metrics, written periodically to a text file (for node_exporter's
+    textfile collector), or both. Both run in daemon threads.
+    """
+
+    def __init__(self, metrics: List[MonitorMetrics]) -> None:
+        self.metrics = metrics
+        self.server: Optional[ThreadingHTTPServer] = None
+        self.stopped = threading.Event()
+        self.threads: List[threading.Thread] = []
+
+    def render(self) -> str:
+        return render_metrics(self.metrics)
+
+    def write(self, path: str) -> None:
+        """Writes the metrics to path, replacing it atomically"""
+        with open(path + ".tmp", "w") as f:
+            f.write(self.render())
+        os.replace(path + ".tmp", path)
+
+    def serve(self, port: int, host: str = "localhost") -> None:
+        """Starts serving the metrics on http://host:port/metrics"""
+        exporter = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                # Scrapes would drown the monitor's own log
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.start_thread(self.server.serve_forever)
+        print(f"Serving metrics on http://{host}:{port}/metrics")
+
+    def write_periodically(self, path: str, interval: float = 15.0) -> None:
+        """Starts rewriting the metrics file every interval seconds"""
+
+        def write_loop() -> None:
+            while not self.stopped.wait(interval):
+                try:
+                    self.write(path)
+                except OSError as e:
+                    print(f"Error writing metrics to {path}: {e}")
+
+        self.start_thread(write_loop)
+        print(f"Writing metrics to {path} every {interval:g} s")
+
+    def start_thread(self, target: Any) -> None:
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def close(self, path: Optional[str] = None) -> None:
+        """
+        Stops serving and writing, after writing the metrics to path a final
+        time if given.
+        """
+        self.stopped.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        for thread in self.threads:
+            thread.join(timeout=1.0)
+        if path is not None:
+            self.write(path)
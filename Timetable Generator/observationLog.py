@@ -0,0 +1,211 @@
+import os
+import threading
+from typing import Callable, Iterator, List, NamedTuple, Optional, TextIO
+
+# First line of every journal, followed by the generation it belongs to
+JOURNAL_HEADER: str = "block-journal"
+
+
+class JournalEntry(NamedTuple):
+    """One block entry read back from a journal"""
+
+    route: str
+    schedule: int
+    block: int
+    seconds_since_start: int
+    # The train that entered the block, for restoring seen_trains; None in
+    # entries journaled before trains were recorded
+    train_id: Optional[str]
+    trip_id: Optional[str]
+    timestamp: Optional[int]
+
+
+class ObservationJournal:
+    """
+    Append-only log of block entries, so recording one costs a short line
+    ("route schedule block seconds train_id trip_id timestamp") instead of
+    rewriting every block schedule.
+
+    Entries are buffered in memory and written out with one fsync per flush, so
+    a crash loses at most the entries since the last flush. Compaction folds
+    the journal into a block schedules snapshot and starts a new journal.
+
+    Each journal and snapshot carries a generation number. Compaction writes a
+    snapshot of the next generation before replacing the journal, so a journal
+    left behind by a crash in between is older than the snapshot and is not
+    replayed on top of it a second time.
+    """
+
+    def __init__(self, path: str, generation: int = 0) -> None:
+        """
+        Args:
+            path: Journal file, next to the snapshot it is folded into
+            generation: journal_generation of the snapshot it follows
+        """
+        self.path = path
+        self.generation = generation
+        # Lines appended since the last flush. Guarded by lock, as entries are
+        # appended on the monitor's thread while a worker thread flushes them
+        self.pending: List[str] = []
+        self.lock = threading.Lock()
+        # Guards the open journal file
+        self.file_lock = threading.Lock()
+        self.file: Optional[TextIO] = None
+        self.file_generation: Optional[int] = None
+        # Entries written since the last compaction, including replayed ones
+        self.entries = 0
+
+    def replay(self) -> Iterator[JournalEntry]:
+        """
+        Reads the entries of this journal's generation. A journal of another
+        generation has already been folded into the snapshot, and a torn last
+        line is skipped.
+        """
+        try:
+            with open(self.path, "r") as f:
+                header = f.readline().split()
+                if header != [JOURNAL_HEADER, str(self.generation)]:
+                    return
+                for line in f:
+                    fields = line.split()
+                    if not line.endswith("\n") or len(fields) not in (4, 7):
+                        continue
+                    route, schedule, block, seconds = fields[:4]
+                    train_id, trip_id, timestamp = fields[4:] or (None, None, None)
+                    self.entries += 1
+                    yield JournalEntry(
+                        route,
+                        int(schedule),
+                        int(block),
+                        int(seconds),
+                        train_id,
+                        trip_id,
+                        None if timestamp is None else int(timestamp),
+                    )
+        except FileNotFoundError:
+            return
+
+    def open(self) -> None:
+        """
+        Opens the journal for appending, starting a new one unless the journal
+        on disk belongs to this generation. Call after replay.
+        """
+        with self.file_lock:
+            self.open_file(self.generation)
+
+    def open_file(self, generation: int) -> None:
+        header = f"{JOURNAL_HEADER} {generation}\n"
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+
+        if data.startswith(header.encode()):
+            # Cut off a line torn by a crash so the next entry starts cleanly
+            self.file = open(self.path, "a")
+            self.file.truncate(data.rfind(b"\n") + 1)
+        else:
+            with open(self.path + ".tmp", "w") as f:
+                f.write(header)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(self.path + ".tmp", self.path)
+            self.file = open(self.path, "a")
+        self.file_generation = generation
+
+    def append(
+        self,
+        train_id: str,
+        trip_id: str,
+        route: str,
+        schedule: int,
+        block: int,
+        seconds_since_start: int,
+        timestamp: int,
+    ) -> None:
+        """Buffers one block entry until the next flush"""
+        with self.lock:
+            self.pending.append(
+                f"{route} {schedule} {block} {seconds_since_start} "
+                f"{train_id} {trip_id} {timestamp}\n"
+            )
+
+    def write(self, lines: List[str]) -> None:
+        if lines:
+            self.file.writelines(lines)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.entries += len(lines)
+
+    def flush(self) -> None:
+        """Writes the buffered entries to the journal with a single fsync"""
+        with self.file_lock:
+            if self.file is None and not self.compacting:
+                self.open_file(self.generation)
+            with self.lock:
+                # Entries cut for a compaction still in progress go to the next
+                # journal, which that compaction opens
+                if self.compacting:
+                    return
+                lines, self.pending = self.pending, []
+            self.write(lines)
+
+    @property
+    def compacting(self) -> bool:
+        """Whether a compaction has been cut but not finished"""
+        return (
+            self.file_generation is not None and self.generation != self.file_generation
+        )
+
+    def cut(self) -> List[str]:
+        """
+        Starts a compaction: returns the buffered entries that the snapshot
+        being taken includes and moves on to the next generation. Take the
+        snapshot together with the cut, before any other entry is appended.
+        """
+        with self.lock:
+            lines, self.pending = self.pending, []
+            self.generation += 1
+            return lines
+
+    def compact(self, lines: List[str], write_snapshot: Callable[[], bool]) -> bool:
+        """
+        Finishes a compaction started by cut: journals the cut entries, writes
+        the snapshot and then starts the next generation's journal.
+
+        Args:
+            lines: Entries returned by cut
+            write_snapshot: Writes the snapshot taken at the cut, returning
+                whether it was written
+
+        Returns:
+            Whether the journal was folded into the snapshot. If the snapshot
+            could not be written, journaling carries on in the old journal.
+        """
+        with self.file_lock:
+            generation = self.generation
+            if self.file is None:
+                self.open_file(generation - 1)
+            # Until the snapshot is written these entries are only in memory
+            self.write(lines)
+
+            written = write_snapshot()
+            if written:
+                self.file.close()
+                self.entries = 0
+                self.open_file(generation)
+            with self.lock:
+                # Entries appended since the cut follow whichever journal is open
+                self.generation = self.file_generation
+                pending, self.pending = self.pending, []
+            self.write(pending)
+            return written
+
+    def close(self) -> None:
+        """Flushes the buffered entries and closes the journal"""
+        self.flush()
+        with self.file_lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
@@ -0,0 +1,229 @@
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterator, List, Tuple
+from urllib.request import pathname2url
+
+from blockTimes import BlockTimeHistogram
+
+SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS observations (
+    train_id TEXT NOT NULL,
+    trip_id TEXT NOT NULL,
+    route TEXT NOT NULL,
+    schedule INTEGER NOT NULL,
+    block INTEGER NOT NULL,
+    seconds_since_start INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS observations_by_block
+    ON observations (route, schedule, block, seconds_since_start);
+CREATE INDEX IF NOT EXISTS observations_by_time ON observations (timestamp);
+CREATE INDEX IF NOT EXISTS observations_by_train ON observations (train_id, timestamp);
+
+CREATE TABLE IF NOT EXISTS start_times (
+    route TEXT NOT NULL,
+    schedule INTEGER NOT NULL,
+    start_seconds INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS start_times_by_schedule ON start_times (route, schedule);
+"""
+
+
+class ObservationStore:
+    """
+    Block entry observations kept in a SQLite database in WAL mode, one row per
+    entry with the train, trip and time it was seen at.
+
+    Entries are buffered and inserted one transaction per flush. WAL lets the
+    header generator (or another reader) query the database while a collector
+    is writing to it, and the (route, schedule, block, seconds) index lets
+    per-block entry times be read as grouped counts without loading every row.
+    """
+
+    def __init__(self, path: str, read_only: bool = False) -> None:
+        """
+        Args:
+            path: SQLite database file, created if missing (unless read_only)
+            read_only: Open an existing database for queries only
+        """
+        self.path = path
+        if read_only:
+            uri = f"file:{pathname2url(os.path.abspath(path))}?mode=ro"
+            self.connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            # In WAL mode a commit survives a crash of the process without an
+            # fsync; only a power loss can undo the last few
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(SCHEMA)
+        # Guards pending and the connection, which flush uses from worker threads
+        self.lock = threading.Lock()
+        self.pending: List[Tuple[str, str, str, int, int, int, int]] = []
+
+    def append(
+        self,
+        train_id: str,
+        trip_id: str,
+        route: str,
+        schedule: int,
+        block: int,
+        seconds_since_start: int,
+        timestamp: int,
+    ) -> None:
+        """Buffers one block entry until the next flush"""
+        with self.lock:
+            self.pending.append(
+                (
+                    train_id,
+                    trip_id,
+                    route,
+                    schedule,
+                    block,
+                    seconds_since_start,
+                    timestamp,
+                )
+            )
+
+    def flush(self) -> None:
+        """Inserts the buffered entries in a single transaction"""
+        with self.lock:
+            rows, self.pending = self.pending, []
+            if rows:
+                with self.connection:
+                    self.connection.executemany(
+                        "INSERT INTO observations VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+                    )
+
+    def replace_start_times(
+        self, start_times: Dict[Tuple[str, int], List[int]]
+    ) -> None:
+        """
+        Replaces the start times of every schedule, as worked out from the feed.
+
+        Args:
+            start_times: (route, schedule) -> start times in seconds since midnight
+        """
+        with self.lock:
+            with self.connection:
+                self.connection.execute("DELETE FROM start_times")
+                self.connection.executemany(
+                    "INSERT INTO start_times VALUES (?, ?, ?)",
+                    (
+                        (route, schedule, start)
+                        for (route, schedule), starts in start_times.items()
+                        for start in starts
+                    ),
+                )
+
+    def start_times(self) -> Dict[Tuple[str, int], List[int]]:
+        """Returns (route, schedule) -> start times, in the order they were saved"""
+        start_times: Dict[Tuple[str, int], List[int]] = {}
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT route, schedule, start_seconds FROM start_times ORDER BY rowid"
+            )
+            for route, schedule, start in rows:
+                start_times.setdefault((route, schedule), []).append(start)
+        return start_times
+
+    def last_entries(self) -> Dict[str, Tuple[int, str, int]]:
+        """
+        Returns train_id -> (block, trip_id, timestamp) of each train's latest
+        block entry, to restore seen_trains from.
+        """
+        with self.lock:
+            # SQLite takes the bare columns from the row holding the MAX
+            rows = self.connection.execute(
+                "SELECT train_id, block, trip_id, MAX(timestamp) "
+                "FROM observations GROUP BY train_id"
+            )
+            return {
+                train_id: (block, trip_id, timestamp)
+                for train_id, block, trip_id, timestamp in rows
+            }
+
+    def block_time_counts(self) -> Iterator[Tuple[str, int, int, int, int]]:
+        """
+        Yields (route, schedule, block, seconds since start, count) for every
+        distinct entry time, grouped in the database and read off the block index
+        in order, so no more than one row is held at a time.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT route, schedule, block, seconds_since_start, COUNT(*) "
+                "FROM observations "
+                "GROUP BY route, schedule, block, seconds_since_start "
+                "ORDER BY route, schedule, block, seconds_since_start"
+            )
+            yield from rows
+
+    def copy_routes_from(self, path: str, routes: List[str]) -> int:
+        """
+        Copies the block entries on routes from another store into this one,
+        in one transaction.
+
+        Returns:
+            Entries copied.
+        """
+        columns = (
+            "train_id, trip_id, route, schedule, block, seconds_since_start, "
+            "timestamp"
+        )
+        with self.lock:
+            self.connection.execute("ATTACH DATABASE ? AS source", (path,))
+            try:
+                with self.connection:
+                    cursor = self.connection.execute(
+                        f"INSERT INTO observations ({columns}) "
+                        f"SELECT {columns} FROM source.observations "
+                        f"WHERE route IN ({', '.join('?' * len(routes))})",
+                        routes,
+                    )
+                return cursor.rowcount
+            finally:
+                self.connection.execute("DETACH DATABASE source")
+
+    def close(self) -> None:
+        """Inserts the buffered entries and closes the database"""
+        self.flush()
+        with self.lock:
+            self.connection.close()
+
+
+def block_schedules_from_store(path: str) -> Dict[str, Any]:
+    """
+    Reads a store into the JSON form of block_schedules (with start times per
+    schedule), block times as histograms, for the header generator.
+
+    Args:
+        path: SQLite database written by a collector, which may still be running
+    """
+    store = ObservationStore(path, read_only=True)
+    try:
+        start_times = store.start_times()
+        data: Dict[str, Any] = {}
+        block_times: Dict[Tuple[str, int, int], BlockTimeHistogram] = {}
+        for route, schedule, block, seconds, count in store.block_time_counts():
+            histogram = block_times.get((route, schedule, block))
+            if histogram is None:
+                histogram = block_times[(route, schedule, block)] = BlockTimeHistogram()
+                entry = data.setdefault(
+                    f"{route}_Schedule_{schedule}",
+                    {
+                        "start_times": start_times.get((route, schedule), []),
+                        "blocks_times": {},
+                    },
+                )
+                entry["blocks_times"][str(block)] = histogram
+            histogram.append(seconds, count)
+    finally:
+        store.connection.close()
+
+    for entry in data.values():
+        entry["blocks_times"] = {
+            block: histogram.to_json()
+            for block, histogram in entry["blocks_times"].items()
+        }
+    return data
@@ -0,0 +1,187 @@
+import statistics
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from trackedTrains import UNCHANGED
+
+
+def newest_timestamp(trains: List[Dict[str, Any]]) -> Optional[float]:
+    """
+    Finds the most recent position.timestamp in a poll.
+
+    Args:
+        trains: Tracked train dictionaries from one poll
+
+    Returns:
+        Newest timestamp in seconds since epoch, or None if no train has one.
+    """
+    newest = None
+    for train in trains:
+        try:
+            timestamp = float(train["position"]["timestamp"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if newest is None or timestamp > newest:
+            newest = timestamp
+    return newest
+
+
+class PollScheduler:
+    """
+    Decides when to poll tracked trains by learning when the backend's position
+    data actually changes.
+
+    The newest position.timestamp of each poll gives the upstream update period
+    (median gap between successive new timestamps) and its phase (the last new
+    timestamp). The delay until an update can be fetched is the smallest gap
+    seen between a timestamp and the poll that first saw it, preferring polls
+    that came straight after a stale one, since only those bracket the arrival
+    (a poll timed for after the arrival would only confirm the estimate plus
+    the guard, and the estimate would creep upwards). Polls are timed
+    for just after the next update should be available. Polls that come too
+    early are retried quickly, and polls with fewer than sparse_trains trains
+    (e.g. overnight) back off exponentially up to max_interval.
+    """
+
+    def __init__(
+        self,
+        min_interval: float = 1.0,
+        default_interval: float = 5.0,
+        max_interval: float = 60.0,
+        guard: float = 0.5,
+        sparse_trains: int = 1,
+        window: int = 20,
+        min_samples: int = 3,
+    ) -> None:
+        """
+        Args:
+            min_interval: Shortest time between polls in seconds
+            default_interval: Time between polls after a failed poll
+            max_interval: Longest time between polls in seconds
+            guard: Seconds to wait past the expected arrival of new data
+            sparse_trains: Polls with fewer trains than this back off
+            window: Number of recent updates the estimates are taken over
+            min_samples: Updates to see before trusting the estimated period
+        """
+        self.min_interval = min_interval
+        self.default_interval = default_interval
+        self.max_interval = max_interval
+        self.guard = guard
+        self.sparse_trains = sparse_trains
+        self.min_samples = min_samples
+
+        self.newest: Optional[float] = None
+        self.update_gaps: Deque[float] = deque(maxlen=window)
+        # Delays measured by polls straight after a stale poll, and by others
+        self.delays: Deque[float] = deque(maxlen=window)
+        self.unbracketed_delays: Deque[float] = deque(maxlen=window)
+        # Consecutive polls without new data, and consecutive sparse polls
+        self.stale_polls = 0
+        self.sparse_polls = 0
+        self.failed = False
+
+        self.polls = 0
+        self.fresh_polls = 0
+
+    @property
+    def period(self) -> Optional[float]:
+        """Estimated seconds between upstream updates, once enough are seen"""
+        if len(self.update_gaps) < self.min_samples:
+            return None
+        return max(statistics.median(self.update_gaps), self.min_interval)
+
+    @property
+    def delay(self) -> float:
+        """Estimated seconds from an update's timestamp until it can be fetched"""
+        if self.delays:
+            return min(self.delays)
+        if self.unbracketed_delays:
+            return min(self.unbracketed_delays)
+        return 0.0
+
+    def observe(
+        self, trains: Optional[List[Dict[str, Any]]], received_at: float
+    ) -> None:
+        """
+        Updates the estimates with the result of a poll.
+
+        Args:
+            trains: Trains from the poll, UNCHANGED if they have not changed
+                since the last poll, or None if the poll failed
+            received_at: Time the poll's response arrived in seconds since epoch
+        """
+        self.polls += 1
+        self.failed = trains is None
+        if trains is None:
+            return
+
+        # An unchanged payload is the last one again (an empty list overnight
+        # keeps coming back as a 304 or the same body), so as sparse as it was
+        if trains is UNCHANGED:
+            if self.sparse_polls:
+                self.sparse_polls += 1
+        elif len(trains) < self.sparse_trains:
+            self.sparse_polls += 1
+        else:
+            self.sparse_polls = 0
+
+        newest = newest_timestamp(trains)
+        if newest is None or (self.newest is not None and newest <= self.newest):
+            self.stale_polls += 1
+            return
+
+        if self.newest is not None:
+            self.update_gaps.append(newest - self.newest)
+        delay = max(received_at - newest, 0.0)
+        if self.stale_polls:
+            self.delays.append(delay)
+        else:
+            self.unbracketed_delays.append(delay)
+        self.newest = newest
+        self.stale_polls = 0
+        self.fresh_polls += 1
+
+    def next_poll_time(self, now: float) -> float:
+        """
+        Works out when to poll next.
+
+        Args:
+            now: Current time in seconds since epoch
+
+        Returns:
+            Time of the next poll in seconds since epoch.
+        """
+        if self.failed:
+            return now + self.default_interval
+
+        if self.sparse_polls:
+            # The exponent is capped, as a whole night of polls would overflow
+            backoff = self.default_interval * 2 ** min(self.sparse_polls - 1, 16)
+            return now + min(backoff, self.max_interval)
+
+        period = self.period
+        if period is None or self.newest is None:
+            # Still learning: poll quickly so the period is not aliased
+            return now + self.min_interval
+
+        if self.stale_polls:
+            # Early (or the update is late): retry soon, but not faster than
+            # min_interval and never later than one period
+            retry = self.min_interval * 2 ** (self.stale_polls - 1)
+            return now + min(retry, period, self.max_interval)
+
+        # Next update after the newest one we have, plus how long it takes
+        # to reach us
+        expected = self.newest + period + self.delay + self.guard
+        while expected < now + self.min_interval:
+            expected += period
+        return min(expected, now + self.max_interval)
+
+    def summary(self) -> str:
+        """One-line summary for the monitor's log"""
+        period = self.period
+        period_text = f"{period:.1f} s" if period is not None else "learning"
+        return (
+            f"{self.fresh_polls} of {self.polls} polls had new data, "
+            f"update period {period_text}, delay {self.delay:.1f} s"
+        )
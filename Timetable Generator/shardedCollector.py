@@ -0,0 +1,412 @@
+import argparse
+import json
+import os
+import queue
+import time
+from collections.abc import Mapping
+from multiprocessing import Process, Queue
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+from blockTimes import BlockTimeHistogram
+from generateTimetable import ROUTES, TimetableContext, add_monitor_arguments
+
+
+class ShardConfig(NamedTuple):
+    """What a shard worker process needs to record its routes' block entries"""
+
+    index: int
+    # Route/direction pairs whose trains this shard records
+    routes: List[str]
+    # This shard's own block schedules JSON (and journal) or store
+    block_schedules_path: str
+    journal_path: Optional[str]
+    store_path: Optional[str]
+    # Schedule snapshot written by the parent, to look trips up in
+    schedule_snapshot_path: str
+    block_histograms: bool = False
+    seen_train_ttl: float = 30 * 60
+    # Seconds between saves (default: the context's save_interval())
+    save_interval: Optional[float] = None
+    log_entries: bool = True
+
+
+def shard_path(path: Optional[str], index: int) -> Optional[str]:
+    """
+    Names shard index's copy of a file, e.g. block_schedules.json becomes
+    block_schedules.shard0.json.
+    """
+    if path is None:
+        return None
+    root, extension = os.path.splitext(path)
+    return f"{root}.shard{index}{extension}"
+
+
+def partition_routes(routes: List[str], shards: int) -> List[List[str]]:
+    """
+    Deals routes out to shards in turn. Both directions of a line are next to
+    each other in ROUTES, so they usually land on different shards and a busy
+    line is split between two workers.
+    """
+    return [routes[index::shards] for index in range(shards)]
+
+
+def run_shard(config: ShardConfig, polls: "Queue") -> None:
+    """
+    Worker process of one shard: records block entries of the trains handed
+    to it until it is sent None (or interrupted), then saves its block
+    schedules.
+
+    Only the shard's own routes are kept from the schedule snapshot, so its
+    block_schedules, seen_trains and start times cover its slice alone.
+    """
+    timetable = TimetableContext(
+        block_schedules_path=config.block_schedules_path,
+        routes=config.routes,
+        schedule_snapshot_path=config.schedule_snapshot_path,
+        block_histograms=config.block_histograms,
+        journal_path=config.journal_path,
+        store_path=config.store_path,
+        seen_train_ttl=config.seen_train_ttl,
+        name=f"shard {config.index}",
+    )
+    timetable.log_entries = config.log_entries
+    if not timetable.prepare(from_snapshot=True):
+        print(f"[shard {config.index}] No usable schedule snapshot")
+        return
+
+    save_interval = config.save_interval or timetable.save_interval()
+    last_save_time = time.time()
+    try:
+        while True:
+            trains = polls.get()
+            if trains is None:
+                break
+            if timetable.process_tracked_trains(trains):
+                timetable.flush_observations()
+            if (
+                timetable.store is None
+                and time.time() - last_save_time >= save_interval
+            ):
+                last_save_time = time.time()
+                timetable.save_block_schedules_to_json()
+    except KeyboardInterrupt:
+        # The whole process group is interrupted; the parent stops polling
+        pass
+    finally:
+        timetable.close()
+
+
+def seed_shards(
+    timetable: TimetableContext,
+    shards: List[ShardConfig],
+    journal_path: Optional[str],
+    store_path: Optional[str],
+) -> None:
+    """
+    Gives every shard without block schedules (or a store) of its own yet the
+    entries on its routes recorded before the routes were sharded, so
+    switching to shards does not start collecting from scratch. Shards that
+    already have their own are left as they are, as are the unsharded files.
+
+    Args:
+        timetable: Context whose schedules map trips to routes, and whose
+            block_schedules_path is the unsharded JSON file
+        shards: Shards to seed
+        journal_path: Journal of the unsharded JSON file
+        store_path: Unsharded store, if the shards record into stores
+    """
+    if store_path is not None:
+        if not os.path.exists(store_path):
+            return
+        from observationStore import ObservationStore
+
+        for shard in shards:
+            if os.path.exists(shard.store_path):
+                continue
+            store = ObservationStore(shard.store_path)
+            try:
+                copied = store.copy_routes_from(store_path, shard.routes)
+            finally:
+                store.close()
+            print(f"Seeded shard {shard.index} with {copied} entries of {store_path}")
+        return
+
+    unseeded = [
+        shard for shard in shards if not os.path.exists(shard.block_schedules_path)
+    ]
+    if not unseeded or not os.path.exists(timetable.block_schedules_path):
+        return
+    # Without a journal_path of its own, the source reads the journal without
+    # opening it for appending, which could start a new one
+    source = TimetableContext(
+        block_schedules_path=timetable.block_schedules_path,
+        journal_path=None,
+        block_histograms=unseeded[0].block_histograms,
+    )
+    generation = source.load_block_schedules_from_json()
+    if journal_path is not None:
+        source.replay_journal(journal_path, generation)
+
+    for shard in unseeded:
+        routes = set(shard.routes)
+        seeded = TimetableContext(
+            block_schedules_path=shard.block_schedules_path,
+            routes=shard.routes,
+            block_histograms=shard.block_histograms,
+            journal_path=None,
+        )
+        # For the start times saved with each schedule
+        seeded.trip_to_route_schedule = timetable.trip_to_route_schedule
+        seeded.trip_start_times = timetable.trip_start_times
+        seeded.block_schedules = {
+            key: blocks
+            for key, blocks in source.block_schedules.items()
+            if key[0] in routes
+        }
+        seeded.seen_trains = {
+            train_id: seen
+            for train_id, seen in source.seen_trains.items()
+            if timetable.trip_to_route_schedule.get(seen.trip_id, ("", 0))[0] in routes
+        }
+        seeded.save_block_schedules_to_json()
+        print(f"Seeded shard {shard.index} from {timetable.block_schedules_path}")
+
+
+def monitor_sharded(
+    timetable: TimetableContext,
+    shards: List[ShardConfig],
+    client: Any,
+    queue_size: int = 4,
+) -> None:
+    """
+    Polls tracked trains and hands each shard worker the trains on its routes
+    until interrupted. Polls are fetched and decoded once, here; the per-train
+    work of recording block entries is spread across the workers.
+
+    Args:
+        timetable: Context whose schedules (already saved to the schedule
+            snapshot the shards read) map trips to routes
+        shards: One worker per shard
+        client: TrackedTrainsClient to poll with
+        queue_size: Polls that may wait for a shard before its oldest is dropped
+    """
+    from pollScheduler import PollScheduler
+    from trackedTrains import UNCHANGED
+
+    shard_of_route = {route: shard.index for shard in shards for route in shard.routes}
+    shard_of_trip = {
+        trip_id: shard_of_route[route]
+        for trip_id, (route, _) in timetable.trip_to_route_schedule.items()
+        if route in shard_of_route
+    }
+
+    queues: List[Queue] = [Queue(maxsize=queue_size) for _ in shards]
+    workers = [
+        Process(target=run_shard, args=(shard, polls), name=f"shard {shard.index}")
+        for shard, polls in zip(shards, queues)
+    ]
+    for worker in workers:
+        worker.start()
+
+    scheduler = PollScheduler()
+    print(f"\n=== Starting continuous monitoring in {len(shards)} shards ===")
+    try:
+        while True:
+            trains = client.fetch()
+            scheduler.observe(trains, time.time())
+            if trains is None:
+                print("Failed to fetch train data")
+            elif trains is not UNCHANGED:
+                slices: List[List[Dict[str, Any]]] = [[] for _ in shards]
+                for train in trains:
+                    index = shard_of_trip.get(train.get("tripId"))
+                    if index is not None:
+                        slices[index].append(train)
+                for index, trains_slice in enumerate(slices):
+                    if trains_slice:
+                        put_latest(queues[index], trains_slice, index)
+
+            now = time.time()
+            time.sleep(max(scheduler.next_poll_time(now) - now, 0.0))
+    except KeyboardInterrupt:
+        print("\nMonitoring stopped by user")
+        print(f"Tracked trains requests: {client.latency.summary()}")
+    finally:
+        for polls in queues:
+            try:
+                polls.put(None, timeout=1.0)
+            except queue.Full:
+                pass
+        for worker in workers:
+            worker.join()
+        for polls in queues:
+            # A worker that died early may have left polls nobody will read
+            polls.cancel_join_thread()
+        client.close()
+
+
+def put_latest(polls: "Queue", trains: List[Dict[str, Any]], index: int) -> bool:
+    """
+    Queues a poll for a shard, dropping its oldest if the shard is behind. If
+    the queue is still full after that (the oldest may not have reached the
+    pipe yet, so there was nothing to take), this poll is dropped instead.
+
+    Returns:
+        Whether the poll was queued.
+    """
+    try:
+        polls.put_nowait(trains)
+        return True
+    except queue.Full:
+        pass
+    try:
+        polls.get_nowait()
+    except queue.Empty:
+        pass
+    try:
+        polls.put_nowait(trains)
+    except queue.Full:
+        print(f"Shard {index} is behind, dropped this poll")
+        return False
+    print(f"Shard {index} is behind, dropped its oldest poll")
+    return True
+
+
+def read_block_schedules(path: str) -> Dict[str, Any]:
+    """Reads block_schedules.json, or a SQLite observation store (.db)"""
+    if path.endswith(".db"):
+        from observationStore import block_schedules_from_store
+
+        return block_schedules_from_store(path)
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+class ShardedBlockSchedules(Mapping):
+    """
+    Read-only view of several shards' block schedules as one dataset, keyed
+    like block_schedules.json ("route_Schedule_n" -> start and block times).
+
+    Each shard file is read once; the view only chains their entries, so
+    nothing is copied into a combined file. Shards own disjoint routes, but a
+    schedule found in more than one (e.g. after the routes were dealt out
+    differently) has its block times merged when it is read.
+    """
+
+    def __init__(self, paths: List[str]) -> None:
+        self.shards = [
+            {
+                key: entry
+                for key, entry in read_block_schedules(path).items()
+                if "_Schedule_" in key
+            }
+            for path in paths
+        ]
+
+    def __getitem__(self, key: str) -> Dict[str, Any]:
+        entries = [shard[key] for shard in self.shards if key in shard]
+        if not entries:
+            raise KeyError(key)
+        if len(entries) == 1:
+            return entries[0]
+        return merge_schedule_entries(entries)
+
+    def __iter__(self) -> Iterator[str]:
+        seen = set()
+        for shard in self.shards:
+            for key in shard:
+                if key not in seen:
+                    seen.add(key)
+                    yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+def merge_schedule_entries(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merges one schedule's entries from several shards. Block times are joined
+    as lists if every shard saved lists, and as a histogram otherwise.
+    """
+    blocks: Dict[str, List[Any]] = {}
+    for entry in entries:
+        for block, times in entry.get("blocks_times", {}).items():
+            blocks.setdefault(block, []).append(times)
+
+    blocks_times = {}
+    for block, shard_times in blocks.items():
+        if all(isinstance(times, list) for times in shard_times):
+            blocks_times[block] = [
+                seconds for times in shard_times for seconds in times
+            ]
+        else:
+            histogram = BlockTimeHistogram()
+            for times in shard_times:
+                histogram.merge(BlockTimeHistogram.from_json(times))
+            blocks_times[block] = histogram.to_json()
+    return {
+        "start_times": entries[0].get("start_times", []),
+        "blocks_times": blocks_times,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Records block times with the routes split between worker "
+        "processes, each saving its own shard"
+    )
+    parser.add_argument(
+        "--shards", type=int, default=2, help="Worker processes (default: 2)"
+    )
+    parser.add_argument(
+        "--feed",
+        default="Timetable Generator/stop_times.csv",
+        help="GTFS .zip as published, or an extracted stop_times.csv",
+    )
+    parser.add_argument(
+        "--store",
+        default=None,
+        help="Record block entries in SQLite databases named after this one "
+        "(NAME.shardN.db) instead of block_schedules.shardN.json",
+    )
+    parser.add_argument(
+        "--url",
+        default=None,
+        help="Tracked-trains endpoint (default: the local LED Rails backend)",
+    )
+    add_monitor_arguments(parser, metrics=False)
+    args = parser.parse_args()
+
+    # Schedules are determined once, here, and handed to the shards through
+    # the schedule snapshot
+    timetable = TimetableContext(feed_path=args.feed, journal_path=None)
+    if args.incremental:
+        timetable.update_schedules_incrementally(ROUTES, jobs=args.jobs)
+    else:
+        timetable.determine_schedules(ROUTES, jobs=args.jobs)
+        timetable.save_schedule_snapshot()
+    timetable.release_feed()
+
+    journal_path = "Timetable Generator/block_schedules.journal"
+    shards = [
+        ShardConfig(
+            index=index,
+            routes=routes,
+            block_schedules_path=shard_path(timetable.block_schedules_path, index),
+            journal_path=shard_path(journal_path, index),
+            store_path=shard_path(args.store, index),
+            schedule_snapshot_path=timetable.schedule_snapshot_path,
+            block_histograms=args.histograms,
+            seen_train_ttl=args.seen_ttl * 60,
+            log_entries=not args.quiet,
+        )
+        for index, routes in enumerate(partition_routes(ROUTES, args.shards))
+    ]
+    for shard in shards:
+        print(f"Shard {shard.index}: {', '.join(shard.routes)}")
+    seed_shards(timetable, shards, journal_path, args.store)
+
+    from trackedTrains import TRACKED_TRAINS_URL, TrackedTrainsClient
+
+    client = TrackedTrainsClient(args.url or TRACKED_TRAINS_URL)
+    monitor_sharded(timetable, shards, client)
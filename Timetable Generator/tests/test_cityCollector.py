@@ -0,0 +1,88 @@
+import json
+import zipfile
+
+import pytest
+
+from cityCollector import load_cities
+
+HEADER = "trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+
+
+def write_city(tmp_path, trip_id, routes=("JVL__0",), name="WLG"):
+    feed = tmp_path / f"{name}.csv"
+    feed.write_text(HEADER + f"{trip_id},07:00:00,07:00:00,WELL,0\n")
+    city = {
+        "name": name,
+        "url": "http://localhost:3000/api/trackedtrains",
+        "feed": str(feed),
+        "routes": list(routes),
+        "data_dir": str(tmp_path / name),
+    }
+    return city
+
+
+def write_cities(tmp_path, cities):
+    path = tmp_path / "cities.json"
+    path.write_text(json.dumps(cities))
+    return str(path)
+
+
+def test_load_cities_accepts_metlink_trip_ids(tmp_path):
+    city = write_city(tmp_path, "JVL__0__9265__RAIL__Rail_MTuWThF-XHol_20250817")
+    (config,) = load_cities(write_cities(tmp_path, [city]))
+    assert config.name == "WLG"
+
+
+def test_load_cities_rejects_other_trip_ids(tmp_path):
+    city = write_city(tmp_path, "T1-1234-weekday")
+    with pytest.raises(ValueError, match="T1-1234-weekday"):
+        load_cities(write_cities(tmp_path, [city]))
+
+
+def write_zip_feed(tmp_path, name="AKL"):
+    """A GTFS .zip whose trip_ids are not laid out as Metlink's"""
+    feed = tmp_path / f"{name}.zip"
+    with zipfile.ZipFile(feed, "w") as archive:
+        archive.writestr(
+            "trips.txt", "route_id,service_id,trip_id,direction_id\nWEST,WK,1-A,0\n"
+        )
+        archive.writestr(
+            "calendar.txt",
+            "service_id,monday,tuesday,wednesday,thursday,friday,saturday,"
+            "sunday,start_date,end_date\nWK,1,1,1,1,1,0,0,20250801,20250831\n",
+        )
+        archive.writestr("stop_times.txt", HEADER + "1-A,07:00:00,07:00:00,BRIT,1\n")
+    return str(feed)
+
+
+def test_load_cities_accepts_any_trip_ids_with_trips_txt(tmp_path):
+    city = write_city(tmp_path, "unused", routes=["WEST__0"], name="AKL")
+    city["feed"] = write_zip_feed(tmp_path)
+    (config,) = load_cities(write_cities(tmp_path, [city]))
+    assert config.name == "AKL"
+
+
+def test_load_cities_rejects_service_pattern_not_of_days(tmp_path):
+    city = write_city(tmp_path, "unused", routes=["WEST__0"], name="AKL")
+    city["feed"] = write_zip_feed(tmp_path)
+    city["service_pattern"] = "Weekday"
+    with pytest.raises(ValueError, match="AKL: Not a service pattern"):
+        load_cities(write_cities(tmp_path, [city]))
+
+
+def test_load_cities_rejects_other_routes(tmp_path):
+    city = write_city(
+        tmp_path, "JVL__0__9265__RAIL__Rail_MTuWThF-XHol_20250817", routes=["JVL"]
+    )
+    with pytest.raises(ValueError, match="LINE__DIRECTION"):
+        load_cities(write_cities(tmp_path, [city]))
+
+
+def test_load_cities_only_checks_kept_cities(tmp_path):
+    wellington = write_city(tmp_path, "JVL__0__9265__RAIL__Rail_X_20250817")
+    sydney = write_city(tmp_path, "T1-1234-weekday", name="SYD")
+    path = write_cities(tmp_path, [wellington, sydney])
+
+    assert [city.name for city in load_cities(path, only=["WLG"])] == ["WLG"]
+    with pytest.raises(ValueError, match="No such cities"):
+        load_cities(path, only=["AKL"])
@@ -0,0 +1,128 @@
+import json
+
+from generateTimetable import TimetableContext
+
+FEED = (
+    "trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+    "JVL__0__1__RAIL__Rail_MTuWThF_20250817,07:00:00,07:00:00,WELL,0\n"
+    "JVL__0__1__RAIL__Rail_MTuWThF_20250817,07:10:00,07:10:00,NGAI,1\n"
+    "JVL__1__2__RAIL__Rail_MTuWThF_20250817,08:00:00,08:00:00,JOHN,0\n"
+    "JVL__1__2__RAIL__Rail_MTuWThF_20250817,08:10:00,08:10:00,WELL,1\n"
+)
+
+
+def context(tmp_path, name, **kwargs):
+    return TimetableContext(
+        feed_path=str(tmp_path / "stop_times.csv"),
+        block_schedules_path=str(tmp_path / f"{name}.json"),
+        schedule_snapshot_path=str(tmp_path / "schedule_snapshot.json"),
+        journal_path=str(tmp_path / f"{name}.journal"),
+        **kwargs,
+    )
+
+
+def test_prepare_determines_schedules_and_releases_feed(tmp_path):
+    (tmp_path / "stop_times.csv").write_text(FEED)
+    timetable = context(tmp_path, "block_schedules", routes=["JVL__0", "JVL__1"])
+
+    assert timetable.prepare()
+    assert set(timetable.route_schedules) == {"JVL__0", "JVL__1"}
+    assert timetable.stop_times is None
+    assert timetable.journal is not None
+
+    timetable.close()
+    assert timetable.journal is None
+    with open(tmp_path / "block_schedules.json") as f:
+        assert "journal_generation" in json.load(f)
+
+
+def test_prepare_from_snapshot_keeps_own_routes(tmp_path):
+    (tmp_path / "stop_times.csv").write_text(FEED)
+    context(tmp_path, "block_schedules", routes=["JVL__0", "JVL__1"]).prepare()
+
+    shard = context(tmp_path, "shard", routes=["JVL__1"])
+    assert shard.prepare(from_snapshot=True)
+    assert list(shard.route_schedules) == ["JVL__1"]
+    assert list(shard.trip_to_route_schedule) == [
+        "JVL__1__2__RAIL__Rail_MTuWThF_20250817"
+    ]
+    shard.close()
+
+
+def test_prepare_from_snapshot_without_one(tmp_path):
+    timetable = context(tmp_path, "shard")
+    assert not timetable.prepare(from_snapshot=True)
+    assert timetable.journal is None
+    assert not (tmp_path / "shard.journal").exists()
+
+
+def test_full_run_keeps_incremental_schedule_numbers(tmp_path):
+    trip = "JVL__0__{}__RAIL__Rail_MTuWThF_20250817".format
+    feed = tmp_path / "stop_times.csv"
+    feed.write_text(
+        FEED.splitlines(keepends=True)[0]
+        + f"{trip(1)},07:00:00,07:00:00,WELL,0\n"
+        + f"{trip(1)},07:10:00,07:10:00,NGAI,1\n"
+        + f"{trip(2)},08:00:00,08:00:00,WELL,0\n"
+        + f"{trip(2)},08:20:00,08:20:00,NGAI,1\n"
+    )
+    first = context(tmp_path, "block_schedules", routes=["JVL__0"])
+    first.determine_schedules(["JVL__0"])
+    first.save_schedule_snapshot()
+
+    # Trip 3 departs first, on a schedule of its own, so it is numbered last
+    # incrementally but would be first in first-seen order
+    with open(feed, "a") as f:
+        f.write(f"{trip(3)},06:00:00,06:00:00,WELL,0\n")
+        f.write(f"{trip(3)},06:30:00,06:30:00,NGAI,1\n")
+    incremental = context(tmp_path, "block_schedules", routes=["JVL__0"])
+    incremental.update_schedules_incrementally(["JVL__0"])
+    numbers = dict(incremental.trip_to_route_schedule)
+    assert numbers == {
+        trip(1): ("JVL__0", 0),
+        trip(2): ("JVL__0", 1),
+        trip(3): ("JVL__0", 2),
+    }
+
+    for jobs in (1, 2):
+        full = context(tmp_path, "block_schedules", routes=["JVL__0", "JVL__1"])
+        full.determine_schedules(["JVL__0", "JVL__1"], jobs=jobs)
+        assert full.trip_to_route_schedule == numbers
+
+
+def test_schedules_from_trips_txt(tmp_path):
+    # Trip ids say nothing about their trips, and stops are numbered from 1
+    feed = tmp_path / "feed"
+    feed.mkdir()
+    (feed / "trips.txt").write_text(
+        "route_id,service_id,trip_id,direction_id\n"
+        "WEST,WK,1-A,1\nWEST,WK,2-A,1\nWEST,SA,3-A,1\n"
+    )
+    (feed / "calendar.txt").write_text(
+        "service_id,monday,tuesday,wednesday,thursday,friday,saturday,sunday,"
+        "start_date,end_date\n"
+        "WK,1,1,1,1,1,0,0,20250801,20250831\nSA,0,0,0,0,0,1,0,20250801,20250831\n"
+    )
+    stop_times = FEED.splitlines(keepends=True)[0]
+    for trip_id, hour in (("1-A", 7), ("2-A", 8), ("3-A", 9)):
+        stop_times += f"{trip_id},0{hour}:00:00,0{hour}:00:00,SWAN,1\n"
+        stop_times += f"{trip_id},0{hour}:12:00,0{hour}:12:00,BRIT,2\n"
+    (feed / "stop_times.txt").write_text(stop_times)
+
+    timetable = TimetableContext(
+        feed_path=str(feed),
+        routes=["WEST__1"],
+        schedule_snapshot_path=str(tmp_path / "schedule_snapshot.json"),
+        journal_path=None,
+    )
+    timetable.determine_schedules(["WEST__1"])
+    assert timetable.route_schedules == {"WEST__1": [((0, "SWAN"), (12, "BRIT"))]}
+    assert timetable.trip_to_route_schedule == {
+        "1-A": ("WEST__1", 0),
+        "2-A": ("WEST__1", 0),
+    }
+    assert timetable.trip_start_times == {"1-A": 25200, "2-A": 28800}
+
+    timetable.save_schedule_snapshot()
+    diff = timetable.update_schedules_incrementally(["WEST__1"])
+    assert (diff.added, diff.removed, diff.changed) == ([], [], [])
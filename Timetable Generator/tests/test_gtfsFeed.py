@@ -0,0 +1,224 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from gtfsFeed import (
+    MISSING_TIME,
+    TripFilter,
+    build_trip_index,
+    feed_trip_routes,
+    gtfs_time_to_seconds,
+    load_stop_times,
+    read_stop_times_csv,
+    select_trips,
+    service_days,
+)
+
+
+def test_gtfs_time_to_seconds_zero_padded():
+    times = pd.Series(["00:00:00", "07:05:09", "25:10:00"])
+    assert gtfs_time_to_seconds(times).tolist() == [0, 25509, 90600]
+
+
+def test_gtfs_time_to_seconds_single_digit_hours():
+    times = pd.Series(["7:05:00", "12:00:01"])
+    assert gtfs_time_to_seconds(times).tolist() == [25500, 43201]
+
+
+def test_gtfs_time_to_seconds_blank_and_malformed():
+    times = pd.Series(["07:00:00", None, "", "7:xx:00", np.nan])
+    assert gtfs_time_to_seconds(times).tolist() == [25200] + [MISSING_TIME] * 4
+
+    # Every value zero-padded, as read by the fast path
+    times = pd.Series(["07:00:00", "07:0x:00", "0a:00:00", "07:00:é0"])
+    assert gtfs_time_to_seconds(times).tolist() == [25200] + [MISSING_TIME] * 3
+    times = pd.Series(["07:00:00", "07:0x:00", "07:00:0/"])
+    assert gtfs_time_to_seconds(times).tolist() == [25200] + [MISSING_TIME] * 2
+
+
+def test_gtfs_time_to_seconds_all_blank():
+    times = pd.Series([None, None], dtype=object)
+    assert gtfs_time_to_seconds(times).tolist() == [MISSING_TIME] * 2
+
+
+def test_gtfs_time_to_seconds_empty():
+    assert len(gtfs_time_to_seconds(pd.Series([], dtype=str))) == 0
+
+
+def test_read_stop_times_csv_drops_untimed_stops():
+    csv = (
+        "trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+        "A,07:00:00,07:00:00,S1,0\n"
+        "A,,,S2,1\n"
+        "A,07:10:00,07:10:00,S3,2\n"
+    )
+    stop_times = read_stop_times_csv(io.StringIO(csv))
+    assert stop_times["stop_id"].tolist() == ["S1", "S3"]
+    assert stop_times["departure_seconds"].tolist() == [25200, 25800]
+
+
+def trip_index_of(*trips):
+    """build_trip_index over the first stops of (trip_id, departure seconds)"""
+    trip_ids, departures = zip(*trips)
+    stop_times = pd.DataFrame(
+        {
+            "trip_id": pd.Categorical(trip_ids),
+            "stop_sequence": np.zeros(len(trips), dtype=np.int32),
+            "departure_seconds": np.array(departures, dtype=np.int32),
+        }
+    )
+    return build_trip_index(stop_times)
+
+
+def test_select_trips_single_match():
+    trip_index = trip_index_of(
+        ("JVL__0__1__RAIL__Rail_MTuWThF_20250817", 100),
+        ("JVL__1__2__RAIL__Rail_MTuWThF_20250817", 200),
+    )
+    trips = select_trips(trip_index, "JVL__0")
+    assert isinstance(trips, pd.DataFrame)
+    assert trips["trip_id"].tolist() == ["JVL__0__1__RAIL__Rail_MTuWThF_20250817"]
+
+
+def test_select_trips_no_match():
+    trip_index = trip_index_of(("JVL__0__1__RAIL__Rail_MTuWThF_20250817", 100))
+    trips = select_trips(trip_index, "JVL__1")
+    assert isinstance(trips, pd.DataFrame)
+    assert trips.empty
+    assert "trip_id" in trips
+
+
+def test_trip_filter_matches_service_and_feed_date():
+    trip_filter = TripFilter(("KPL__0",), "MTuWThF", "20250817")
+    trip_ids = pd.Series(
+        [
+            "KPL__0__1__RAIL__Rail_MTuWThF_20250817",
+            "KPL__0__2__RAIL__Rail_SaSu_20250817",
+            "KPL__0__3__RAIL__Rail_MTuWThF-XHol_20250817",
+            "KPL__0__4__RAIL__Rail_MTuWThF_20990101",
+            "KPL__1__5__RAIL__Rail_MTuWThF_20250817",
+        ]
+    )
+    assert trip_filter.matches(trip_ids).tolist() == [True, False, True, False, False]
+
+
+def test_build_trip_index_takes_lowest_stop_sequence():
+    # Most feeds number stops from 1, and rows need not be in order
+    stop_times = pd.DataFrame(
+        {
+            "trip_id": pd.Categorical(["T1", "T1", "T2"]),
+            "stop_sequence": np.array([2, 1, 5], dtype=np.int32),
+            "departure_seconds": np.array([200, 100, 300], dtype=np.int32),
+        }
+    )
+    trip_routes = pd.DataFrame({"trip_id": ["T1", "T2"], "route": ["WEST__1"] * 2})
+    trips = select_trips(build_trip_index(stop_times, trip_routes), "WEST__1")
+    assert dict(zip(trips["trip_id"], trips["departure_seconds"])) == {
+        "T1": 100,
+        "T2": 300,
+    }
+
+
+def test_service_days():
+    assert service_days("MTuWThF") == [
+        "monday",
+        "tuesday",
+        "wednesday",
+        "thursday",
+        "friday",
+    ]
+    assert service_days("SaSu") == ["saturday", "sunday"]
+    with pytest.raises(ValueError):
+        service_days("Weekday")
+
+
+def write_feed(path, calendar=True):
+    """An Auckland-style feed whose trip_ids say nothing about their trips"""
+    path.mkdir()
+    (path / "routes.txt").write_text(
+        "route_id,route_short_name\nWEST-201,WEST\nEAST-201,EAST\n"
+    )
+    (path / "trips.txt").write_text(
+        "route_id,service_id,trip_id,direction_id\n"
+        "WEST-201,WEEKDAY,1001-A,1\n"
+        "WEST-201,WEEKEND,1002-A,1\n"
+        "WEST-201,NEXT_WEEKDAY,1003-A,1\n"
+        "WEST-201,WEEKDAY,1004-A,0\n"
+        "EAST-201,WEEKDAY,1005-A,1\n"
+    )
+    if calendar:
+        (path / "calendar.txt").write_text(
+            "service_id,monday,tuesday,wednesday,thursday,friday,saturday,"
+            "sunday,start_date,end_date\n"
+            "WEEKDAY,1,1,1,1,1,0,0,20250801,20250831\n"
+            "WEEKEND,0,0,0,0,0,1,1,20250801,20250831\n"
+            "NEXT_WEEKDAY,1,1,1,1,1,0,0,20250901,20251231\n"
+        )
+    stop_times = "trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+    for number, trip_id in enumerate(["1001-A", "1002-A", "1003-A", "1004-A"]):
+        for sequence, minutes in ((1, 0), (2, 10)):
+            time = f"0{7 + number}:{minutes:02d}:00"
+            stop_times += f"{trip_id},{time},{time},{sequence * 100},{sequence}\n"
+    (path / "stop_times.txt").write_text(stop_times)
+
+
+def test_feed_trip_routes_from_trips_txt(tmp_path):
+    write_feed(tmp_path / "feed")
+    trip_filter = TripFilter(("WEST__1", "WEST-201__0"), "MTuWThF", "20250817")
+    trip_routes = feed_trip_routes(str(tmp_path / "feed"), trip_filter)
+    # Lines match a route_short_name or a route_id; the weekend service and
+    # the next period's weekday service are left out
+    assert dict(zip(trip_routes["trip_id"], trip_routes["route"])) == {
+        "1001-A": "WEST__1",
+        "1004-A": "WEST-201__0",
+    }
+
+
+def test_feed_trip_routes_without_calendar(tmp_path):
+    write_feed(tmp_path / "feed", calendar=False)
+    trip_filter = TripFilter(("WEST__1",), "WEEKDAY", "20250817")
+    trip_routes = feed_trip_routes(str(tmp_path / "feed"), trip_filter)
+    assert sorted(trip_routes["trip_id"]) == ["1001-A", "1003-A"]
+
+
+def test_feed_trip_routes_of_bare_stop_times(tmp_path):
+    (tmp_path / "stop_times.csv").write_text(STOP_TIMES_TXT)
+    trip_filter = TripFilter(("JVL__0",), "MTuWThF", "20250817")
+    assert feed_trip_routes(str(tmp_path / "stop_times.csv"), trip_filter) is None
+
+
+def test_load_stop_times_selects_from_trips_txt(tmp_path):
+    write_feed(tmp_path / "feed")
+    trip_filter = TripFilter(("WEST__1",), "MTuWThF", "20250817")
+    stop_times = load_stop_times(str(tmp_path / "feed"), trip_filter=trip_filter)
+    assert set(stop_times["trip_id"]) == {"1001-A"}
+
+
+STOP_TIMES_TXT = (
+    "trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+    "JVL__0__1__RAIL__Rail_MTuWThF_20250817,07:00:00,07:00:00,S1,0\n"
+    "JVL__0__1__RAIL__Rail_MTuWThF_20250817,07:10:00,07:10:00,S2,1\n"
+)
+
+
+def test_load_stop_times_from_directory(tmp_path, capsys):
+    feed = tmp_path / "feed"
+    feed.mkdir()
+    (feed / "stop_times.txt").write_text(STOP_TIMES_TXT)
+
+    stop_times = load_stop_times(f"{feed}/")
+    assert stop_times["departure_seconds"].tolist() == [25200, 25800]
+    assert (tmp_path / "feed.cache" / "meta.json").exists()
+    assert "Building" in capsys.readouterr().out
+
+    # Unchanged: served from the cache
+    load_stop_times(str(feed))
+    assert "Building" not in capsys.readouterr().out
+
+    # A changed member file rebuilds it
+    (feed / "stop_times.txt").write_text(STOP_TIMES_TXT.replace("07:10", "07:20"))
+    stop_times = load_stop_times(str(feed))
+    assert "Building" in capsys.readouterr().out
+    assert stop_times["departure_seconds"].tolist() == [25200, 26400]
@@ -0,0 +1,72 @@
+from observationLog import JOURNAL_HEADER, JournalEntry, ObservationJournal
+
+
+def write_journal(path, generation, body):
+    path.write_text(f"{JOURNAL_HEADER} {generation}\n{body}")
+
+
+def test_replay_skips_torn_last_line(tmp_path):
+    path = tmp_path / "block_schedules.journal"
+    write_journal(path, 0, "JVL__0 1 42 300 4001 T1 1700000000\nJVL__0 1 43 3")
+
+    journal = ObservationJournal(str(path))
+    assert list(journal.replay()) == [
+        JournalEntry("JVL__0", 1, 42, 300, "4001", "T1", 1700000000)
+    ]
+    assert journal.entries == 1
+
+
+def test_open_truncates_torn_line_before_appending(tmp_path):
+    path = tmp_path / "block_schedules.journal"
+    write_journal(path, 0, "JVL__0 1 42 300 4001 T1 1700000000\nJVL__0 1 43 3")
+
+    journal = ObservationJournal(str(path))
+    list(journal.replay())
+    journal.open()
+    journal.append("4002", "T2", "KPL__1", 0, 7, 60, 1700000100)
+    journal.close()
+
+    assert list(ObservationJournal(str(path)).replay()) == [
+        JournalEntry("JVL__0", 1, 42, 300, "4001", "T1", 1700000000),
+        JournalEntry("KPL__1", 0, 7, 60, "4002", "T2", 1700000100),
+    ]
+
+
+def test_replay_reads_entries_without_trains(tmp_path):
+    path = tmp_path / "block_schedules.journal"
+    write_journal(path, 0, "JVL__0 1 42 300\n")
+
+    assert list(ObservationJournal(str(path)).replay()) == [
+        JournalEntry("JVL__0", 1, 42, 300, None, None, None)
+    ]
+
+
+def test_replay_skips_journal_of_another_generation(tmp_path):
+    # Left behind by a crash after its snapshot (generation 3) was written
+    path = tmp_path / "block_schedules.journal"
+    write_journal(path, 2, "JVL__0 1 42 300 4001 T1 1700000000\n")
+
+    journal = ObservationJournal(str(path), generation=3)
+    assert list(journal.replay()) == []
+    journal.open()
+    journal.close()
+    assert path.read_text() == f"{JOURNAL_HEADER} 3\n"
+
+
+def test_compact_starts_next_generation(tmp_path):
+    path = tmp_path / "block_schedules.journal"
+    journal = ObservationJournal(str(path))
+    journal.open()
+    journal.append("4001", "T1", "JVL__0", 1, 42, 300, 1700000000)
+    lines = journal.cut()
+    # Appended after the cut, so not part of the snapshot
+    journal.append("4002", "T2", "JVL__0", 1, 43, 360, 1700000060)
+    snapshots = []
+
+    assert journal.compact(lines, lambda: snapshots.append(lines) or True)
+    journal.close()
+
+    assert snapshots == [["JVL__0 1 42 300 4001 T1 1700000000\n"]]
+    assert list(ObservationJournal(str(path), generation=1).replay()) == [
+        JournalEntry("JVL__0", 1, 43, 360, "4002", "T2", 1700000060)
+    ]
@@ -0,0 +1,46 @@
+from pollScheduler import PollScheduler
+from trackedTrains import UNCHANGED
+
+
+def poll_intervals(scheduler, polls):
+    """Seconds until the next poll after observing each poll in turn"""
+    intervals = []
+    now = 1000.0
+    for trains in polls:
+        scheduler.observe(trains, now)
+        intervals.append(scheduler.next_poll_time(now) - now)
+        now += intervals[-1]
+    return intervals
+
+
+def test_empty_polls_back_off():
+    assert poll_intervals(PollScheduler(), [[]] * 6) == [5, 10, 20, 40, 60, 60]
+
+
+def test_unchanged_empty_polls_keep_backing_off():
+    # The backend answers a repeated empty list with 304 or the same body
+    polls = [[]] + [UNCHANGED] * 5
+    assert poll_intervals(PollScheduler(), polls) == [5, 10, 20, 40, 60, 60]
+
+
+def test_unchanged_busy_polls_do_not_back_off():
+    train = {"position": {"timestamp": 1000}}
+    scheduler = PollScheduler()
+    poll_intervals(scheduler, [[train], UNCHANGED, UNCHANGED])
+    assert scheduler.sparse_polls == 0
+
+
+def test_trains_reset_backoff():
+    train = {"position": {"timestamp": 1000}}
+    scheduler = PollScheduler()
+    poll_intervals(scheduler, [[], UNCHANGED, UNCHANGED, [train]])
+    assert scheduler.sparse_polls == 0
+    assert scheduler.next_poll_time(0.0) == scheduler.min_interval
+
+
+def test_backoff_stays_capped_all_night():
+    scheduler = PollScheduler()
+    scheduler.observe([], 0.0)
+    for _ in range(5000):
+        scheduler.observe(UNCHANGED, 0.0)
+    assert scheduler.next_poll_time(0.0) == scheduler.max_interval
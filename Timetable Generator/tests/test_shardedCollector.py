@@ -0,0 +1,157 @@
+import json
+import queue
+
+from generateTimetable import TimetableContext
+from observationLog import JOURNAL_HEADER
+from observationStore import ObservationStore
+from shardedCollector import ShardConfig, put_latest, seed_shards, shard_path
+
+
+class StuckQueue:
+    """A full queue whose oldest poll is still on its way to the pipe"""
+
+    def put_nowait(self, item):
+        raise queue.Full
+
+    def get_nowait(self):
+        raise queue.Empty
+
+
+def test_put_latest_queues_poll():
+    polls = queue.Queue(maxsize=2)
+    assert put_latest(polls, [1], 0)
+    assert polls.get_nowait() == [1]
+
+
+def test_put_latest_drops_oldest_when_full():
+    polls = queue.Queue(maxsize=2)
+    put_latest(polls, [1], 0)
+    put_latest(polls, [2], 0)
+
+    assert put_latest(polls, [3], 0)
+    assert [polls.get_nowait(), polls.get_nowait()] == [[2], [3]]
+
+
+def test_put_latest_drops_poll_when_still_full():
+    assert not put_latest(StuckQueue(), [1], 0)
+
+
+def parent_timetable(tmp_path):
+    timetable = TimetableContext(
+        block_schedules_path=str(tmp_path / "block_schedules.json"),
+        journal_path=None,
+    )
+    timetable.trip_to_route_schedule = {"T0": ("JVL__0", 0), "T1": ("JVL__1", 0)}
+    timetable.trip_start_times = {"T0": 25200, "T1": 28800}
+    return timetable
+
+
+def shards_of(tmp_path, store_path=None):
+    return [
+        ShardConfig(
+            index=index,
+            routes=[route],
+            block_schedules_path=str(tmp_path / f"block_schedules.shard{index}.json"),
+            journal_path=str(tmp_path / f"block_schedules.shard{index}.journal"),
+            store_path=shard_path(store_path, index),
+            schedule_snapshot_path=str(tmp_path / "schedule_snapshot.json"),
+        )
+        for index, route in enumerate(["JVL__0", "JVL__1"])
+    ]
+
+
+def test_seed_shards_from_json_and_journal(tmp_path):
+    (tmp_path / "block_schedules.json").write_text(
+        json.dumps(
+            {
+                "JVL__0_Schedule_0": {"start_times": [], "blocks_times": {"7": [60]}},
+                "JVL__1_Schedule_0": {"start_times": [], "blocks_times": {"9": [90]}},
+                "seen_trains": {"4001": [7, "T0", 1000], "4002": [9, "T1", 1000]},
+            }
+        )
+    )
+    journal = f"{JOURNAL_HEADER} 0\nJVL__1 0 10 120 4002 T1 1100\n"
+    (tmp_path / "block_schedules.journal").write_text(journal)
+    shards = shards_of(tmp_path)
+    seed_shards(
+        parent_timetable(tmp_path),
+        shards,
+        str(tmp_path / "block_schedules.journal"),
+        None,
+    )
+
+    with open(shards[1].block_schedules_path) as f:
+        seeded = json.load(f)
+    assert list(k for k in seeded if "_Schedule_" in k) == ["JVL__1_Schedule_0"]
+    assert seeded["JVL__1_Schedule_0"]["blocks_times"] == {"9": [90], "10": [120]}
+    assert seeded["JVL__1_Schedule_0"]["start_times"] == [28800]
+    assert list(seeded["seen_trains"]) == ["4002"]
+    # The unsharded files are only read
+    assert "JVL__0_Schedule_0" in json.loads(
+        (tmp_path / "block_schedules.json").read_text()
+    )
+    assert (tmp_path / "block_schedules.journal").read_text() == journal
+
+
+def test_seed_shards_leaves_journal_of_other_generation(tmp_path):
+    (tmp_path / "block_schedules.json").write_text(
+        json.dumps(
+            {
+                "JVL__1_Schedule_0": {"blocks_times": {"9": [90]}},
+                "journal_generation": 3,
+            }
+        )
+    )
+    # Already folded into the snapshot, so not replayed
+    journal = f"{JOURNAL_HEADER} 2\nJVL__1 0 10 120 4002 T1 1100\n"
+    (tmp_path / "block_schedules.journal").write_text(journal)
+    shards = shards_of(tmp_path)
+    seed_shards(
+        parent_timetable(tmp_path),
+        shards,
+        str(tmp_path / "block_schedules.journal"),
+        None,
+    )
+
+    with open(shards[1].block_schedules_path) as f:
+        assert json.load(f)["JVL__1_Schedule_0"]["blocks_times"] == {"9": [90]}
+    assert (tmp_path / "block_schedules.journal").read_text() == journal
+
+
+def test_seed_shards_creates_no_journal(tmp_path):
+    (tmp_path / "block_schedules.json").write_text(
+        json.dumps({"JVL__1_Schedule_0": {"blocks_times": {"9": [90]}}})
+    )
+    seed_shards(
+        parent_timetable(tmp_path),
+        shards_of(tmp_path),
+        str(tmp_path / "block_schedules.journal"),
+        None,
+    )
+    assert not (tmp_path / "block_schedules.journal").exists()
+
+
+def test_seed_shards_leaves_existing_shards(tmp_path):
+    (tmp_path / "block_schedules.json").write_text(
+        json.dumps({"JVL__0_Schedule_0": {"blocks_times": {"7": [60]}}})
+    )
+    shards = shards_of(tmp_path)
+    (tmp_path / "block_schedules.shard0.json").write_text("{}")
+    seed_shards(parent_timetable(tmp_path), shards, None, None)
+
+    assert (tmp_path / "block_schedules.shard0.json").read_text() == "{}"
+
+
+def test_seed_shards_from_store(tmp_path):
+    store_path = str(tmp_path / "observations.db")
+    store = ObservationStore(store_path)
+    store.append("4001", "T0", "JVL__0", 0, 7, 60, 1000)
+    store.append("4002", "T1", "JVL__1", 0, 9, 90, 1000)
+    store.close()
+
+    shards = shards_of(tmp_path, store_path)
+    seed_shards(parent_timetable(tmp_path), shards, None, store_path)
+
+    seeded = ObservationStore(shards[0].store_path)
+    assert list(seeded.block_time_counts()) == [("JVL__0", 0, 7, 60, 1)]
+    seeded.close()
@@ -0,0 +1,41 @@
+from trackedTrainsCapture import CaptureWriter, read_capture
+
+
+def test_capture_round_trip(tmp_path):
+    path = str(tmp_path / "capture.gz")
+    writer = CaptureWriter(path)
+    writer.write(1.5, b"[]")
+    writer.write(2.5, b'[{"trainId": "4001"}]')
+    writer.close()
+
+    assert list(read_capture(path)) == [(1.5, b"[]"), (2.5, b'[{"trainId": "4001"}]')]
+
+
+def test_existing_capture_is_not_overwritten(tmp_path):
+    path = str(tmp_path / "capture.gz")
+    first = CaptureWriter(path)
+    first.write(1.0, b"[1]")
+    first.close()
+
+    second = CaptureWriter(path)
+    second.write(2.0, b"[2]")
+    second.close()
+    third = CaptureWriter(path)
+    third.close()
+
+    assert second.path == str(tmp_path / "capture.1.gz")
+    assert third.path == str(tmp_path / "capture.2.gz")
+    assert list(read_capture(path)) == [(1.0, b"[1]")]
+    assert list(read_capture(second.path)) == [(2.0, b"[2]")]
+
+
+def test_flushed_records_survive_without_close(tmp_path):
+    path = str(tmp_path / "capture.gz")
+    # Flushes after every record, as if the interval had passed each time
+    writer = CaptureWriter(path, flush_interval=0)
+    writer.write(1.0, b"[1]")
+    writer.write(2.0, b"[2]")
+
+    # Never closed, as after a crash: the gzip stream has no end marker
+    assert list(read_capture(path)) == [(1.0, b"[1]"), (2.0, b"[2]")]
+    writer.close()
@@ -0,0 +1,236 @@
+import hashlib
+import json
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    from monitorMetrics import MonitorMetrics
+    from trackedTrainsCapture import CaptureWriter
+
+# The tracked-trains endpoint of the local LED Rails backend
+TRACKED_TRAINS_URL: str = "http://localhost:3000/wlg-ltm/api/trackedtrains"
+
+# Returned by fetch when the trains have not changed since the last poll; compare
+# with `is`. It is empty, so code that just iterates over it does no work either.
+UNCHANGED: List[Dict[str, Any]] = []
+
+
+class LatencyStats:
+    """
+    Running statistics of tracked-trains requests: how long they took, how much
+    of that was waiting for the response headers and how many needed a new
+    connection (and so a TCP, and possibly TLS, handshake).
+    """
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.failures = 0
+        self.new_connections = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_seconds = 0.0
+        # Time from sending the request until the headers were parsed
+        self.headers_seconds = 0.0
+        # Polls skipped because the server answered 304 Not Modified, or
+        # because the body hashed the same as the last one
+        self.not_modified = 0
+        self.unchanged_bodies = 0
+
+    def record(
+        self, seconds: float, headers_seconds: float, new_connections: int, ok: bool
+    ) -> None:
+        """Adds one request to the statistics"""
+        self.requests += 1
+        if not ok:
+            self.failures += 1
+        self.new_connections += new_connections
+        self.total_seconds += seconds
+        self.headers_seconds += headers_seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.last_seconds = seconds
+
+    @property
+    def skipped(self) -> int:
+        """Polls that did not need parsing or processing"""
+        return self.not_modified + self.unchanged_bodies
+
+    @property
+    def processed(self) -> int:
+        """Polls that returned new trains"""
+        return self.requests - self.failures - self.skipped
+
+    def summary(self) -> str:
+        """One-line summary for the monitor's log"""
+        if not self.requests:
+            return "No requests yet"
+        mean_ms = 1000 * self.total_seconds / self.requests
+        headers_ms = 1000 * self.headers_seconds / self.requests
+        return (
+            f"{self.requests} requests ({self.failures} failed), "
+            f"mean {mean_ms:.1f} ms (headers {headers_ms:.1f} ms), "
+            f"max {1000 * self.max_seconds:.1f} ms, "
+            f"{self.new_connections} new connections, "
+            f"{self.processed} processed, {self.skipped} skipped "
+            f"({self.not_modified} not modified, "
+            f"{self.unchanged_bodies} unchanged bodies)"
+        )
+
+
+def pooled_session(
+    retries: int = 3, backoff_factor: float = 0.5, hosts: int = 4
+) -> Any:
+    """
+    Creates a requests.Session with keep-alive connection pools and retries
+    with exponential backoff on connection errors and 429/5xx responses.
+
+    Args:
+        retries: Retries per request before giving up
+        backoff_factor: Retry n waits backoff_factor * 2 ** (n - 1) seconds
+        hosts: Hosts whose pools are kept open at once, so clients polling
+            several hosts through one session keep every connection alive
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=hosts, pool_maxsize=4, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class TrackedTrainsClient:
+    """
+    Fetches tracked trains over one pooled keep-alive session, so polls reuse
+    the same connection instead of opening a new one every time. Requests have
+    explicit connect/read timeouts and are retried with exponential backoff on
+    connection errors and 429/5xx responses.
+
+    Polls are conditional: the last ETag and Last-Modified are sent back, and a
+    304 or a body identical to the last one is reported as UNCHANGED without
+    parsing any JSON.
+    """
+
+    def __init__(
+        self,
+        url: str = TRACKED_TRAINS_URL,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 10.0,
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+        session: Optional[Any] = None,
+    ) -> None:
+        """
+        Args:
+            url: Tracked-trains endpoint to poll
+            connect_timeout: Seconds to wait for a connection
+            read_timeout: Seconds to wait between bytes of the response
+            retries: Retries per fetch before giving up
+            backoff_factor: Retry n waits backoff_factor * 2 ** (n - 1) seconds
+            session: Session from pooled_session to share with other clients
+                (default: own). retries and backoff_factor then do not apply
+        """
+        self.url = url
+        parsed = urlsplit(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        self.timeout = (connect_timeout, read_timeout)
+        self.latency = LatencyStats()
+        # Validators and body digest of the last successful response
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.body_digest: Optional[bytes] = None
+        # Records every new response for replay, if set
+        self.capture: Optional["CaptureWriter"] = None
+        # Records poll and JSON decode times for Prometheus, if set
+        self.metrics: Optional["MonitorMetrics"] = None
+
+        if session is None:
+            session = pooled_session(retries, backoff_factor)
+        self.session = session
+
+    def connection_count(self) -> int:
+        """Connections opened so far to the host serving url"""
+        pools = self.session.get_adapter(self.url).poolmanager.pools
+        return sum(
+            pools[key].num_connections
+            for key in pools.keys()
+            if (key.key_host, key.key_port) == (self.host, self.port)
+        )
+
+    def fetch(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Fetches tracked train data from the API endpoint.
+
+        Returns:
+            List of tracked train dictionaries, UNCHANGED if they are the same as
+            last time, or None if request fails.
+        """
+        import requests
+
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+
+        connections = self.connection_count()
+        start = time.perf_counter()
+        headers_seconds = 0.0
+        ok = False
+        try:
+            response = self.session.get(self.url, headers=headers, timeout=self.timeout)
+            headers_seconds = response.elapsed.total_seconds()
+            response.raise_for_status()  # Raises an HTTPError for bad responses
+            if response.status_code == 304:
+                ok = True
+                self.latency.not_modified += 1
+                return UNCHANGED
+
+            body = response.content
+            digest = hashlib.blake2b(body, digest_size=16).digest()
+            if digest == self.body_digest:
+                ok = True
+                self.latency.unchanged_bodies += 1
+                return UNCHANGED
+
+            decode_start = time.perf_counter()
+            trains = json.loads(body)
+            if self.metrics is not None:
+                self.metrics.observe_decode(time.perf_counter() - decode_start)
+            ok = True
+            if self.capture is not None:
+                self.capture.write(time.time(), body)
+            # Only remember a response once it has parsed
+            self.body_digest = digest
+            self.etag = response.headers.get("ETag")
+            self.last_modified = response.headers.get("Last-Modified")
+            return trains
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching tracked trains: {e}")
+            return None
+        except ValueError as e:  # JSON decode error
+            print(f"Error parsing JSON response: {e}")
+            return None
+        finally:
+            seconds = time.perf_counter() - start
+            self.latency.record(
+                seconds, headers_seconds, self.connection_count() - connections, ok
+            )
+            if self.metrics is not None:
+                self.metrics.observe_poll(seconds, ok)
+
+    def close(self) -> None:
+        """Closes the pooled connections and the capture, if recording"""
+        self.session.close()
+        if self.capture is not None:
+            self.capture.close()
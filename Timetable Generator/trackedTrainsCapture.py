@@ -0,0 +1,268 @@
+import argparse
+import contextlib
+import gzip
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import TYPE_CHECKING, Iterator, NamedTuple, Optional, Tuple
+
+if TYPE_CHECKING:
+    from generateTimetable import TimetableContext
+
+# First bytes of every capture file
+CAPTURE_MAGIC: bytes = b"LEDRAILS-CAPTURE-1\n"
+
+# Each record: receive time (seconds since epoch) and body length, then the body
+RECORD_HEADER = struct.Struct("<dI")
+
+# Seconds between flushes of the compressor; a crash loses at most the records
+# received since the last one
+CAPTURE_FLUSH_INTERVAL: float = 10.0
+
+
+class CaptureWriter:
+    """
+    Appends raw tracked-trains responses, with the time each was received, to a
+    gzip-compressed capture file that read_capture can play back.
+
+    Only responses that parsed are worth recording; polls that came back
+    unchanged would do nothing on replay either.
+
+    An existing capture is never overwritten: if path exists, the recording
+    goes to the first free path.1.gz, path.2.gz and so on. The compressor is
+    flushed every flush_interval seconds, so a capture cut short by a crash is
+    readable up to the last flush.
+    """
+
+    def __init__(
+        self, path: str, flush_interval: float = CAPTURE_FLUSH_INTERVAL
+    ) -> None:
+        root, extension = os.path.splitext(path)
+        suffix = 0
+        while True:
+            try:
+                self.file = gzip.open(path, "xb")
+                break
+            except FileExistsError:
+                suffix += 1
+                path = f"{root}.{suffix}{extension}"
+        if suffix:
+            print(f"Capture file exists, recording to {path} instead")
+        self.path = path
+        self.file.write(CAPTURE_MAGIC)
+        self.records = 0
+        self.flush_interval = flush_interval
+        self.last_flush = time.monotonic()
+        # Polls are fetched in worker threads
+        self.lock = threading.Lock()
+
+    def write(self, received: float, body: bytes) -> None:
+        """Appends one response body received at received (seconds since epoch)"""
+        with self.lock:
+            self.file.write(RECORD_HEADER.pack(received, len(body)))
+            self.file.write(body)
+            self.records += 1
+            if time.monotonic() - self.last_flush >= self.flush_interval:
+                self.flush()
+
+    def flush(self) -> None:
+        """
+        Makes every record written so far decompressible from the file. Call
+        with the lock held.
+        """
+        self.file.flush(zlib.Z_SYNC_FLUSH)
+        self.last_flush = time.monotonic()
+
+    def close(self) -> None:
+        """Finishes the gzip stream; records not yet compressed are lost without it"""
+        with self.lock:
+            self.file.close()
+
+
+def read_capture(path: str) -> Iterator[Tuple[float, bytes]]:
+    """
+    Reads (receive time, body) records from a capture file in the order they
+    were recorded. A capture cut short by a crash is read up to its last
+    complete record.
+    """
+    with gzip.open(path, "rb") as f:
+        if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError(f"{path} is not a tracked-trains capture")
+        try:
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    return
+                received, length = RECORD_HEADER.unpack(header)
+                body = f.read(length)
+                if len(body) < length:
+                    return
+                yield received, body
+        except EOFError:
+            return
+
+
+class ReplayStats(NamedTuple):
+    """What replay_capture fed through the monitor's processing"""
+
+    polls: int
+    trains: int
+    entries: int
+    # Seconds spent replaying, and the span of the capture it covered
+    seconds: float
+    captured_seconds: float
+
+    def summary(self) -> str:
+        """One-line summary of throughput"""
+        seconds = max(self.seconds, 1e-9)
+        return (
+            f"{self.polls} polls, {self.trains} train positions and "
+            f"{self.entries} block entries in {self.seconds:.3f} s "
+            f"({self.captured_seconds / seconds:.1f}x real time): "
+            f"{self.trains / seconds:,.0f} positions/s, "
+            f"{self.entries / seconds:,.0f} entries/s"
+        )
+
+
+def replay_capture(
+    timetable: "TimetableContext", path: str, speed: Optional[float] = None
+) -> ReplayStats:
+    """
+    Feeds a capture through process_tracked_trains as the monitor would, each
+    poll's block entries flushed to the context's journal or store.
+
+    Args:
+        timetable: Context holding the schedules to look trips up in and update
+        path: Capture file written by CaptureWriter
+        speed: Replay at this multiple of the recorded pace (1 for real time),
+            or as fast as possible if None
+
+    Returns:
+        Counts and timings of the replay.
+    """
+    polls = trains = entries = 0
+    first_received = last_received = None
+    start = time.perf_counter()
+    for received, body in read_capture(path):
+        if first_received is None:
+            first_received = received
+        last_received = received
+        if speed is not None:
+            due = start + (received - first_received) / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        poll = json.loads(body)
+        polls += 1
+        trains += len(poll)
+        entries += timetable.process_tracked_trains(poll)
+        timetable.flush_observations()
+
+    return ReplayStats(
+        polls,
+        trains,
+        entries,
+        time.perf_counter() - start,
+        0.0 if first_received is None else last_received - first_received,
+    )
+
+
+def record(url: str, path: str) -> None:
+    """
+    Polls the tracked-trains endpoint like the monitor does, recording every
+    new response to a capture file until interrupted.
+    """
+    from pollScheduler import PollScheduler
+    from trackedTrains import TrackedTrainsClient
+
+    client = TrackedTrainsClient(url)
+    client.capture = CaptureWriter(path)
+    scheduler = PollScheduler()
+    print(f"Recording {url} to {client.capture.path}")
+    try:
+        while True:
+            trains = client.fetch()
+            scheduler.observe(trains, time.time())
+            now = time.time()
+            time.sleep(max(scheduler.next_poll_time(now) - now, 0.0))
+    except KeyboardInterrupt:
+        print(f"\nRecorded {client.capture.records} responses")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Records tracked-trains responses, or replays a recording "
+        "through the monitor's processing"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = commands.add_parser("record", help="Record the live endpoint")
+    record_parser.add_argument("capture", help="Capture file to write (.gz)")
+    record_parser.add_argument(
+        "--url",
+        default=None,
+        help="Tracked-trains endpoint (default: the local LED Rails backend)",
+    )
+
+    replay_parser = commands.add_parser(
+        "replay", help="Rebuild block schedules from a capture"
+    )
+    replay_parser.add_argument("capture", help="Capture file to replay")
+    replay_parser.add_argument(
+        "--speed",
+        type=float,
+        default=None,
+        help="Multiple of the recorded pace to replay at, e.g. 1 or 60 "
+        "(default: as fast as possible)",
+    )
+    replay_parser.add_argument(
+        "--output",
+        default="Timetable Generator/block_schedules_replay.json",
+        help="Block schedules JSON to write",
+    )
+    replay_parser.add_argument(
+        "--snapshot",
+        default="Timetable Generator/schedule_snapshot.json",
+        help="Schedule snapshot to look trips up in",
+    )
+    replay_parser.add_argument(
+        "--histograms",
+        action="store_true",
+        help="Keep block entry times as histograms",
+    )
+    replay_parser.add_argument(
+        "--verbose", action="store_true", help="Print every block entry"
+    )
+    args = parser.parse_args()
+
+    if args.command == "record":
+        from trackedTrains import TRACKED_TRAINS_URL
+
+        record(args.url or TRACKED_TRAINS_URL, args.capture)
+    else:
+        # Imported as a module: TimetableContext is only imported for type checking
+        import generateTimetable
+
+        timetable = generateTimetable.TimetableContext(
+            block_schedules_path=args.output,
+            schedule_snapshot_path=args.snapshot,
+            block_histograms=args.histograms,
+            journal_path=None,
+        )
+        if not timetable.load_schedules_from_snapshot():
+            raise SystemExit(f"No usable schedule snapshot at {args.snapshot}")
+
+        with contextlib.ExitStack() as stack:
+            if not args.verbose:
+                # Printing every entry would be most of what a benchmark measured
+                devnull = stack.enter_context(open(os.devnull, "w"))
+                stack.enter_context(contextlib.redirect_stdout(devnull))
+            stats = replay_capture(timetable, args.capture, args.speed)
+        print(f"Replayed {args.capture}: {stats.summary()}")
+        timetable.save_block_schedules_to_json()
@@ -0,0 +1,208 @@
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+# Path the LED Rails backend serves tracked trains on
+TRACKED_TRAINS_PATH: str = "/wlg-ltm/api/trackedtrains"
+
+
+def load_trip_ids(snapshot_path: str, count: int) -> List[str]:
+    """
+    Picks trip_ids for the stand-in trains from a schedule snapshot, so the
+    monitor recognises them. Falls back to made-up ids if there is no snapshot.
+
+    Args:
+        snapshot_path: Schedule snapshot written by generateTimetable
+        count: Number of trip_ids to pick
+
+    Returns:
+        List of trip_ids.
+    """
+    try:
+        with open(snapshot_path, "r") as f:
+            trips = json.load(f)["trips"]
+        return sorted(trips)[:count]
+    except (OSError, ValueError, KeyError) as e:
+        print(f"No trips from {snapshot_path} ({e}), using made-up trip_ids")
+        return [f"TEST__0__{i}__RAIL__Rail_MTuWThF_20250817" for i in range(count)]
+
+
+def synthetic_trains(
+    trip_ids: List[str], block_seconds: float, now: float, update_seconds: float = 1.0
+) -> List[Dict[str, Any]]:
+    """
+    Builds a tracked-trains payload in which every train moves on to the next
+    block every block_seconds. Positions only change every update_seconds, as
+    they do upstream.
+
+    Args:
+        trip_ids: Trip each train is running
+        block_seconds: Seconds a train spends in each block
+        now: Current time in seconds since epoch
+        update_seconds: Seconds between position updates
+
+    Returns:
+        List of tracked train dictionaries, as the backend returns them.
+    """
+    now = now - now % update_seconds
+    trains = []
+    for i, trip_id in enumerate(trip_ids):
+        # Stagger the trains so they do not all change block on the same poll
+        elapsed = now + i * block_seconds / max(len(trip_ids), 1)
+        trains.append(
+            {
+                "trainId": f"{4000 + i}",
+                "tripId": trip_id,
+                "currentBlock": 100 + int(elapsed // block_seconds) % 150,
+                "position": {"timestamp": int(now)},
+            }
+        )
+    return trains
+
+
+class CapturePlayback:
+    """
+    Serves the responses of a capture at the pace they were recorded (or a
+    multiple of it), from when the server started.
+    """
+
+    def __init__(self, records: List[Tuple[float, bytes]], speed: float = 1.0) -> None:
+        self.received = [received for received, _ in records]
+        self.bodies = [body for _, body in records]
+        self.speed = speed
+        self.start = time.time()
+
+    def payload(self, now: float) -> bytes:
+        """The last response recorded by the replayed equivalent of now"""
+        replayed = self.received[0] + (now - self.start) * self.speed
+        index = bisect.bisect_right(self.received, replayed) - 1
+        return self.bodies[max(index, 0)]
+
+
+def make_handler(
+    trip_ids: List[str],
+    block_seconds: float,
+    payload: Optional[bytes],
+    update_seconds: float = 1.0,
+    playback: Optional[CapturePlayback] = None,
+) -> type:
+    """
+    Creates a request handler serving a fixed payload, a recorded capture or
+    synthetic trains.
+    """
+
+    class TrackedTrainsHandler(BaseHTTPRequestHandler):
+        # Keep-alive, like the real backend
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self) -> None:
+            if self.path.split("?")[0] != TRACKED_TRAINS_PATH:
+                self.send_error(404)
+                return
+            body = payload
+            if playback is not None:
+                body = playback.payload(time.time())
+            elif body is None:
+                trains = synthetic_trains(
+                    trip_ids, block_seconds, time.time(), update_seconds
+                )
+                body = json.dumps(trains).encode()
+            etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            # Polls every few seconds would drown the console
+            pass
+
+    return TrackedTrainsHandler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Local stand-in for the tracked-trains endpoint, for testing "
+        "the monitor offline"
+    )
+    parser.add_argument("--port", type=int, default=3000)
+    parser.add_argument(
+        "--trains", type=int, default=20, help="Number of synthetic trains"
+    )
+    parser.add_argument(
+        "--block-seconds",
+        type=float,
+        default=30.0,
+        help="Seconds each synthetic train spends in a block",
+    )
+    parser.add_argument(
+        "--update-seconds",
+        type=float,
+        default=1.0,
+        help="Seconds between synthetic position updates",
+    )
+    parser.add_argument(
+        "--snapshot",
+        default="Timetable Generator/schedule_snapshot.json",
+        help="Schedule snapshot to take trip_ids from",
+    )
+    parser.add_argument(
+        "--payload",
+        default=None,
+        help="JSON file to serve as-is instead of synthetic trains",
+    )
+    parser.add_argument(
+        "--capture",
+        default=None,
+        help="Capture from trackedTrainsCapture.py to serve at its recorded pace",
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="Multiple of the recorded pace to serve a capture at (default: 1)",
+    )
+    args = parser.parse_args()
+
+    playback = None
+    if args.capture is not None:
+        from trackedTrainsCapture import read_capture
+
+        records = list(read_capture(args.capture))
+        if not records:
+            raise SystemExit(f"No responses in {args.capture}")
+        playback = CapturePlayback(records, args.speed)
+        print(f"Serving {len(playback.bodies)} responses from {args.capture}")
+
+    payload = None
+    if args.payload is not None:
+        with open(args.payload, "rb") as f:
+            payload = f.read()
+        print(f"Serving {os.path.basename(args.payload)}")
+    trip_ids = load_trip_ids(args.snapshot, args.trains)
+
+    handler = make_handler(
+        trip_ids, args.block_seconds, payload, args.update_seconds, playback
+    )
+    server = ThreadingHTTPServer(("localhost", args.port), handler)
+    print(
+        f"Serving tracked trains on http://localhost:{args.port}{TRACKED_TRAINS_PATH}"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nServer stopped by user")
+    finally:
+        server.server_close()